@@ -0,0 +1,132 @@
+"""
+Benchmark: /health latency while large conversions run concurrently.
+
+Starts the API with uvicorn in a scratch directory, fires CONCURRENCY
+/convert-timestamp requests for a scaled-up copy of the sample recording and
+polls /health for the whole time. Reports /health p50/p99/max latency and the
+wall time of the conversions. The flow cache is disabled so every conversion
+does the full parse.
+
+Point --app-dir at another checkout (e.g. a git worktree of an older
+revision) to compare against it. Requires httpx.
+
+Usage:
+    python benchmarks/bench_event_loop.py [--concurrency 20] [--scale 20]
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+from bench_har_parsing import DEFAULT_HAR, build_scaled_har
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def wait_until_up(client, base_url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            await client.get(f"{base_url}/health")
+            return
+        except httpx.TransportError:
+            await asyncio.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+
+async def run_load(base_url, concurrency, har_name, interval):
+    latencies = []
+    async with httpx.AsyncClient(timeout=600) as client:
+        await wait_until_up(client, base_url)
+
+        async def convert():
+            response = await client.post(
+                f"{base_url}/convert-timestamp",
+                json={"timestamp": "bench", "filename": har_name}
+            )
+            response.raise_for_status()
+
+        async def poll_health(done):
+            while not done.is_set():
+                start = time.perf_counter()
+                try:
+                    await client.get(f"{base_url}/health")
+                except httpx.TransportError:
+                    # A keep-alive connection dropped by a stalled server; the
+                    # retry still counts towards this sample's latency
+                    await client.get(f"{base_url}/health")
+                latencies.append((time.perf_counter() - start) * 1000)
+                await asyncio.sleep(interval)
+
+        done = asyncio.Event()
+        poller = asyncio.create_task(poll_health(done))
+        start = time.perf_counter()
+        await asyncio.gather(*(convert() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+        done.set()
+        await poller
+
+    return latencies, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--app-dir", default=str(ROOT), help="checkout containing main.py")
+    parser.add_argument("--har", default=str(DEFAULT_HAR))
+    parser.add_argument("--scale", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--interval", type=float, default=0.02, help="seconds between /health polls")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        uploads = Path(workdir) / "uploads"
+        uploads.mkdir()
+        total = build_scaled_har(args.har, args.scale, uploads / "bench.har")
+        size_mb = (uploads / "bench.har").stat().st_size / (1024 * 1024)
+
+        port = free_port()
+        env = dict(os.environ, PYTHONPATH=args.app_dir, FLOW_CACHE_MAX_BYTES="0")
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+            cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            latencies, elapsed = asyncio.run(
+                run_load(f"http://127.0.0.1:{port}", args.concurrency, "bench.har", args.interval)
+            )
+        finally:
+            server.terminate()
+            server.wait(timeout=10)
+            shutil.rmtree(Path(workdir) / "cache", ignore_errors=True)
+
+    print(f"{args.concurrency} concurrent conversions of a {size_mb:.1f} MB HAR ({total} entries)")
+    print(f"conversions wall time: {elapsed:.2f} s")
+    print(f"/health samples: {len(latencies)}")
+    print(f"/health latency ms: p50={statistics.median(latencies):.1f} "
+          f"p99={percentile(latencies, 99):.1f} max={max(latencies):.1f}")
+
+
+if __name__ == "__main__":
+    main()
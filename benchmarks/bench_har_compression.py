@@ -0,0 +1,78 @@
+"""
+Benchmark: disk footprint and conversion time of plain, gzip and zstd HARs.
+
+Builds a HAR that repeats the entries of uploads/techdev.btspulse.com.har
+SCALE times, stores it plain, as .har.gz and as .har.zst (the same way
+/upload?compress= does) and converts each through open_har() with the
+incremental parser. Reports the stored size, the time taken to compress and
+the best-of-N end-to-end conversion time. Requires zstandard for the zstd row.
+
+The scaled archive repeats the same entries, so compression ratios are far
+higher than on a real capture; run with --scale 1 for the ratio of the
+recording itself.
+
+Usage:
+    python benchmarks/bench_har_compression.py [--scale 100] [--repeat 3]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+from bench_har_parsing import DEFAULT_HAR, build_scaled_har
+from har_converter import convert_har_stream
+from har_storage import GZIP, ZSTD, compress_har, open_har, zstandard
+
+
+def convert(path):
+    with open_har(path) as f:
+        return len(convert_har_stream(f, "bench")["flows"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--har", default=str(DEFAULT_HAR))
+    parser.add_argument("--scale", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    codecs = [None, GZIP] + ([ZSTD] if zstandard is not None else [])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        plain = Path(tmp) / "scaled.har"
+        total = build_scaled_har(args.har, args.scale, plain)
+        plain_size = plain.stat().st_size
+        print(f"Scaled HAR: {total} entries, {plain_size / (1024 * 1024):.1f} MB ({args.scale}x {Path(args.har).name})")
+        print(f"{'storage':<10} {'size KB':>10} {'ratio':>7} {'compress s':>11} {'convert s':>10}")
+
+        for codec in codecs:
+            compress_seconds = 0.0
+            path = plain
+            if codec is not None:
+                copy = Path(tmp) / f"{codec}.har"
+                shutil.copyfile(plain, copy)
+                start = time.perf_counter()
+                path = compress_har(copy, codec)
+                compress_seconds = time.perf_counter() - start
+
+            timings = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                count = convert(path)
+                timings.append(time.perf_counter() - start)
+            assert count == total
+
+            size = os.path.getsize(path)
+            print(f"{codec or 'plain':<10} {size / 1024:>10.0f} {plain_size / size:>6.1f}x "
+                  f"{compress_seconds:>11.2f} {min(timings):>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Benchmark: whole-archive json.loads vs incremental HAR parsing.
+
+Builds a HAR that repeats the entries of uploads/techdev.btspulse.com.har
+SCALE times and converts it with the old /convert code path and the
+incremental parser. Each run happens in a fresh subprocess so that peak RSS
+is measured independently.
+
+Usage:
+    python benchmarks/bench_har_parsing.py [--scale 100] [--har uploads/techdev.btspulse.com.har]
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+DEFAULT_HAR = ROOT / "uploads" / "techdev.btspulse.com.har"
+
+
+def build_scaled_har(source, scale, out_path):
+    """Write a HAR whose entries are the source entries repeated ``scale`` times."""
+    with open(source, "r", encoding="utf-8") as f:
+        har = json.load(f)
+    log = har["log"]
+    entries = [json.dumps(entry) for entry in log.pop("entries")]
+
+    with open(out_path, "w", encoding="utf-8") as out:
+        header = json.dumps({"log": log})[:-2]  # strip the closing "}}"
+        out.write(header + ', "entries": [')
+        first = True
+        for _ in range(scale):
+            for entry in entries:
+                if not first:
+                    out.write(",\n")
+                out.write(entry)
+                first = False
+        out.write("]}}")
+    return len(entries) * scale
+
+
+def run_old(path):
+    """The pre-streaming /convert path: read, decode, json.loads, build flows."""
+    from har_converter import entry_to_flow
+
+    with open(path, "rb") as f:
+        content = f.read()
+    har_data = json.loads(content.decode("utf-8"))
+    entries = har_data.get("log", {}).get("entries", [])
+    flows = [entry_to_flow(i, entry) for i, entry in enumerate(entries)]
+    return len(flows)
+
+
+def run_stream(path):
+    """Incremental parsing; flows are consumed as they are emitted."""
+    from har_converter import iter_flows
+
+    count = 0
+    with open(path, "rb") as f:
+        for _ in iter_flows(f):
+            count += 1
+    return count
+
+
+def run_stream_collect(path):
+    """Incremental parsing, collecting the flow list as the JSON response does."""
+    from har_converter import convert_har_stream
+
+    with open(path, "rb") as f:
+        return len(convert_har_stream(f, "bench")["flows"])
+
+
+MODES = {
+    "old (json.loads)": run_old,
+    "stream": run_stream,
+    "stream + collect": run_stream_collect,
+}
+
+
+def child(mode, path):
+    start = time.perf_counter()
+    count = MODES[mode](path)
+    elapsed = time.perf_counter() - start
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({"entries": count, "seconds": elapsed, "peak_rss_mb": peak_kb / 1024}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--har", default=str(DEFAULT_HAR))
+    parser.add_argument("--scale", type=int, default=100)
+    parser.add_argument("--child", nargs=2, metavar=("MODE", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(*args.child)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        scaled = os.path.join(tmp, "scaled.har")
+        total = build_scaled_har(args.har, args.scale, scaled)
+        size_mb = os.path.getsize(scaled) / (1024 * 1024)
+        print(f"Scaled HAR: {total} entries, {size_mb:.1f} MB ({args.scale}x {Path(args.har).name})")
+        print(f"{'mode':<20} {'entries':>8} {'wall s':>8} {'peak RSS MB':>12}")
+        for mode in MODES:
+            out = subprocess.run(
+                [sys.executable, __file__, "--child", mode, scaled],
+                capture_output=True, text=True, check=True
+            )
+            result = json.loads(out.stdout.strip().splitlines()[-1])
+            print(f"{mode:<20} {result['entries']:>8} {result['seconds']:>8.2f} {result['peak_rss_mb']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Benchmark: tail-latency accuracy of fixed Prometheus buckets vs the HDR histogram.
+
+Draws response times with a heavy tail (most requests around 150 ms, a few
+percent between 1 and 4 s), then compares the true p50..p99.99 with:
+
+- fixed buckets: the 11 REQUEST_DURATION_BUCKETS with linear interpolation
+  inside a bucket, as PromQL histogram_quantile() does;
+- hdr: the HdrHistogram that generated scripts record into (default layout,
+  1 µs to 60 s with 2 significant figures).
+
+Also reports the cost of recording one value and of merging two histograms.
+
+Usage:
+    python benchmarks/bench_hdr_quantiles.py [--samples 500000]
+"""
+import argparse
+import math
+import random
+import sys
+import time
+from bisect import bisect_left
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from hdr_histogram import QUANTILES, HdrHistogram, HdrLayout
+
+REQUEST_DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def make_samples(count):
+    rng = random.Random(1)
+    return [
+        int(rng.uniform(1.0, 4.0) * 1e6) if rng.random() < 0.03 else int(rng.lognormvariate(math.log(150000), 0.4))
+        for _ in range(count)
+    ]
+
+
+def bucket_quantile(counts, total, quantile):
+    """histogram_quantile() over cumulative fixed buckets (values in µs)"""
+    rank = quantile * total
+    cumulative = 0
+    lower = 0.0
+    for bound, count in zip(REQUEST_DURATION_BUCKETS, counts):
+        if cumulative + count >= rank:
+            return (lower + (bound - lower) * (rank - cumulative) / count) * 1e6
+        cumulative += count
+        lower = bound
+    return REQUEST_DURATION_BUCKETS[-1] * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", type=int, default=500000)
+    args = parser.parse_args()
+
+    samples = make_samples(args.samples)
+    ordered = sorted(samples)
+
+    counts = [0] * (len(REQUEST_DURATION_BUCKETS) + 1)
+    for value in samples:
+        counts[bisect_left(REQUEST_DURATION_BUCKETS, value / 1e6)] += 1
+
+    layout = HdrLayout()
+    histogram = HdrHistogram(layout)
+    start = time.perf_counter()
+    for value in samples:
+        histogram.record(value)
+    record_ns = (time.perf_counter() - start) / len(samples) * 1e9
+    _, _, hdr_values, _ = histogram.summary(QUANTILES, ())
+
+    print(f"{args.samples} samples, HDR layout {layout.config} with {layout.length} counters")
+    print(f"{'quantile':<9} {'exact ms':>9} {'buckets ms':>11} {'error':>8} {'hdr ms':>9} {'error':>8}")
+    for quantile, hdr_value in zip(QUANTILES, hdr_values):
+        exact = ordered[max(1, math.ceil(quantile * len(ordered))) - 1]
+        fixed = bucket_quantile(counts, len(samples), quantile)
+        print(f"{quantile:<9g} {exact / 1000:>9.1f} {fixed / 1000:>11.1f} {(fixed - exact) / exact:>8.1%}"
+              f" {hdr_value / 1000:>9.1f} {(hdr_value - exact) / exact:>8.1%}")
+
+    other = histogram.copy()
+    start = time.perf_counter()
+    other.add(histogram)
+    merge_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    sparse = histogram.sparse()
+    HdrHistogram(layout).add_sparse(sparse)
+    sparse_ms = (time.perf_counter() - start) * 1000
+    print(f"record {record_ns:.0f} ns/value, merge {merge_ms:.2f} ms, sparse round trip {sparse_ms:.2f} ms ({len(sparse) // 2} counters)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Benchmark: response parsing cost per step in generated scripts.
+
+Before, every successful step parsed its JSON response for an auth token,
+and steps with extraction rules parsed it a second time. Now only steps with
+extraction rules parse, once, and bodies over the partial threshold are only
+decoded up to the member the rules read (see lazy_json.py).
+
+For a small (~20 KB) and a large (~1.4 MB) body, compares per response:
+
+- old: response.json() for the token lookup, plus one more for extraction;
+- new, no rules: the step does not touch the body;
+- new, rule on an early member ($.data.id) and on a late one ($.total).
+
+Usage:
+    python benchmarks/bench_lazy_json.py [--rounds 50]
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from lazy_json import LazyJson
+
+TOKEN_FIELDS = ("token", "access_token", "auth_token", "jwt", "bearer_token", "session_token")
+
+
+def make_body(items):
+    return json.dumps({
+        "data": {"id": 84213, "name": "Application"},
+        "items": [{"id": i, "name": f"item {i}", "tags": ["a", "b"], "updatedOn": "2024-01-01T00:00:00Z"} for i in range(items)],
+        "total": items,
+    })
+
+
+def old_step(text, path):
+    data = json.loads(text)
+    any(field in data for field in TOKEN_FIELDS)
+    value = json.loads(text)
+    for key in path:
+        value = value[key]
+    return value
+
+
+def new_step(text, path):
+    return LazyJson(text).get(path)
+
+
+def timed(function, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        function()
+    return (time.perf_counter() - start) / rounds * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{'body':>9} {'old µs':>10} {'early µs':>10} {'late µs':>10}")
+    for items in (200, 15000):
+        text = make_body(items)
+        assert new_step(text, ("data", "id")) == old_step(text, ("data", "id"))
+        assert new_step(text, ("total",)) == items
+        old = timed(lambda: old_step(text, ("data", "id")), args.rounds)
+        early = timed(lambda: new_step(text, ("data", "id")), args.rounds)
+        late = timed(lambda: new_step(text, ("total",)), args.rounds)
+        print(f"{len(text) // 1024:>6} KB {old:>10.0f} {early:>10.0f} {late:>10.0f}")
+    print("steps without extraction rules: old parses once per response, new never")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Benchmark: per-request cost of the Prometheus request listener in generated scripts.
+
+Compares the previous listener (endpoint string cleanup, two labels() lookups,
+Counter.inc and Histogram.observe under prometheus_client locks on every
+request) with the aggregating listener from TEMPLATE_HEADER, which only
+updates per-worker aggregates and leaves Prometheus to a periodic flush.
+The listeners are called directly with a realistic mix of request names;
+Locust's own event dispatch costs the same for both and is left out.
+
+Usage:
+    python benchmarks/bench_metrics_listener.py [--requests 200000] [--endpoints 40]
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import prometheus_client
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram
+
+from locust_generator import TEMPLATE_HEADER
+
+
+def legacy_listener():
+    """The listener generated scripts used before metrics were aggregated."""
+    registry = CollectorRegistry()
+    request_count = Counter('locust_requests_total', 'Total requests', ['method', 'endpoint', 'status'], registry=registry)
+    request_duration = Histogram('locust_request_duration_seconds', 'Request duration in seconds', ['method', 'endpoint'],
+                                 buckets=[0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0], registry=registry)
+    active_users = Gauge('locust_active_users', 'Number of active users', registry=registry)
+
+    def track_request_metrics(request_type, name, response_time, response_length, response, context, exception, **kwargs):
+        status = 'success' if exception is None else 'failure'
+        method = request_type.upper() if request_type else 'UNKNOWN'
+        endpoint = name or 'unknown'
+        if '?' in endpoint:
+            endpoint = endpoint.split('?')[0]
+        if '.dot.html' in endpoint:
+            endpoint = endpoint.replace('.dot.html', '')
+        if 'cacheId=' in endpoint:
+            endpoint = endpoint.split('cacheId=')[0].rstrip('?&')
+        request_count.labels(method=method, endpoint=endpoint, status=status).inc()
+        request_duration.labels(method=method, endpoint=endpoint).observe(response_time / 1000.0)
+        if hasattr(context, 'environment') and hasattr(context.environment, 'runner'):
+            active_users.set(context.environment.runner.user_count)
+
+    return track_request_metrics, None
+
+
+def aggregated_listener():
+    """The listener and flush from TEMPLATE_HEADER, without the HTTP server."""
+    prometheus_client.start_http_server = lambda *args, **kwargs: None
+    namespace = {}
+    exec(compile(TEMPLATE_HEADER, "<TEMPLATE_HEADER>", "exec"), namespace)
+    return namespace["track_request_metrics"], namespace["METRICS"].flush
+
+
+def make_requests(count, endpoints):
+    rng = random.Random(1)
+    names = [f"/Wizer/Api{i}/Resource{i}?cacheId={rng.randrange(10**6)}" for i in range(endpoints)]
+    names += [f"/Wizer/Page{i}.dot.html" for i in range(endpoints // 4)]
+    methods = ["GET", "POST", "PUT"]
+    return [
+        (rng.choice(methods), rng.choice(names), rng.expovariate(1 / 120.0), None if rng.random() > 0.02 else Exception())
+        for _ in range(count)
+    ]
+
+
+def run(listener, requests):
+    context = {}
+    start = time.perf_counter()
+    for method, name, response_time, exception in requests:
+        listener(method, name, response_time, 512, None, context, exception)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200000)
+    parser.add_argument("--endpoints", type=int, default=40)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    requests = make_requests(args.requests, args.endpoints)
+    print(f"{args.requests} requests over {args.endpoints + args.endpoints // 4} request names")
+    print(f"{'listener':<12} {'ns/request':>11} {'flush ms':>9}")
+
+    results = {}
+    for label, factory in (("legacy", legacy_listener), ("aggregated", aggregated_listener)):
+        listener, flush = factory()
+        best = min(run(listener, requests) for _ in range(args.repeat))
+        flush_ms = 0.0
+        if flush is not None:
+            start = time.perf_counter()
+            flush()
+            flush_ms = (time.perf_counter() - start) * 1000
+        results[label] = best / len(requests) * 1e9
+        print(f"{label:<12} {results[label]:>11.0f} {flush_ms:>9.2f}")
+    print(f"Listener speed-up: {results['legacy'] / results['aggregated']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Benchmark: max sustainable RPS of one Locust worker process, HttpUser vs FastHttpUser.
+
+Generates a script from the sample recording for each user class (the same
+way /generate does), removes the think time, and runs it headless in a
+single Locust process against a local keep-alive stub server. Every request
+gets the same small JSON response. The stub runs in its own process and
+should not be the bottleneck: check that its CPU stays well below 100%.
+
+Usage:
+    python benchmarks/bench_user_class_rps.py [--users 50] [--duration 15]
+"""
+import argparse
+import asyncio
+import csv
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from har_converter import convert_har_stream
+from har_storage import open_har
+from locust_generator import USER_CLASSES
+
+DEFAULT_HAR = ROOT / "uploads" / "techdev.btspulse.com.har"
+STUB_PORT = 8765
+
+RESPONSE_BODY = b'{"ok": true, "token": "bench-token", "id": 1}'
+RESPONSE = (
+    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: "
+    + str(len(RESPONSE_BODY)).encode() + b"\r\nConnection: keep-alive\r\n\r\n" + RESPONSE_BODY
+)
+
+
+class StubProtocol(asyncio.Protocol):
+    """Minimal HTTP/1.1 keep-alive server: answers every request with RESPONSE."""
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.buffer = b""
+
+    def data_received(self, data):
+        self.buffer += data
+        while True:
+            end = self.buffer.find(b"\r\n\r\n")
+            if end < 0:
+                return
+            length = 0
+            for line in self.buffer[:end].split(b"\r\n")[1:]:
+                name, _, value = line.partition(b":")
+                if name.strip().lower() == b"content-length":
+                    length = int(value)
+            if len(self.buffer) < end + 4 + length:
+                return
+            self.buffer = self.buffer[end + 4 + length:]
+            self.transport.write(RESPONSE)
+
+
+def run_stub(port):
+    loop = asyncio.new_event_loop()
+    server = loop.run_until_complete(loop.create_server(StubProtocol, "127.0.0.1", port, backlog=1024))
+    loop.run_until_complete(server.serve_forever())
+
+
+def write_script(flows, user_class, path):
+    from main import check_generate_options, generate_locust_script_content
+
+    options = check_generate_options({"user_class": user_class})
+    script = generate_locust_script_content(flows, {}, path.name, f"http://127.0.0.1:{STUB_PORT}", options=options)
+    # Measure the client, not the recorded think time
+    script += "\nfrom locust import constant\nRecordedUser.wait_time = constant(0)\n"
+    path.write_text(script, encoding="utf-8")
+
+
+def run_locust(script, users, duration, workdir):
+    prefix = Path(workdir) / script.stem
+    subprocess.run(
+        [
+            sys.executable, "-m", "locust", "-f", str(script), "--headless",
+            "-u", str(users), "-r", str(users), "-t", f"{duration}s",
+            "--host", f"http://127.0.0.1:{STUB_PORT}", "--csv", str(prefix), "--only-summary",
+        ],
+        cwd=workdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False
+    )
+    with open(f"{prefix}_stats.csv", newline="") as f:
+        for row in csv.DictReader(f):
+            if row["Name"] == "Aggregated":
+                return int(row["Request Count"]), float(row["Requests/s"]), int(row["Failure Count"])
+    raise RuntimeError(f"No aggregated stats for {script}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--har", default=str(DEFAULT_HAR))
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--duration", type=int, default=15)
+    args = parser.parse_args()
+
+    with open_har(args.har) as f:
+        flows = convert_har_stream(f, "bench")["flows"]
+
+    stub = multiprocessing.Process(target=run_stub, args=(STUB_PORT,), daemon=True)
+    stub.start()
+    time.sleep(0.5)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            print(f"{len(flows)} recorded requests, {args.users} users, {args.duration}s per run, 1 worker process")
+            print(f"{'user class':<14} {'requests':>10} {'failures':>9} {'RPS':>9}")
+            results = {}
+            for user_class in USER_CLASSES:
+                script = Path(tmp) / f"bench_{user_class.lower()}.py"
+                # The generated scripts print a lot; keep that out of the measurement
+                with open(os.devnull, "w") as devnull:
+                    stdout, sys.stdout = sys.stdout, devnull
+                    try:
+                        write_script(flows, user_class, script)
+                    finally:
+                        sys.stdout = stdout
+                count, rps, failures = run_locust(script, args.users, args.duration, tmp)
+                results[user_class] = rps
+                print(f"{user_class:<14} {count:>10} {failures:>9} {rps:>9.0f}")
+            print(f"FastHttpUser speed-up: {results['FastHttpUser'] / results['HttpUser']:.1f}x")
+    finally:
+        stub.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Content-addressed store for response bodies.
+
+With ``bodies=ref`` conversions, response bodies are written here once, keyed
+by the SHA-256 of the decoded body, and flows carry only a reference:
+
+    {"blob": "<sha256>", "size": ..., "mimeType": ..., "blob_size": ...}
+
+Identical bodies (shared scripts, stylesheets, repeated API responses) are
+stored once no matter how many flows or recordings refer to them. Blobs are
+fetched on demand through /blobs/{digest}. Writes are atomic and idempotent,
+so worker processes can store into the same directory concurrently.
+"""
+import base64
+import binascii
+import hashlib
+import os
+import uuid
+from pathlib import Path
+
+BLOB_SUFFIX = ".blob"
+
+
+def decode_content(content):
+    """Decoded bytes of a HAR ``response.content``, or None if it carries no body."""
+    text = content.get('text')
+    if not text:
+        return None
+    if content.get('encoding') == 'base64':
+        try:
+            return base64.b64decode(text, validate=True)
+        except (binascii.Error, ValueError):
+            pass
+    return text.encode('utf-8')
+
+
+class BlobStore:
+    """Deduplicated on-disk blobs under ``blob_dir/<2 hex>/<sha256>.blob``."""
+
+    def __init__(self, blob_dir):
+        self.blob_dir = Path(blob_dir)
+        self.blob_dir.mkdir(exist_ok=True)
+
+    def path(self, digest):
+        return self.blob_dir / digest[:2] / f"{digest}{BLOB_SUFFIX}"
+
+    def put(self, data):
+        """Store ``data`` unless an identical blob exists; returns its digest."""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path(digest)
+        if not path.exists():
+            path.parent.mkdir(exist_ok=True)
+            tmp = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        return digest
+
+    def exists(self, digest):
+        return len(digest) == 64 and all(c in "0123456789abcdef" for c in digest) and self.path(digest).is_file()
+
+    def externalize(self, content):
+        """Replace a HAR ``response.content`` by a blob reference."""
+        ref = {
+            "size": content.get('size'),
+            "mimeType": content.get('mimeType')
+        }
+        data = decode_content(content)
+        if data is not None:
+            ref["blob"] = self.put(data)
+            ref["blob_size"] = len(data)
+        return ref
@@ -0,0 +1,55 @@
+"""
+Endpoint-name normalization for task names and metrics labels.
+
+Request names are reduced to an endpoint label by dropping the query string,
+``cacheId=`` cache busters and ``.dot.html`` suffixes:
+
+    /Wizer/Home/Index.dot.html?cacheId=1759239051683  -> /Wizer/Home/Index
+
+The generator uses clean_endpoint_name() for task names. Generated scripts
+label their Prometheus metrics through an EndpointNames instance: a bounded
+LRU cache keyed by the raw name, so the request path is a cache hit, with a
+hard cap on the number of distinct labels. Names past the cap are counted
+under OTHER_ENDPOINT, so unbounded URLs cannot grow the metrics registry.
+
+This module is inlined into generated scripts (see
+locust_generator.TEMPLATE_HEADER), so it must only use the standard library.
+"""
+import logging
+import re
+from functools import lru_cache
+
+MAX_ENDPOINTS = 500
+CACHE_SIZE = 4096
+OTHER_ENDPOINT = "other"
+
+logger = logging.getLogger(__name__)
+
+_STRIP_RE = re.compile(r"\?.*|\.dot\.html|&?cacheId=.*", re.DOTALL)
+
+
+def clean_endpoint_name(name):
+    """Endpoint label for a request name - query parameters and cache IDs removed"""
+    return _STRIP_RE.sub("", name) if name else "unknown"
+
+
+class EndpointNames:
+    """Capped set of endpoint labels with a bounded LRU cache of raw name -> label"""
+
+    def __init__(self, max_endpoints=MAX_ENDPOINTS, cache_size=CACHE_SIZE):
+        self.max_endpoints = max_endpoints
+        self.labels = set()
+        self.overflowed = 0
+        self.normalize = lru_cache(maxsize=cache_size)(self._label)
+
+    def _label(self, name):
+        endpoint = clean_endpoint_name(name)
+        if endpoint in self.labels:
+            return endpoint
+        if len(self.labels) >= self.max_endpoints:
+            if not self.overflowed:
+                logger.warning("More than %d endpoint labels; counting new ones as '%s'", self.max_endpoints, OTHER_ENDPOINT)
+            self.overflowed += 1
+            return OTHER_ENDPOINT
+        self.labels.add(endpoint)
+        return endpoint
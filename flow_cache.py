@@ -0,0 +1,294 @@
+"""
+Content-addressed cache of converted flows.
+
+Conversions are keyed by the SHA-256 of the HAR file plus the converter
+version, so re-running /convert on an unchanged recording is served from disk
+without re-reading or re-parsing the archive. Each cache file holds the flows
+as length-prefixed marshal frames inside a zlib stream, followed by a small
+footer with the non-entry ``log`` members (and filter counts, if any):
+
+    <zlib(frames)> <zlib(marshal(header))> <u32 header length> <magic>
+
+Files are evicted least-recently-used first once the cache grows past its
+size budget; a hit refreshes the file's mtime. Entries are stored by the
+conversion worker processes, so eviction holds a lock file in the cache
+directory rather than a lock of its own process.
+"""
+import hashlib
+import json
+import marshal
+import os
+import struct
+import threading
+import uuid
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # not on Windows; eviction is then only locked within a process
+    fcntl = None
+
+from har_converter import CONVERTER_VERSION, FILTERED, FLOW
+from har_storage import HarDecoder, open_har
+
+MAGIC = b"HFC1"
+CACHE_SUFFIX = ".flows"
+LOCK_NAME = ".evict.lock"
+HASH_CHUNK_SIZE = 1024 * 1024
+
+_FRAME = struct.Struct("<I")
+_FOOTER = struct.Struct("<I4s")
+
+
+def hash_stream(stream, chunk_size=HASH_CHUNK_SIZE):
+    """Return the SHA-256 hex digest of a binary stream, read from its current position."""
+    digest = hashlib.sha256()
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def copy_and_hash(stream, dest_path, codec=None, chunk_size=HASH_CHUNK_SIZE):
+    """
+    Copy a binary stream to ``dest_path``, returning its (SHA-256 hex digest, size).
+
+    For a compressed stream (``codec``) the digest is of the decompressed
+    content, matching what digest_for() reports for the stored file.
+    """
+    digest = hashlib.sha256()
+    decoder = HarDecoder(codec)
+    size = 0
+    with open(dest_path, "wb") as out:
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(decoder.decompress(chunk))
+            out.write(chunk)
+            size += len(chunk)
+    return digest.hexdigest(), size
+
+
+class FlowCache:
+    """On-disk LRU cache of converted flows keyed by HAR content hash."""
+
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self._lock = threading.Lock()
+        self._index_path = self.cache_dir / "uploads.json"
+        self._uploads = self._load_upload_index()
+
+    def key(self, digest, variant=""):
+        """Cache key for a HAR digest, the converter version and a conversion variant."""
+        raw = f"{digest}|{CONVERTER_VERSION}|{marshal.version}|{variant}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    # Upload digests -------------------------------------------------------
+
+    def _load_upload_index(self):
+        try:
+            with open(self._index_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def record_upload(self, path, digest):
+        """Remember the digest of a file in uploads/ so conversions can skip hashing it."""
+        stat = Path(path).stat()
+        with self._lock:
+            self._uploads[str(path)] = {
+                "sha256": digest,
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns
+            }
+            tmp = self._index_path.with_suffix(f".{uuid.uuid4().hex}.tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self._uploads, f)
+            os.replace(tmp, self._index_path)
+
+    def digest_for(self, path):
+        """
+        Digest of a HAR file's decompressed content, taken from the upload
+        index while the file is unchanged.
+        """
+        stat = Path(path).stat()
+        record = self._uploads.get(str(path))
+        if record and record["size"] == stat.st_size and record["mtime_ns"] == stat.st_mtime_ns:
+            return record["sha256"]
+        with open_har(path) as f:
+            digest = hash_stream(f)
+        self.record_upload(path, digest)
+        return digest
+
+    # Lookup ---------------------------------------------------------------
+
+    def _path(self, key):
+        return self.cache_dir / f"{key}{CACHE_SUFFIX}"
+
+    def lookup(self, key, source_size=0):
+        """
+        Check for ``key`` and count the hit or miss.
+
+        A hit refreshes the entry's LRU position; ``source_size`` is the size
+        of the HAR file it saves re-reading.
+        """
+        path = self._path(key)
+        try:
+            os.utime(path)
+            hit = True
+        except OSError:
+            hit = False
+
+        with self._lock:
+            if hit:
+                self.hits += 1
+                self.bytes_saved += source_size
+            else:
+                self.misses += 1
+        return hit
+
+    def load(self, key):
+        """Return an iterator of flow events for ``key``, or None if it is not cached."""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                f.seek(-_FOOTER.size, os.SEEK_END)
+                header_len, magic = _FOOTER.unpack(f.read(_FOOTER.size))
+                if magic != MAGIC:
+                    raise ValueError("bad cache file")
+                body_len = f.seek(-(_FOOTER.size + header_len), os.SEEK_END)
+                header = marshal.loads(zlib.decompress(f.read(header_len)))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, EOFError, TypeError, zlib.error):
+            path.unlink(missing_ok=True)
+            return None
+
+        return self._iter_events(path, header, body_len)
+
+    def _iter_events(self, path, header, body_len):
+        for name, value in header["fields"].items():
+            yield ("field", name, value)
+        yield from self._iter_flows(path, body_len)
+        if header.get("filtered") is not None:
+            yield (FILTERED, header["filtered"])
+
+    def _iter_flows(self, path, body_len):
+        decompressor = zlib.decompressobj()
+        pending = b""
+        with open(path, "rb") as f:
+            remaining = body_len
+            while remaining > 0:
+                chunk = f.read(min(HASH_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                pending += decompressor.decompress(chunk)
+                pos = 0
+                while len(pending) - pos >= _FRAME.size:
+                    (size,) = _FRAME.unpack_from(pending, pos)
+                    end = pos + _FRAME.size + size
+                    if end > len(pending):
+                        break
+                    yield (FLOW, marshal.loads(pending[pos + _FRAME.size:end]))
+                    pos = end
+                pending = pending[pos:]
+
+    # Store ----------------------------------------------------------------
+
+    def store(self, key, events):
+        """
+        Pass flow events through unchanged while writing them to the cache.
+
+        The entry is committed only if the events are consumed to the end, so
+        a failed parse or an abandoned stream never leaves a partial entry.
+        """
+        tmp = self.cache_dir / f"{key}.{uuid.uuid4().hex}.tmp"
+        fields = {}
+        filtered = None
+        count = 0
+        committed = False
+        compressor = zlib.compressobj(6)
+        f = open(tmp, "wb")
+        try:
+            for event in events:
+                if event[0] == FLOW:
+                    frame = marshal.dumps(event[1])
+                    f.write(compressor.compress(_FRAME.pack(len(frame)) + frame))
+                    count += 1
+                elif event[0] == FILTERED:
+                    filtered = event[1]
+                else:
+                    fields[event[1]] = event[2]
+                yield event
+
+            f.write(compressor.flush())
+            header = zlib.compress(marshal.dumps({"fields": fields, "count": count, "filtered": filtered}))
+            f.write(header)
+            f.write(_FOOTER.pack(len(header), MAGIC))
+            f.close()
+            os.replace(tmp, self._path(key))
+            committed = True
+        finally:
+            f.close()
+            if not committed:
+                tmp.unlink(missing_ok=True)
+
+        self._evict()
+
+    @contextmanager
+    def _eviction_lock(self):
+        """Exclusive across the threads and processes sharing the cache directory."""
+        with self._lock, open(self.cache_dir / LOCK_NAME, "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+
+    def _evict(self):
+        """Delete least-recently-used entries until the cache fits its budget."""
+        with self._eviction_lock():
+            entries = []
+            total = 0
+            for path in self.cache_dir.glob(f"*{CACHE_SUFFIX}"):
+                try:
+                    stat = path.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                path.unlink(missing_ok=True)
+                total -= size
+
+    def stats(self):
+        """Counters reported by /health; hits and misses are those counted by lookup() in this process."""
+        size = 0
+        count = 0
+        for path in self.cache_dir.glob(f"*{CACHE_SUFFIX}"):
+            try:
+                size += path.stat().st_size
+                count += 1
+            except OSError:
+                continue
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "bytes_saved": self.bytes_saved,
+            "entries": count,
+            "size_bytes": size,
+            "max_bytes": self.max_bytes
+        }
@@ -0,0 +1,348 @@
+"""
+Producer/consumer correlation of recorded requests.
+
+A value that a response hands out and that a later request sends back (an ID
+in a JSON body, a token in a response header, a hidden form field) has to be
+extracted at run time rather than replayed verbatim:
+
+    flow 3 response  {"participations": [{"id": 84213, ...}]}
+    flow 7 request   GET /api/participation/84213/answers
+        -> flow 3 extracts participations_id = $.participations[0].id
+           flow 7 requests /api/participation/{participations_id}/answers
+
+correlate_flows() finds such pairs by exact match of the value against URL
+path segments, query and form values, JSON body values and request headers.
+A value counts only when no request before the producing response already
+carried it, so constants that the client knew up front are left alone. The
+latest response that produced a value is its producer.
+
+Producers get declarative ``extract`` rules, each ``(name, kind, source)``:
+
+    ("participations_id", "json", ("participations", 0, "id"))
+    ("x_csrf_token", "header", "X-CSRF-Token")
+    ("requestverificationtoken", "regex", 'name="__RequestVerificationToken"[^>]*value="([^"]*)"')
+
+Consumers get ``{name}`` placeholders (see locust_generator.compile_substitution)
+and list the names they need in ``use_context``. Flows use the generator
+format and carry the recorded response as ``response_text`` and
+``response_headers``.
+"""
+import json
+import re
+from urllib.parse import unquote, unquote_plus
+
+from blob_store import decode_content
+
+# Response bodies larger than this, or not textual, are not searched
+MAX_BODY_BYTES = 2 * 1024 * 1024
+TEXT_MIME_TYPES = ("json", "html", "xml", "text/", "javascript")
+
+# Response headers that can hand out a value for later requests
+_HEADER_RE = re.compile(r"token|csrf|xsrf|session|auth|request-?id|correlation", re.IGNORECASE)
+# Request headers that are never rewritten (the session and client own them)
+_SKIPPED_REQUEST_HEADERS = {"cookie", "host", "origin", "referer", "content-length", "user-agent"}
+_HIDDEN_INPUT_RE = re.compile(r"<input\b[^>]*>", re.IGNORECASE)
+_ATTRIBUTE_RE = re.compile(r'\b(name|value)\s*=\s*"([^"]*)"', re.IGNORECASE)
+_GENERIC_KEYS = {"id", "value", "key", "token", "code", "guid", "uuid"}
+_MAX_JSON_VALUES = 5000
+
+
+def response_text(content, blob_store=None, mime_type=None):
+    """
+    Text of a HAR ``response.content`` (or its bodies=ref reference), or None.
+
+    Only textual bodies up to MAX_BODY_BYTES are returned.
+    """
+    if not isinstance(content, dict):
+        return None
+    mime_type = (mime_type or content.get("mimeType") or "").lower()
+    if not any(kind in mime_type for kind in TEXT_MIME_TYPES):
+        return None
+    if "blob" in content:
+        if blob_store is None or not blob_store.exists(content["blob"]):
+            return None
+        if content.get("blob_size", 0) > MAX_BODY_BYTES:
+            return None
+        data = blob_store.path(content["blob"]).read_bytes()
+    else:
+        data = decode_content(content)
+    if not data or len(data) > MAX_BODY_BYTES:
+        return None
+    return data.decode("utf-8", errors="replace")
+
+
+def correlatable(value):
+    """Whether a recorded value is specific enough to correlate on"""
+    if isinstance(value, bool) or value is None:
+        return False
+    if isinstance(value, int):
+        return abs(value) >= 100
+    if not isinstance(value, str) or not 6 <= len(value) <= 4096:
+        return False
+    if any(c.isspace() for c in value) or "/" in value:
+        return False
+    return any(c.isdigit() for c in value) or len(value) >= 16
+
+
+def _json_values(data, path=()):
+    """(path, value) for the scalars of a parsed JSON document"""
+    stack = [(path, data)]
+    count = 0
+    while stack and count < _MAX_JSON_VALUES:
+        path, value = stack.pop()
+        if isinstance(value, dict):
+            stack.extend((path + (key,), item) for key, item in reversed(list(value.items())))
+        elif isinstance(value, list):
+            stack.extend((path + (index,), item) for index, item in reversed(list(enumerate(value))))
+        else:
+            count += 1
+            yield path, value
+
+
+def json_path(path):
+    """JSONPath for a key path, e.g. ("participations", 0, "id") -> $.participations[0].id"""
+    return "$" + "".join(f"[{key}]" if isinstance(key, int) else f".{key}" for key in path)
+
+
+def _variable_name(base):
+    name = re.sub(r"\W+", "_", str(base)).strip("_").lower()
+    return name if name and not name[0].isdigit() else f"value_{name}"
+
+
+def _json_rule_name(path):
+    keys = [key for key in path if isinstance(key, str)]
+    if not keys:
+        return "value"
+    if keys[-1].lower() in _GENERIC_KEYS and len(keys) > 1:
+        return f"{keys[-2]}_{keys[-1]}"
+    return keys[-1]
+
+
+def _producer_rules(flow):
+    """(value, name, kind, source) for the values a recorded response hands out"""
+    rules = []
+    for header, value in (flow.get("response_headers") or {}).items():
+        if _HEADER_RE.search(header) and header.lower() != "set-cookie" and correlatable(value):
+            rules.append((value, header, "header", header))
+    text = flow.get("response_text")
+    if not text:
+        return rules
+    stripped = text.lstrip()
+    if stripped[:1] in ("{", "["):
+        try:
+            data = json.loads(stripped)
+        except ValueError:
+            data = None
+        if data is not None:
+            for path, value in _json_values(data):
+                if correlatable(value):
+                    rules.append((str(value), _json_rule_name(path), "json", path))
+            return rules
+    for tag in _HIDDEN_INPUT_RE.findall(text):
+        attributes = _ATTRIBUTE_RE.findall(tag)
+        names = [value for attribute, value in attributes if attribute.lower() == "name"]
+        values = [value for attribute, value in attributes if attribute.lower() == "value"]
+        if len(names) != 1 or len(values) != 1 or not correlatable(values[0]):
+            continue
+        name_first = attributes[0][0].lower() == "name"
+        quoted = re.escape(names[0])
+        pattern = (f'name="{quoted}"[^>]*value="([^"]*)"' if name_first
+                   else f'value="([^"]*)"[^>]*name="{quoted}"')
+        match = re.search(pattern, text)
+        if match and match.group(1) == values[0]:
+            rules.append((values[0], names[0], "regex", pattern))
+    return rules
+
+
+def _split_query(query):
+    return [param.partition("=") for param in query.split("&")] if query else []
+
+
+def _request_values(flow):
+    """Every value a recorded request sends, as strings"""
+    url = flow.get("url", "")
+    path, _, query = url.partition("?")
+    values = {unquote(segment) for segment in path.split("/")}
+    values.update(unquote_plus(value) for _, _, value in _split_query(query))
+    for header, value in (flow.get("headers") or {}).items():
+        if isinstance(value, str) and header.lower() not in _SKIPPED_REQUEST_HEADERS and not header.startswith(":"):
+            values.add(value)
+            values.add(value.rsplit(" ", 1)[-1])
+    body = flow.get("body")
+    if isinstance(body, str) and body:
+        try:
+            data = json.loads(body)
+        except ValueError:
+            values.update(unquote_plus(value) for _, _, value in _split_query(body))
+        else:
+            values.update(str(value) for _, value in _json_values(data) if not isinstance(value, (dict, list)))
+    return values
+
+
+def context_rules(flow):
+    """
+    Extraction rules of a flow: its ``extract`` rules plus its YAML
+    ``set_context`` keys (top-level JSON keys, or ``cookie_<name>`` cookies).
+    """
+    rules = [tuple(rule) for rule in flow.get("extract", [])]
+    for key in flow.get("set_context", []):
+        if key.startswith("cookie_"):
+            rule = (key, "cookie", key.replace("cookie_", "", 1))
+        else:
+            rule = (key, "json", (key,))
+        if rule not in rules:
+            rules.append(rule)
+    return rules
+
+
+class Correlation:
+    """A value extracted from one recorded response and sent by later requests."""
+
+    def __init__(self, name, producer, kind, source, value):
+        self.name = name
+        self.producer = producer
+        self.kind = kind
+        self.source = source
+        self.value = value
+        self.consumers = []
+
+    @property
+    def rule(self):
+        return (self.name, self.kind, self.source)
+
+    def describe(self):
+        """Rule source for humans: a JSONPath, a header name or a regex"""
+        return json_path(self.source) if self.kind == "json" else self.source
+
+
+def _placeholder(name):
+    return f"{{{name}}}"
+
+
+def _rewrite_url(url, values):
+    """URL with correlated path segments and query values replaced by placeholders"""
+    path, sep, query = url.partition("?")
+    scheme = ""
+    if "://" in path:
+        scheme, _, path = path.partition("://")
+        scheme += "://"
+        host, slash, path = path.partition("/")
+        scheme += host + slash
+    path = "/".join(
+        _placeholder(values[unquote(segment)]) if unquote(segment) in values else segment
+        for segment in path.split("/")
+    )
+    params = []
+    for name, eq, value in _split_query(query):
+        if unquote_plus(value) in values:
+            value = _placeholder(values[unquote_plus(value)])
+        params.append(f"{name}{eq}{value}")
+    return scheme + path + sep + "&".join(params)
+
+
+def _rewrite_body(body, values):
+    """Body with correlated JSON or form values replaced by placeholders"""
+    try:
+        data = json.loads(body)
+    except ValueError:
+        data = None
+    if not isinstance(data, (dict, list)):
+        if data is not None or "=" not in body:
+            return body
+        params = []
+        for name, eq, value in _split_query(body):
+            if eq and unquote_plus(value) in values:
+                value = _placeholder(values[unquote_plus(value)])
+            params.append(f"{name}{eq}{value}")
+        return "&".join(params)
+
+    markers = {}
+
+    def mark(value):
+        if isinstance(value, dict):
+            return {key: mark(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [mark(item) for item in value]
+        if not isinstance(value, bool) and value is not None and str(value) in values:
+            marker = f"\x00{len(markers)}\x00"
+            markers[json.dumps(marker)] = _placeholder(values[str(value)]) if not isinstance(value, str) \
+                else json.dumps(_placeholder(values[str(value)]))
+            return marker
+        return value
+
+    text = json.dumps(mark(data))
+    for marker, replacement in markers.items():
+        text = text.replace(marker, replacement)
+    return text
+
+
+def _rewrite_headers(headers, values):
+    rewritten = {}
+    for header, value in headers.items():
+        if isinstance(value, str) and header.lower() not in _SKIPPED_REQUEST_HEADERS and not header.startswith(":"):
+            if value in values:
+                value = _placeholder(values[value])
+            else:
+                prefix, space, last = value.rpartition(" ")
+                if space and last in values:
+                    value = f"{prefix} {_placeholder(values[last])}"
+        rewritten[header] = value
+    return rewritten
+
+
+def correlate_flows(flows):
+    """
+    Find producer/consumer pairs and rewrite the flows to use them.
+
+    Returns ``(flows, correlations)``: copies of the flows with ``extract``
+    rules on producers and placeholders plus ``use_context`` on consumers,
+    and the Correlation list in order of first use. The input is not modified.
+    """
+    # value -> (producer index, name, kind, source) of its latest producer
+    produced = {}
+    # values sent before the response that produced them
+    sent = set()
+    correlations = {}
+    names = set()
+    uses = []
+    for index, flow in enumerate(flows):
+        request_values = _request_values(flow)
+        needed = {}
+        for value in request_values & produced.keys():
+            producer = produced[value]
+            key = (producer[0], producer[2], producer[3])
+            correlation = correlations.get(key)
+            if correlation is None:
+                name = _variable_name(producer[1])
+                suffix = 2
+                while name in names:
+                    name = f"{_variable_name(producer[1])}_{suffix}"
+                    suffix += 1
+                names.add(name)
+                correlation = correlations[key] = Correlation(name, producer[0], producer[2], producer[3], value)
+            correlation.consumers.append(index)
+            needed[value] = correlation.name
+        uses.append(needed)
+        sent |= request_values
+
+        for value, name, kind, source in _producer_rules(flow):
+            if value not in sent:
+                produced[value] = (index, name, kind, source)
+
+    result = []
+    extract = {}
+    for correlation in correlations.values():
+        extract.setdefault(correlation.producer, []).append(correlation.rule)
+    for index, flow in enumerate(flows):
+        flow = dict(flow)
+        if index in extract:
+            flow["extract"] = list(flow.get("extract", [])) + extract[index]
+        values = uses[index]
+        if values:
+            flow["url"] = _rewrite_url(flow.get("url", ""), values)
+            if isinstance(flow.get("body"), str) and flow["body"]:
+                flow["body"] = _rewrite_body(flow["body"], values)
+            flow["headers"] = _rewrite_headers(flow.get("headers") or {}, values)
+            flow["use_context"] = list(flow.get("use_context", [])) + sorted(set(values.values()))
+        result.append(flow)
+    return result, sorted(correlations.values(), key=lambda correlation: correlation.consumers[0])
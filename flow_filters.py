@@ -0,0 +1,231 @@
+"""
+Filter stage that drops static assets and noise before flows are built.
+
+A filter is configured with a dict (or the name of a preset):
+
+    {
+        "preset": "static",                     # start from a preset (optional)
+        "mime_types": ["image/*", "text/css"],  # drop by response mime type
+        "url_patterns": ["\\.dot\\.html"],      # drop URLs matching a regex
+        "allow_domains": ["api.example.com"],   # keep only these hosts (and subdomains)
+        "deny_domains": ["cdn.example.com"],    # drop these hosts (and subdomains)
+        "status_codes": [304, "5xx"]            # drop by response status
+    }
+
+Rules are checked in the order allow_domains, deny_domains, status_codes,
+mime_types, url_patterns; the first match drops the entry and is counted, so
+the conversion summary can report how many entries each rule removed.
+
+The same filter runs on raw HAR entries (conversion) and on converted flows
+(/generate and the generate_locust command line).
+"""
+import hashlib
+import json
+import re
+from urllib.parse import urlsplit
+
+STATIC_ASSET_MIME_TYPES = [
+    "image/*",
+    "font/*",
+    "video/*",
+    "audio/*",
+    "text/css",
+    "text/javascript",
+    "application/javascript",
+    "application/x-javascript",
+    "application/font-woff",
+    "application/font-woff2",
+    "application/vnd.ms-fontobject",
+    "application/x-font-ttf",
+]
+
+STATIC_ASSET_URL_PATTERNS = [
+    r"\.(?:png|jpe?g|gif|svg|ico|webp|avif|bmp|css|js|mjs|map|woff2?|ttf|otf|eot|mp4|webm|mp3)(?:[?#]|$)",
+    r"\.dot\.html",
+]
+
+ANALYTICS_DOMAINS = [
+    "google-analytics.com",
+    "googletagmanager.com",
+    "doubleclick.net",
+    "hotjar.com",
+    "segment.io",
+    "mixpanel.com",
+    "sentry.io",
+    "nr-data.net",
+    "newrelic.com",
+    "clarity.ms",
+    "facebook.net",
+]
+
+PRESETS = {
+    "static": {
+        "mime_types": STATIC_ASSET_MIME_TYPES,
+        "url_patterns": STATIC_ASSET_URL_PATTERNS,
+        "deny_domains": ANALYTICS_DOMAINS,
+    },
+}
+
+RULE_KEYS = ("mime_types", "url_patterns", "allow_domains", "deny_domains", "status_codes")
+
+
+class FilterConfigError(ValueError):
+    """Raised for an invalid filter configuration."""
+
+
+def normalize_filter_config(config):
+    """
+    Resolve presets and validate a filter configuration.
+
+    Returns a plain dict with only the rule keys, or None when nothing is
+    filtered. The result is what gets passed to worker processes and hashed
+    into flow cache keys.
+    """
+    if not config:
+        return None
+    if isinstance(config, str):
+        config = {"preset": config}
+    if not isinstance(config, dict):
+        raise FilterConfigError("filters must be an object or the name of a preset")
+
+    unknown = set(config) - set(RULE_KEYS) - {"preset"}
+    if unknown:
+        raise FilterConfigError(f"Unknown filter keys: {sorted(unknown)}")
+
+    rules = {key: [] for key in RULE_KEYS}
+    preset = config.get("preset")
+    if preset is not None:
+        if preset not in PRESETS:
+            raise FilterConfigError(f"Unknown filter preset '{preset}'. Available presets: {sorted(PRESETS)}")
+        for key, values in PRESETS[preset].items():
+            rules[key].extend(values)
+
+    for key in RULE_KEYS:
+        values = config.get(key) or []
+        if not isinstance(values, list):
+            raise FilterConfigError(f"filters.{key} must be a list")
+        rules[key].extend(v for v in values if v not in rules[key])
+
+    for pattern in rules["url_patterns"]:
+        try:
+            re.compile(pattern)
+        except (re.error, TypeError) as e:
+            raise FilterConfigError(f"Invalid url_patterns entry {pattern!r}: {e}")
+    for status in rules["status_codes"]:
+        if not _parse_status(status):
+            raise FilterConfigError(f"Invalid status_codes entry {status!r}; use a code or a class like '4xx'")
+
+    rules = {key: values for key, values in rules.items() if values}
+    return rules or None
+
+
+def filter_fingerprint(config):
+    """Short stable hash of a normalized config, for flow cache variants."""
+    canonical = json.dumps(config, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+def _parse_status(status):
+    """Return a predicate for a status rule (an int or 'Nxx'), or None if invalid."""
+    if isinstance(status, int) and not isinstance(status, bool):
+        return lambda code: code == status
+    if isinstance(status, str):
+        if status.isdigit():
+            return _parse_status(int(status))
+        if len(status) == 3 and status[0].isdigit() and status[1:].lower() == "xx":
+            first = int(status[0])
+            return lambda code: isinstance(code, int) and code // 100 == first
+    return None
+
+
+def _host_matches(host, domain):
+    return host == domain or host.endswith("." + domain)
+
+
+class FlowFilter:
+    """Compiled filter rules with per-rule drop counters."""
+
+    def __init__(self, config):
+        config = config or {}
+        self.config = config
+        self._allow = [d.lower() for d in config.get("allow_domains", [])]
+        self._deny = [d.lower() for d in config.get("deny_domains", [])]
+        self._statuses = [(f"status_code:{s}", _parse_status(s)) for s in config.get("status_codes", [])]
+        self._mime_exact = {}
+        self._mime_prefixes = []
+        for mime in config.get("mime_types", []):
+            mime = mime.lower()
+            if mime.endswith("/*"):
+                self._mime_prefixes.append((mime[:-1], f"mime_type:{mime}"))
+            else:
+                self._mime_exact[mime] = f"mime_type:{mime}"
+        self._patterns = [(re.compile(p, re.IGNORECASE), f"url_pattern:{p}") for p in config.get("url_patterns", [])]
+        self.kept = 0
+        self.dropped = {}
+
+    def drop_reason(self, url, mime_type, status):
+        """Name of the first rule that drops this request, or None to keep it."""
+        if self._allow or self._deny:
+            host = (urlsplit(url).hostname or "").lower()
+            if self._allow and not any(_host_matches(host, d) for d in self._allow):
+                return "allow_domains"
+            for domain in self._deny:
+                if _host_matches(host, domain):
+                    return f"deny_domain:{domain}"
+
+        for rule, matches in self._statuses:
+            if matches(status):
+                return rule
+
+        if mime_type and (self._mime_exact or self._mime_prefixes):
+            mime = mime_type.split(";", 1)[0].strip().lower()
+            rule = self._mime_exact.get(mime)
+            if rule:
+                return rule
+            for prefix, rule in self._mime_prefixes:
+                if mime.startswith(prefix):
+                    return rule
+
+        for pattern, rule in self._patterns:
+            if pattern.search(url):
+                return rule
+        return None
+
+    def _count(self, reason):
+        if reason is None:
+            self.kept += 1
+            return True
+        self.dropped[reason] = self.dropped.get(reason, 0) + 1
+        return False
+
+    def accept_entry(self, entry):
+        """Check a raw HAR entry; returns True to keep it."""
+        request = entry.get('request', {})
+        response = entry.get('response', {})
+        return self._count(self.drop_reason(
+            request.get('url', ''),
+            response.get('content', {}).get('mimeType'),
+            response.get('status')
+        ))
+
+    def accept_flow(self, flow):
+        """Check a converted flow (as returned by /convert); returns True to keep it."""
+        response_body = flow.get('response_body')
+        mime_type = response_body.get('mimeType') if isinstance(response_body, dict) else None
+        return self._count(self.drop_reason(flow.get('url', ''), mime_type, flow.get('status_code')))
+
+    def stats(self):
+        """Counters for the conversion summary."""
+        return {
+            "kept": self.kept,
+            "dropped": sum(self.dropped.values()),
+            "by_rule": dict(sorted(self.dropped.items(), key=lambda item: -item[1]))
+        }
+
+
+def format_stats(stats):
+    """One-line description of filter counters, for generated script headers."""
+    if not stats or not stats["dropped"]:
+        return "none dropped"
+    rules = ", ".join(f"{rule}={count}" for rule, count in stats["by_rule"].items())
+    return f"{stats['dropped']} dropped ({rules})"
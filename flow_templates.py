@@ -0,0 +1,108 @@
+"""
+URL templating and endpoint deduplication for script generation.
+
+Recordings repeat the same few endpoints with only IDs, cache busters or
+session tokens changing. Each URL is normalized into a template:
+
+    /Wizer/UserAdmin/UserProfile?userId=22665  -> /Wizer/UserAdmin/UserProfile?userId={id}
+    /api/orders/9b1d5e2c-4c1a-4f0e-8f3a-2d6c1e7b9a10?_=1759239051683
+                                               -> /api/orders/{uuid}?_={_}
+
+Numeric, UUID and hash-like path segments and query values become typed
+placeholders, and known cache-busting parameters (``_``, ``cacheId``, ...)
+become named ones. Requests with the same method, template and body are
+merged into one EndpointCluster; the generator emits a single task for it,
+weighted by how often it was observed, that replays one of the recorded
+URLs at random.
+"""
+import re
+from urllib.parse import urlsplit
+
+from flow_correlation import context_rules
+
+# Query parameters whose value changes on every request
+VOLATILE_QUERY_PARAMS = {
+    "_", "cacheid", "cachebuster", "cb", "nocache", "t", "ts", "timestamp", "rnd", "random", "v"
+}
+
+_UUID_RE = re.compile(r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$", re.IGNORECASE)
+_NUMBER_RE = re.compile(r"^-?\d+$")
+_HEX_RE = re.compile(r"^[0-9a-f]{16,}$", re.IGNORECASE)
+_TOKEN_RE = re.compile(r"^[A-Za-z0-9_\-]{24,}={0,2}$")
+
+
+def template_value(value):
+    """Placeholder for an ID-like path segment or query value, or None to keep it."""
+    if _NUMBER_RE.match(value):
+        return "{id}"
+    if _UUID_RE.match(value):
+        return "{uuid}"
+    if _HEX_RE.match(value):
+        return "{hash}"
+    if _TOKEN_RE.match(value) and any(c.isdigit() for c in value) and any(c.isalpha() for c in value):
+        return "{token}"
+    return None
+
+
+def template_url(url):
+    """Normalize a URL into its template (scheme and host are kept, the fragment is dropped)."""
+    parts = urlsplit(url)
+    segments = [template_value(segment) or segment for segment in parts.path.split("/")]
+    template = "/".join(segments)
+    if parts.netloc:
+        template = f"{parts.scheme}://{parts.netloc}{template}"
+
+    if parts.query:
+        # Work on the raw query so that untouched values keep their encoding
+        params = []
+        for param in parts.query.split("&"):
+            name, sep, value = param.partition("=")
+            if name.lower() in VOLATILE_QUERY_PARAMS:
+                value = f"{{{name}}}"
+            else:
+                value = template_value(value) or value
+            params.append(f"{name}{sep}{value}")
+        template += "?" + "&".join(params)
+    return template
+
+
+class EndpointCluster:
+    """Requests that share a method, URL template and body."""
+
+    def __init__(self, template, flow):
+        self.template = template
+        self.flow = flow
+        self.urls = []
+        self.count = 0
+        # Union of the members' context rules and keys (see flow_correlation.py)
+        self.extract = []
+        self.use_context = []
+
+    def add(self, flow):
+        self.count += 1
+        if flow["url"] not in self.urls:
+            self.urls.append(flow["url"])
+        for rule in context_rules(flow):
+            if rule not in self.extract:
+                self.extract.append(rule)
+        for key in flow.get("use_context", []):
+            if key not in self.use_context:
+                self.use_context.append(key)
+
+
+def cluster_flows(flows):
+    """
+    Merge flows into EndpointClusters, in order of first appearance.
+
+    The first flow of a cluster supplies its headers and context settings;
+    ``flows`` use the generator format ({"method", "url", "body", ...}).
+    """
+    clusters = {}
+    for flow in flows:
+        template = template_url(flow.get("url", ""))
+        key = (flow.get("method", "GET").upper(), template, flow.get("body") or None)
+        cluster = clusters.get(key)
+        if cluster is None:
+            cluster = clusters[key] = EndpointCluster(template, flow)
+        cluster.add(flow)
+    return list(clusters.values())
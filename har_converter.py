@@ -0,0 +1,251 @@
+"""
+HAR to flow conversion shared by the /convert endpoints.
+
+Flows are built one entry at a time from the incremental parser in
+har_stream.py, and the summary block is accumulated as flows go by instead of
+being recomputed over the full list afterwards. iter_ndjson() serves the
+``stream=ndjson`` response mode, emitting each flow as soon as it is built.
+When a blob store is passed, response bodies are moved out of the flows into
+it and replaced by references (the ``bodies=ref`` conversion mode).
+
+Conversions are expressed as a stream of flow events so that the same
+consumers can be fed either by a fresh parse or by the flow cache:
+
+    ("field", name, value)  - a non-entry member of ``log``
+    ("flow", flow)          - one converted flow
+    ("filtered", stats)     - per-rule drop counts, last, when a filter ran
+"""
+import json
+
+from har_stream import FIELD, ENTRY, HarFormatError, iter_har
+
+FLOW = "flow"
+FILTERED = "filtered"
+
+# Bump whenever the shape of converted flows changes; part of the cache key
+CONVERTER_VERSION = "2"
+
+
+def entry_to_flow(index, entry, body_store=None):
+    """
+    Convert a single HAR entry to a flow entry.
+
+    With a ``body_store`` (see blob_store.py) the response body is stored
+    there and the flow carries only a reference to it.
+    """
+    request = entry.get('request', {})
+    response = entry.get('response', {})
+
+    # Extract request body properly from postData
+    request_body = None
+    post_data = request.get('postData', {})
+    if post_data:
+        if isinstance(post_data, dict):
+            # Extract text content from postData
+            request_body = post_data.get('text', '')
+        else:
+            request_body = str(post_data)
+
+    response_body = response.get('content', {})
+    if body_store is not None:
+        response_body = body_store.externalize(response_body)
+
+    return {
+        "id": f"flow_{index+1}",
+        "name": f"Request {index+1}",
+        "method": request.get('method', 'GET'),
+        "url": request.get('url', ''),
+        "status_code": response.get('status', 200),
+        "response_time": entry.get('time', 0),
+        "request_headers": request.get('headers', []),
+        "response_headers": response.get('headers', []),
+        "request_body": request_body,
+        "response_body": response_body,
+        "timestamp": entry.get('startedDateTime', ''),
+        "pageref": entry.get('pageref'),
+        "flow_type": "http_request"
+    }
+
+
+class FlowSummary:
+    """Incrementally maintained summary block for a flow conversion."""
+
+    def __init__(self):
+        self.total_requests = 0
+        self.domains = set()
+        self.methods = set()
+        self.status_codes = set()
+
+    def add(self, flow):
+        self.total_requests += 1
+        url = flow['url']
+        self.domains.add(url.split('/')[2] if '://' in url else '')
+        self.methods.add(flow['method'])
+        self.status_codes.add(flow['status_code'])
+
+    def to_dict(self):
+        return {
+            "total_requests": self.total_requests,
+            "unique_domains": len(self.domains),
+            "methods": list(self.methods),
+            "status_codes": list(self.status_codes)
+        }
+
+
+def archive_entries(kept, filtered=None):
+    """Entries in the archive: the flows kept plus those a filter dropped."""
+    return kept + (filtered["dropped"] if filtered else 0)
+
+
+def build_metadata(log_fields, total_entries, timestamp):
+    """
+    Build the metadata block from the non-entry members of ``log``.
+
+    ``total_entries`` counts the entries in the archive, including those a
+    filter dropped; the summary's ``total_requests`` counts the flows kept.
+    """
+    return {
+        "version": log_fields.get('version', '1.2'),
+        "creator": log_fields.get('creator', {}),
+        "browser": log_fields.get('browser', {}),
+        "pages": log_fields.get('pages', []),
+        "total_entries": total_entries,
+        "converted_at": timestamp,
+        "requested_at": timestamp
+    }
+
+
+def iter_flow_events(stream, body_store=None, flow_filter=None):
+    """
+    Parse a binary HAR stream into flow events as each entry completes.
+
+    Entries rejected by ``flow_filter`` (see flow_filters.py) are dropped
+    before any flow is built for them; flow ids keep the entry's position in
+    the archive.
+    """
+    for event in iter_har(stream):
+        if event[0] == ENTRY:
+            if flow_filter is not None and not flow_filter.accept_entry(event[2]):
+                continue
+            yield (FLOW, entry_to_flow(event[1], event[2], body_store))
+        else:
+            yield event
+    if flow_filter is not None:
+        yield (FILTERED, flow_filter.stats())
+
+
+def iter_flows(stream, log_fields=None):
+    """
+    Yield flows from a binary HAR stream as soon as each entry is parsed.
+
+    Non-entry members of ``log`` are collected into ``log_fields`` (if given)
+    as they are encountered.
+    """
+    for event in iter_flow_events(stream):
+        if event[0] == FLOW:
+            yield event[1]
+        elif event[0] == FIELD and log_fields is not None:
+            log_fields[event[1]] = event[2]
+
+
+def collect_flow_data(events, timestamp):
+    """Build the full flow_data structure from flow events."""
+    log_fields = {}
+    flows = []
+    summary = FlowSummary()
+    filtered = None
+    for event in events:
+        if event[0] == FLOW:
+            flows.append(event[1])
+            summary.add(event[1])
+        elif event[0] == FILTERED:
+            filtered = event[1]
+        else:
+            log_fields[event[1]] = event[2]
+
+    summary_dict = summary.to_dict()
+    if filtered is not None:
+        summary_dict["filtered"] = filtered
+    return {
+        "metadata": build_metadata(log_fields, archive_entries(len(flows), filtered), timestamp),
+        "flows": flows,
+        "summary": summary_dict
+    }
+
+
+def convert_har_stream(stream, timestamp):
+    """Convert a binary HAR stream to the full flow_data structure."""
+    return collect_flow_data(iter_flow_events(stream), timestamp)
+
+
+def _ndjson_line(record):
+    return (json.dumps(record) + "\n").encode("utf-8")
+
+
+def iter_ndjson(events, timestamp, filename):
+    """
+    Yield flow events as NDJSON lines.
+
+    The metadata record comes first (sent when the first flow is reached),
+    then one ``flow`` record per entry as it is converted, and the ``summary``
+    record last. Metadata members that appear after ``log.entries`` in the
+    archive are reported in full on the summary record.
+    """
+    log_fields = {}
+    summary = FlowSummary()
+    filtered = None
+    metadata_sent = False
+    late_fields = False
+
+    try:
+        for event in events:
+            if event[0] == FIELD:
+                log_fields[event[1]] = event[2]
+                late_fields = late_fields or metadata_sent
+                continue
+            if event[0] == FILTERED:
+                filtered = event[1]
+                continue
+
+            if not metadata_sent:
+                yield _ndjson_line({
+                    "type": "metadata",
+                    "filename": filename,
+                    "timestamp": timestamp,
+                    "metadata": build_metadata(log_fields, None, timestamp)
+                })
+                metadata_sent = True
+
+            flow = event[1]
+            summary.add(flow)
+            yield _ndjson_line({"type": "flow", "flow": flow})
+
+        total_entries = archive_entries(summary.total_requests, filtered)
+        metadata = build_metadata(log_fields, total_entries, timestamp)
+        if not metadata_sent:
+            yield _ndjson_line({
+                "type": "metadata",
+                "filename": filename,
+                "timestamp": timestamp,
+                "metadata": metadata
+            })
+
+        summary_dict = summary.to_dict()
+        if filtered is not None:
+            summary_dict["filtered"] = filtered
+        record = {
+            "type": "summary",
+            "message": "HAR file converted to flow successfully",
+            "total_entries": total_entries,
+            "summary": summary_dict
+        }
+        if late_fields:
+            record["metadata"] = metadata
+        yield _ndjson_line(record)
+
+    except HarFormatError as e:
+        # Headers are already sent, so report the failure in-band
+        yield _ndjson_line({
+            "type": "error",
+            "detail": f"Invalid HAR file format: {e}"
+        })
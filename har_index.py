@@ -0,0 +1,103 @@
+"""
+Byte-offset index of ``log.entries``.
+
+The index is built while a HAR file is uploaded (see har_upload.py) and
+stored next to it as ``<name>.idx.json``. It records where each entry starts
+and ends in the file, so a reader can seek straight to entry N and decode only
+that entry instead of parsing everything before it. Offsets are positions in
+the decompressed document for ``.har.gz``/``.har.zst`` files.
+"""
+import hashlib
+import json
+import os
+import uuid
+from pathlib import Path
+
+from har_stream import CHUNK_SIZE, ENTRY, FIELD, HarStreamParser
+from har_storage import open_har
+
+INDEX_SUFFIX = ".idx.json"
+INDEX_VERSION = 1
+
+
+def index_path(har_path):
+    return Path(f"{har_path}{INDEX_SUFFIX}")
+
+
+class HarIndexBuilder:
+    """Collects entry byte spans and log member names from parser events."""
+
+    def __init__(self):
+        self.offsets = []
+        self.fields = []
+
+    def add(self, events):
+        for event in events:
+            if event[0] == ENTRY:
+                self.offsets.append((event[3], event[4]))
+            elif event[0] == FIELD:
+                self.fields.append(event[1])
+
+    @property
+    def entries(self):
+        return len(self.offsets)
+
+    def to_dict(self, sha256):
+        return {
+            "version": INDEX_VERSION,
+            "sha256": sha256,
+            "entries": len(self.offsets),
+            "fields": self.fields,
+            "offsets": self.offsets
+        }
+
+
+def write_index(har_path, index):
+    """Store ``index`` next to ``har_path``, stamped with the file's size and mtime."""
+    path = index_path(har_path)
+    stat = Path(har_path).stat()
+    index = dict(index, size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+    tmp = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(index, f, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+def load_index(har_path):
+    """Return the index for ``har_path``, or None if missing or stale."""
+    try:
+        with open(index_path(har_path), "r", encoding="utf-8") as f:
+            index = json.load(f)
+        stat = Path(har_path).stat()
+    except (OSError, ValueError):
+        return None
+    if (index.get("version") != INDEX_VERSION or index.get("size") != stat.st_size
+            or index.get("mtime_ns") != stat.st_mtime_ns):
+        return None
+    return index
+
+
+def build_index(har_path):
+    """Scan an existing HAR file (e.g. one copied into uploads/ by hand) and index it."""
+    sha256 = hashlib.sha256()
+    parser = HarStreamParser()
+    builder = HarIndexBuilder()
+    with open_har(har_path) as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            builder.add(parser.feed(chunk))
+            sha256.update(chunk)
+    builder.add(parser.close())
+    write_index(har_path, builder.to_dict(sha256.hexdigest()))
+    return load_index(har_path)
+
+
+def iter_indexed_entries(har_path, index, start=0, stop=None):
+    """Yield ``(i, entry)`` for entries ``start:stop``, seeking to each one."""
+    offsets = index["offsets"][start:stop]
+    with open_har(har_path) as f:
+        for i, (begin, end) in enumerate(offsets, start):
+            f.seek(begin)
+            yield i, json.loads(f.read(end - begin))
@@ -0,0 +1,194 @@
+"""
+Compressed HAR storage.
+
+Recordings can be stored in uploads/ as ``.har``, ``.har.gz`` or ``.har.zst``.
+Readers go through open_har(), which stream-decompresses on the fly, so the
+parser, the flow cache and the upload index always see the plain HAR bytes:
+digests and entry offsets refer to the decompressed document, whatever the
+file on disk looks like.
+
+zstd support needs the optional ``zstandard`` package; gzip and plain files
+work without it.
+"""
+import gzip
+import os
+import uuid
+import zlib
+from pathlib import Path
+
+from har_stream import CHUNK_SIZE, HarFormatError
+
+try:
+    import zstandard
+except ImportError:  # optional; only needed for .har.zst
+    zstandard = None
+
+GZIP = "gzip"
+ZSTD = "zstd"
+
+# Compression suffix -> codec
+CODEC_SUFFIXES = {".gz": GZIP, ".zst": ZSTD}
+SUFFIX_FOR_CODEC = {GZIP: ".gz", ZSTD: ".zst"}
+HAR_SUFFIXES = (".har", ".har.gz", ".har.zst")
+
+DEFAULT_LEVELS = {GZIP: 6, ZSTD: 10}
+
+
+class UnsupportedCompression(ValueError):
+    """Raised for a codec this installation cannot read or write."""
+
+
+def _require(codec):
+    if codec == ZSTD and zstandard is None:
+        raise UnsupportedCompression("zstd compressed HAR files need the 'zstandard' package")
+    if codec not in (None, GZIP, ZSTD):
+        raise UnsupportedCompression(f"Unknown HAR compression '{codec}'")
+
+
+def har_codec(path):
+    """Codec of a HAR file from its name: None, 'gzip' or 'zstd'."""
+    return CODEC_SUFFIXES.get(Path(path).suffix.lower())
+
+
+def is_har_filename(name):
+    return name.lower().endswith(HAR_SUFFIXES)
+
+
+def har_base_name(name):
+    """``name`` without its compression suffix (``x.har.gz`` -> ``x.har``)."""
+    if har_codec(name):
+        return name[:name.rfind(".")]
+    return name
+
+
+def har_variants(path):
+    """All storage variants of a HAR path, plain first."""
+    base = har_base_name(str(path))
+    return [Path(base)] + [Path(base + suffix) for suffix in SUFFIX_FOR_CODEC.values()]
+
+
+class HarDecoder:
+    """
+    Incremental decompressor for raw chunks of a (possibly) compressed HAR.
+
+    Handles concatenated gzip members and zstd frames. Corrupt data is
+    reported as HarFormatError like any other malformed upload.
+    """
+
+    def __init__(self, codec):
+        _require(codec)
+        self.codec = codec
+        self._obj = self._new()
+        self._offset = 0
+        self._started = False
+
+    def _new(self):
+        if self.codec == GZIP:
+            return zlib.decompressobj(zlib.MAX_WBITS | 16)
+        if self.codec == ZSTD:
+            return zstandard.ZstdDecompressor().decompressobj()
+        return None
+
+    def decompress(self, data):
+        if self._obj is None:
+            return data
+        raw_len = len(data)
+        out = []
+        try:
+            while data:
+                self._started = True
+                out.append(self._obj.decompress(data))
+                data = self._obj.unused_data if self._obj.eof else b""
+                if self._obj.eof:
+                    self._obj = self._new()
+                    self._started = bool(data)
+        except (zlib.error, getattr(zstandard, "ZstdError", zlib.error)) as e:
+            raise HarFormatError(f"Invalid {self.codec} data: {e}", self._offset) from None
+        self._offset += raw_len
+        return b"".join(out)
+
+    def finish(self):
+        """Check that the compressed stream did not end mid-frame."""
+        if self._obj is not None and self._started:
+            raise HarFormatError(f"Truncated {self.codec} data", self._offset)
+
+
+class HarFile:
+    """Binary reader over a plain or compressed HAR file."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.codec = har_codec(path)
+        _require(self.codec)
+        self.raw = open(path, "rb")
+        self.stream = self._wrap()
+
+    def _wrap(self):
+        if self.codec == GZIP:
+            return gzip.GzipFile(fileobj=self.raw, mode="rb")
+        if self.codec == ZSTD:
+            return zstandard.ZstdDecompressor().stream_reader(self.raw, read_across_frames=True, closefd=False)
+        return self.raw
+
+    def read(self, size=-1):
+        return self.stream.read(size)
+
+    @property
+    def raw_position(self):
+        """Bytes of the file on disk read so far, for progress reporting."""
+        return self.raw.tell()
+
+    def seek(self, offset):
+        """Seek to an offset in the decompressed document."""
+        if self.codec == ZSTD and offset < self.stream.tell():
+            # zstd readers only seek forward; start over for a backward seek
+            self.raw.seek(0)
+            self.stream = self._wrap()
+        self.stream.seek(offset)
+
+    def close(self):
+        if self.stream is not self.raw:
+            self.stream.close()
+        self.raw.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_har(path):
+    """Open a HAR file for reading, decompressing transparently by suffix."""
+    return HarFile(path)
+
+
+def compress_har(src_path, codec, level=None):
+    """
+    Recompress a plain HAR file at rest.
+
+    Writes ``<src>.gz``/``<src>.zst`` through a temp file, removes the plain
+    file and returns the new path.
+    """
+    _require(codec)
+    level = level or DEFAULT_LEVELS[codec]
+    src_path = Path(src_path)
+    dest_path = Path(f"{src_path}{SUFFIX_FOR_CODEC[codec]}")
+    tmp = dest_path.with_name(f"{dest_path.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        with open(src_path, "rb") as src, open(tmp, "wb") as out:
+            if codec == GZIP:
+                compressor = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+            else:
+                compressor = zstandard.ZstdCompressor(level=level).compressobj()
+            while True:
+                chunk = src.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                out.write(compressor.compress(chunk))
+            out.write(compressor.flush())
+        os.replace(tmp, dest_path)
+    finally:
+        tmp.unlink(missing_ok=True)
+    src_path.unlink()
+    return dest_path
@@ -0,0 +1,267 @@
+"""
+Incremental HAR parser.
+
+Walks ``log.entries`` of a HAR archive one entry at a time instead of loading
+the whole document with ``json.load``. The parser is push based: feed it raw
+bytes as they arrive (from an upload stream or a file in ``uploads/``) and it
+hands back events as soon as each value is complete, so peak memory tracks the
+largest single entry rather than the size of the archive.
+
+Events are plain tuples:
+
+    ("field", name, value)               - any ``log`` member other than entries
+    ("entry", index, entry, start, end)  - one parsed entry plus its byte span
+"""
+import json
+import codecs
+from json.decoder import WHITESPACE
+
+FIELD = "field"
+ENTRY = "entry"
+
+# Default read size used by iter_har()
+CHUNK_SIZE = 256 * 1024
+
+# Refuse to buffer a single JSON value larger than this (characters)
+MAX_VALUE_CHARS = 512 * 1024 * 1024
+
+# Parser states
+_ROOT_START = 0
+_ROOT_KEY = 1
+_ROOT_COLON = 2
+_ROOT_VALUE = 3
+_ROOT_NEXT = 4
+_LOG_START = 5
+_LOG_KEY = 6
+_LOG_COLON = 7
+_LOG_VALUE = 8
+_LOG_NEXT = 9
+_ENTRIES_START = 10
+_ENTRY_VALUE = 11
+_ENTRY_NEXT = 12
+_DONE = 13
+
+_INCOMPLETE = object()
+
+
+class HarFormatError(ValueError):
+    """Raised when the stream is not a structurally valid HAR document."""
+
+    def __init__(self, message, offset):
+        super().__init__(message, offset)
+        self.message = message
+        self.offset = offset
+
+    def __str__(self):
+        return f"{self.message} (at byte {self.offset})"
+
+
+class HarStreamParser:
+    """Push parser that emits HAR log fields and entries incrementally."""
+
+    def __init__(self, max_value_chars=MAX_VALUE_CHARS):
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._json = json.JSONDecoder()
+        self._max_value_chars = max_value_chars
+        self._buf = ""
+        self._pos = 0
+        self._offset = 0  # byte offset of self._buf[self._pos] in the stream
+        self._pending = []  # text received while waiting for a large value
+        self._pending_len = 0
+        self._retry_at = 0
+        self._end = 0
+        self._state = _ROOT_START
+        self._key = None
+        self._entry_index = 0
+
+    @property
+    def entries_seen(self):
+        """Number of entries emitted so far."""
+        return self._entry_index
+
+    @property
+    def bytes_consumed(self):
+        """Byte offset up to which the stream has been parsed."""
+        return self._offset
+
+    @property
+    def finished(self):
+        """True once the closing brace of the document has been parsed."""
+        return self._state == _DONE
+
+    def feed(self, data):
+        """Feed raw bytes and return the list of events they completed."""
+        text = self._decoder.decode(data)
+        if not text:
+            return []
+        self._pending.append(text)
+        self._pending_len += len(text)
+        if self._pending_len + len(self._buf) - self._pos < self._retry_at:
+            # Still waiting for the rest of a large value - don't re-scan yet
+            if self._pending_len > self._max_value_chars:
+                raise HarFormatError("JSON value exceeds the maximum supported size", self._offset)
+            return []
+        return self._drain(final=False)
+
+    def flush(self):
+        """Parse everything fed so far, even while waiting for a large value, and return its events."""
+        return self._drain(final=False)
+
+    def close(self):
+        """Signal end of stream and return any remaining events."""
+        text = self._decoder.decode(b"", final=True)
+        if text:
+            self._pending.append(text)
+            self._pending_len += len(text)
+        events = self._drain(final=True)
+        if self._state != _DONE:
+            raise HarFormatError("Unexpected end of HAR document", self._offset)
+        return events
+
+    def _drain(self, final):
+        if self._pending:
+            self._buf = self._buf[self._pos:] + "".join(self._pending)
+            self._pos = 0
+            self._pending = []
+            self._pending_len = 0
+
+        events = []
+        buf = self._buf
+        while True:
+            pos = WHITESPACE.match(buf, self._pos).end()
+            if pos != self._pos:
+                self._advance(pos)
+            if pos >= len(buf):
+                break
+
+            state = self._state
+            ch = buf[pos]
+
+            if state == _ROOT_START:
+                if ch == "\ufeff":
+                    self._advance(pos + 1)
+                    continue
+                self._expect(ch, "{", _ROOT_KEY)
+            elif state in (_ROOT_KEY, _LOG_KEY):
+                if ch == "}":
+                    self._advance(pos + 1)
+                    self._state = _DONE if state == _ROOT_KEY else _ROOT_NEXT
+                    continue
+                key = self._decode(final)
+                if key is _INCOMPLETE:
+                    break
+                if not isinstance(key, str):
+                    raise HarFormatError("Expected an object key", self._offset)
+                self._key = key
+                self._advance(self._end)
+                self._state = _ROOT_COLON if state == _ROOT_KEY else _LOG_COLON
+            elif state in (_ROOT_COLON, _LOG_COLON):
+                self._expect(ch, ":", _ROOT_VALUE if state == _ROOT_COLON else _LOG_VALUE)
+            elif state == _ROOT_VALUE:
+                if self._key == "log":
+                    if ch != "{":
+                        raise HarFormatError("'log' must be an object", self._offset)
+                    self._advance(pos + 1)
+                    self._state = _LOG_START
+                    continue
+                # Unknown top-level member - parse it to skip over it
+                if self._decode(final) is _INCOMPLETE:
+                    break
+                self._advance(self._end)
+                self._state = _ROOT_NEXT
+            elif state in (_ROOT_NEXT, _LOG_NEXT):
+                if ch == ",":
+                    self._advance(pos + 1)
+                    self._state = _ROOT_KEY if state == _ROOT_NEXT else _LOG_KEY
+                else:
+                    self._expect(ch, "}", _DONE if state == _ROOT_NEXT else _ROOT_NEXT)
+            elif state == _LOG_START:
+                if ch == "}":
+                    self._advance(pos + 1)
+                    self._state = _ROOT_NEXT
+                else:
+                    self._state = _LOG_KEY
+            elif state == _LOG_VALUE:
+                if self._key == "entries":
+                    self._expect(ch, "[", _ENTRIES_START)
+                    continue
+                value = self._decode(final)
+                if value is _INCOMPLETE:
+                    break
+                self._advance(self._end)
+                events.append((FIELD, self._key, value))
+                self._state = _LOG_NEXT
+            elif state in (_ENTRIES_START, _ENTRY_VALUE):
+                if ch == "]" and state == _ENTRIES_START:
+                    self._advance(pos + 1)
+                    self._state = _LOG_NEXT
+                    continue
+                entry = self._decode(final)
+                if entry is _INCOMPLETE:
+                    break
+                start = self._offset
+                self._advance(self._end)
+                events.append((ENTRY, self._entry_index, entry, start, self._offset))
+                self._entry_index += 1
+                self._state = _ENTRY_NEXT
+            elif state == _ENTRY_NEXT:
+                if ch == ",":
+                    self._advance(pos + 1)
+                    self._state = _ENTRY_VALUE
+                else:
+                    self._expect(ch, "]", _LOG_NEXT)
+            else:
+                raise HarFormatError("Unexpected data after end of HAR document", self._offset)
+
+        return events
+
+    def _expect(self, ch, expected, next_state):
+        if ch != expected:
+            raise HarFormatError(f"Expected '{expected}' but found '{ch}'", self._offset)
+        self._advance(self._pos + 1)
+        self._state = next_state
+
+    def _decode(self, final):
+        """Decode one JSON value at the current position, or return _INCOMPLETE."""
+        buf = self._buf
+        try:
+            value, end = self._json.raw_decode(buf, self._pos)
+        except json.JSONDecodeError as e:
+            if final:
+                raise HarFormatError(f"Invalid JSON: {e.msg}", self._offset) from None
+            waiting = len(buf) - self._pos
+            if waiting > self._max_value_chars:
+                raise HarFormatError("JSON value exceeds the maximum supported size", self._offset) from None
+            # Wait until the buffered text doubles before trying again so that a
+            # value spread over many chunks is only re-scanned O(log n) times
+            self._retry_at = max(2 * waiting, CHUNK_SIZE)
+            return _INCOMPLETE
+        if end >= len(buf) and not final:
+            # A number at the very end of the buffer may still be growing
+            self._retry_at = len(buf) - self._pos + 1
+            return _INCOMPLETE
+        self._retry_at = 0
+        self._end = end
+        return value
+
+    def _advance(self, end):
+        self._offset += len(self._buf[self._pos:end].encode("utf-8"))
+        self._pos = end
+
+
+def iter_har(stream, chunk_size=CHUNK_SIZE, parser=None):
+    """Yield parser events for a binary file-like object."""
+    parser = parser or HarStreamParser()
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        yield from parser.feed(chunk)
+    yield from parser.close()
+
+
+def iter_har_entries(stream, chunk_size=CHUNK_SIZE):
+    """Yield ``(index, entry)`` pairs for a binary file-like object."""
+    for event in iter_har(stream, chunk_size):
+        if event[0] == ENTRY:
+            yield event[1], event[2]
@@ -0,0 +1,322 @@
+"""
+Validated and resumable HAR uploads.
+
+Every byte written to uploads/ goes through HarUploadWriter, which hashes it
+and feeds it to the incremental parser on the way to disk. A malformed
+archive is rejected as soon as the offending bytes arrive rather than at
+/convert time, and when the last byte lands the SHA-256 (for the flow cache)
+and the entry byte-offset index (see har_index.py) are already known. Data is
+written to a part file and renamed into place only once it is complete.
+
+Compressed uploads (``.har.gz``, ``.har.zst``) are stored as sent and
+decompressed on the fly for validation and hashing; plain uploads can be
+recompressed at rest once complete.
+
+Upload sessions extend this to chunked transfers: chunks are appended at an
+explicit offset, so a client whose connection dropped asks for the current
+offset and continues from there. Session metadata is kept on disk and the
+hash/parser state is rebuilt from the part file after a restart.
+"""
+import hashlib
+import json
+import os
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+from har_stream import CHUNK_SIZE, HarStreamParser
+from har_index import HarIndexBuilder, index_path, write_index
+from har_storage import HarDecoder, compress_har, har_codec, har_variants
+
+
+# Part files without an upload are only removed once they are this old (seconds)
+PART_MAX_AGE = 3600
+
+
+class UploadOffsetMismatch(Exception):
+    """Raised when a chunk does not start at the session's current offset."""
+
+    def __init__(self, expected, received):
+        super().__init__(f"Chunk offset {received} does not match upload offset {expected}")
+        self.expected = expected
+        self.received = received
+
+
+class UploadVerificationError(ValueError):
+    """Raised when a completed upload does not match its declared size or hash."""
+
+
+class HarUploadWriter:
+    """
+    Writes a HAR file while hashing, validating and indexing it.
+
+    ``codec`` is the compression of the incoming bytes; they are written as
+    they are, while the digest and index cover the decompressed document.
+    """
+
+    def __init__(self, path, codec=None, append=False):
+        self.path = Path(path)
+        self.size = 0
+        self._decoder = HarDecoder(codec)
+        self._sha256 = hashlib.sha256()
+        self._parser = HarStreamParser()
+        self._index = HarIndexBuilder()
+        if append:
+            self._replay()
+        self._file = open(self.path, "ab" if append else "wb")
+
+    def _replay(self):
+        # Rebuild hash and parser state from data written before a restart
+        with open(self.path, "rb") as f:
+            while True:
+                chunk = f.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                self._consume(chunk)
+
+    def _consume(self, data):
+        plain = self._decoder.decompress(data)
+        self._index.add(self._parser.feed(plain))
+        self._sha256.update(plain)
+        self.size += len(data)
+
+    @property
+    def entries_seen(self):
+        return self._index.entries
+
+    @property
+    def document_complete(self):
+        """True once the closing brace of the HAR document has been written."""
+        if not self._parser.finished:
+            # The parser holds back small writes while a value is incomplete
+            self._index.add(self._parser.flush())
+        return self._parser.finished
+
+    def write(self, data):
+        """Validate and append ``data``; raises HarFormatError before writing invalid bytes."""
+        self._consume(data)
+        self._file.write(data)
+
+    def finish(self):
+        """Check that the document is complete and flush it; returns (digest, index)."""
+        self._decoder.finish()
+        self._index.add(self._parser.close())
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        digest = self._sha256.hexdigest()
+        return digest, self._index.to_dict(digest)
+
+    def close(self):
+        self._file.close()
+
+
+def install_upload(part_path, dest_path, index, compression=None):
+    """
+    Atomically move a finished part file into place and store its index.
+
+    Other stored variants of the same recording (``x.har`` vs ``x.har.gz``)
+    are removed so readers never pick up a stale copy. Plain files are
+    recompressed with ``compression`` if given. Returns the stored path.
+    """
+    dest_path = Path(dest_path)
+    for variant in har_variants(dest_path):
+        if variant != dest_path:
+            variant.unlink(missing_ok=True)
+            index_path(variant).unlink(missing_ok=True)
+    os.replace(part_path, dest_path)
+    if compression and har_codec(dest_path) is None:
+        index_path(dest_path).unlink(missing_ok=True)
+        dest_path = compress_har(dest_path, compression)
+    write_index(dest_path, index)
+    return dest_path
+
+
+def save_har_upload(stream, dest_path, part_dir, compression=None, chunk_size=CHUNK_SIZE):
+    """
+    Save a binary stream as a validated HAR file at ``dest_path``.
+
+    The part file is written in ``part_dir``, which must not be the upload
+    sessions directory (its cleanup removes part files without a session).
+    Returns (stored path, SHA-256 hex digest, size, index). Raises
+    HarFormatError and leaves ``dest_path`` untouched if the stream is not a
+    valid HAR document.
+    """
+    part_path = Path(part_dir) / f"{uuid.uuid4().hex}.part"
+    writer = HarUploadWriter(part_path, har_codec(dest_path))
+    try:
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            writer.write(chunk)
+        digest, index = writer.finish()
+        stored_path = install_upload(part_path, dest_path, index, compression)
+        return stored_path, digest, writer.size, index
+    finally:
+        writer.close()
+        part_path.unlink(missing_ok=True)
+
+
+def remove_stale_parts(part_dir, max_age=PART_MAX_AGE, keep=None):
+    """
+    Delete ``*.part`` files in ``part_dir`` not modified for ``max_age`` seconds.
+
+    Files for which ``keep(path)`` is true are left alone. Returns the number
+    of files removed.
+    """
+    cutoff = time.time() - max_age
+    removed = 0
+    for part in Path(part_dir).glob("*.part"):
+        if keep is not None and keep(part):
+            continue
+        try:
+            if part.stat().st_mtime > cutoff:
+                continue
+            part.unlink()
+        except OSError:
+            continue
+        removed += 1
+    return removed
+
+
+class UploadSession:
+    """One chunked upload in progress."""
+
+    def __init__(self, upload_id, filename, part_path, expected_size=None, expected_sha256=None,
+                 created_at=None, resume=False):
+        self.id = upload_id
+        self.filename = filename
+        self.part_path = part_path
+        self.expected_size = expected_size
+        self.expected_sha256 = expected_sha256
+        self.created_at = created_at or datetime.now().isoformat()
+        self.busy = False
+        self.writer = HarUploadWriter(part_path, har_codec(filename), append=resume)
+
+    @property
+    def offset(self):
+        return self.writer.size
+
+    def check_offset(self, offset):
+        if offset != self.offset:
+            raise UploadOffsetMismatch(self.offset, offset)
+
+    def write(self, data):
+        self.writer.write(data)
+
+    def to_dict(self):
+        return {
+            "upload_id": self.id,
+            "filename": self.filename,
+            "offset": self.offset,
+            "size": self.expected_size,
+            "entries_seen": self.writer.entries_seen,
+            "created_at": self.created_at
+        }
+
+
+class UploadSessionManager:
+    """Creates, resumes and completes chunked upload sessions."""
+
+    def __init__(self, sessions_dir, upload_dir, compression=None):
+        self.sessions_dir = Path(sessions_dir)
+        self.sessions_dir.mkdir(parents=True, exist_ok=True)
+        self.upload_dir = Path(upload_dir)
+        self.compression = compression
+        self.sessions = {}
+
+    def _meta_path(self, upload_id):
+        return self.sessions_dir / f"{upload_id}.json"
+
+    def create(self, filename, expected_size=None, expected_sha256=None):
+        upload_id = uuid.uuid4().hex
+        created_at = datetime.now().isoformat()
+        # Metadata first: a part file without it is an orphan to cleanup()
+        with open(self._meta_path(upload_id), "w", encoding="utf-8") as f:
+            json.dump({
+                "filename": filename,
+                "size": expected_size,
+                "sha256": expected_sha256,
+                "created_at": created_at
+            }, f)
+        try:
+            session = UploadSession(
+                upload_id, filename, self.sessions_dir / f"{upload_id}.part",
+                expected_size, expected_sha256, created_at
+            )
+        except BaseException:
+            self._meta_path(upload_id).unlink(missing_ok=True)
+            raise
+        self.sessions[upload_id] = session
+        return session
+
+    def get(self, upload_id):
+        """Return the session, restoring it from disk after a restart; None if unknown."""
+        session = self.sessions.get(upload_id)
+        if session is not None:
+            return session
+        if not upload_id.isalnum():
+            return None
+        try:
+            with open(self._meta_path(upload_id), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        part_path = self.sessions_dir / f"{upload_id}.part"
+        part_path.touch()
+        session = UploadSession(
+            upload_id, meta["filename"], part_path, meta.get("size"), meta.get("sha256"),
+            meta.get("created_at"), resume=True
+        )
+        self.sessions[upload_id] = session
+        return session
+
+    def complete(self, session):
+        """
+        Finish the upload and move it into the upload directory.
+
+        Returns (path, digest, size, index). If data is still missing the
+        session is kept so the client can resume; otherwise it is discarded
+        whether or not verification succeeds.
+        """
+        if session.expected_size is not None and session.offset != session.expected_size:
+            raise UploadVerificationError(
+                f"Received {session.offset} bytes but the upload declared {session.expected_size}"
+            )
+        if not session.writer.document_complete:
+            raise UploadVerificationError(
+                f"HAR document is incomplete after {session.offset} bytes"
+            )
+
+        try:
+            digest, index = session.writer.finish()
+            if session.expected_sha256 and digest != session.expected_sha256.lower():
+                raise UploadVerificationError(f"SHA-256 mismatch: received content hashes to {digest}")
+            dest_path = install_upload(
+                session.part_path, self.upload_dir / session.filename, index, self.compression
+            )
+            return dest_path, digest, session.offset, index
+        finally:
+            self.abort(session)
+
+    def abort(self, session):
+        session.writer.close()
+        self.sessions.pop(session.id, None)
+        session.part_path.unlink(missing_ok=True)
+        self._meta_path(session.id).unlink(missing_ok=True)
+
+    def cleanup(self, max_age=PART_MAX_AGE):
+        """
+        Remove part files left without session metadata.
+
+        Only files untouched for ``max_age`` seconds are removed, so a session
+        being created concurrently keeps its part file. Returns the number removed.
+        """
+        active = {session.part_path for session in self.sessions.values()}
+        return remove_stale_parts(
+            self.sessions_dir, max_age,
+            keep=lambda part: part in active or self._meta_path(part.stem).exists()
+        )
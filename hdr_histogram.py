@@ -0,0 +1,211 @@
+"""
+HDR-style latency histograms for generated scripts.
+
+Values (microseconds in generated scripts) are counted in buckets whose width
+grows with the value, so every recorded value is kept to a fixed number of
+significant decimal digits over the whole range:
+
+    HdrLayout(1, 60_000_000, 2)  - 1 µs to 60 s, within 1%, 2560 counters
+
+An HdrLayout holds the index arithmetic (the HdrHistogram scheme: a power of
+two bucket plus a linear sub-bucket). An HdrHistogram is one flat array of
+counters over a layout. Merging two histograms adds counters. Sparse
+``[index, count, ...]`` lists carry deltas between processes and time
+windows; they only need the sender's layout to be decoded.
+
+Buckets only bound a value to within their width, so each histogram also
+keeps its exact extremes: ``(min, max, overflow)``, where overflow counts the
+values above the layout's highest value. Those are recorded in the highest
+bucket, so quantiles past them are capped at the layout's range, but the
+reported max is the value actually recorded.
+
+This module is inlined into generated scripts (see
+locust_generator.TEMPLATE_HEADER), so it must only use the standard library.
+"""
+import math
+from array import array
+
+LOWEST_VALUE = 1
+HIGHEST_VALUE = 60_000_000
+SIGNIFICANT_FIGURES = 2
+QUANTILES = (0.5, 0.75, 0.9, 0.95, 0.99, 0.999, 0.9999)
+
+
+class HdrLayout:
+    """Bucket layout for values in [lowest, highest] kept to significant_figures digits"""
+
+    def __init__(self, lowest=LOWEST_VALUE, highest=HIGHEST_VALUE, significant_figures=SIGNIFICANT_FIGURES):
+        if not 1 <= significant_figures <= 5:
+            raise ValueError(f"significant_figures must be between 1 and 5, got {significant_figures}")
+        if lowest < 1 or highest < 2 * lowest:
+            raise ValueError(f"Invalid value range {lowest}..{highest}")
+        self.lowest = int(lowest)
+        self.highest = int(highest)
+        self.significant_figures = int(significant_figures)
+
+        sub_bucket_count_magnitude = math.ceil(math.log2(2 * 10 ** self.significant_figures))
+        self.sub_bucket_half_count_magnitude = sub_bucket_count_magnitude - 1
+        self.sub_bucket_half_count = 1 << self.sub_bucket_half_count_magnitude
+        self.unit_magnitude = int(math.log2(self.lowest))
+        self.sub_bucket_mask = ((1 << sub_bucket_count_magnitude) - 1) << self.unit_magnitude
+        self._offset = self.unit_magnitude + self.sub_bucket_half_count_magnitude + 1
+
+        buckets = 1
+        smallest_untrackable = 1 << (sub_bucket_count_magnitude + self.unit_magnitude)
+        while smallest_untrackable <= self.highest:
+            smallest_untrackable <<= 1
+            buckets += 1
+        self.length = (buckets + 1) * self.sub_bucket_half_count
+
+    @property
+    def config(self):
+        return (self.lowest, self.highest, self.significant_figures)
+
+    def index(self, value):
+        """Counter index for a value (clamped to the layout's range; see HdrHistogram.overflow)"""
+        if value > self.highest:
+            value = self.highest
+        elif value < 0:
+            value = 0
+        bucket = (value | self.sub_bucket_mask).bit_length() - self._offset
+        return ((bucket + 1) << self.sub_bucket_half_count_magnitude) + (value >> (bucket + self.unit_magnitude)) - self.sub_bucket_half_count
+
+    def value_range(self, index):
+        """Lowest and highest value counted at an index"""
+        bucket = (index >> self.sub_bucket_half_count_magnitude) - 1
+        sub_bucket = (index & (self.sub_bucket_half_count - 1)) + self.sub_bucket_half_count
+        if bucket < 0:
+            sub_bucket -= self.sub_bucket_half_count
+            bucket = 0
+        low = sub_bucket << (bucket + self.unit_magnitude)
+        return low, low + (1 << (bucket + self.unit_magnitude)) - 1
+
+
+def merge_extremes(extremes, other):
+    """Combine two ``(min, max, overflow)`` tuples; min and max are None when nothing was recorded"""
+    lowest, highest, overflow = extremes
+    other_lowest, other_highest, other_overflow = other
+    if lowest is None or (other_lowest is not None and other_lowest < lowest):
+        lowest = other_lowest
+    if highest is None or (other_highest is not None and other_highest > highest):
+        highest = other_highest
+    return (lowest, highest, overflow + other_overflow)
+
+
+class HdrHistogram:
+    """Array-backed counters over an HdrLayout"""
+
+    def __init__(self, layout):
+        self.layout = layout
+        self.counts = array("q", bytes(8 * layout.length))
+        self.total = 0
+        self.min = self.max = None
+        self.overflow = 0
+        self._summary = None
+
+    @property
+    def extremes(self):
+        return (self.min, self.max, self.overflow)
+
+    def _add_extremes(self, extremes):
+        self.min, self.max, self.overflow = merge_extremes(self.extremes, extremes)
+
+    def record(self, value, count=1):
+        self.counts[self.layout.index(value)] += count
+        self.total += count
+        self._add_extremes((value, value, count if value > self.layout.highest else 0))
+
+    def copy(self):
+        histogram = HdrHistogram.__new__(HdrHistogram)
+        histogram.layout = self.layout
+        histogram.counts = array("q", self.counts)
+        histogram.total = self.total
+        histogram.min, histogram.max, histogram.overflow = self.extremes
+        histogram._summary = None
+        return histogram
+
+    def add(self, other):
+        """Add another histogram's counts (any layout)"""
+        if other.layout.config == self.layout.config:
+            counts = self.counts
+            for index, count in enumerate(other.counts):
+                if count:
+                    counts[index] += count
+            self.total += other.total
+            self._add_extremes(other.extremes)
+        else:
+            self.add_sparse(other.sparse(), other.layout, other.extremes)
+
+    def add_sparse(self, sparse, layout=None, extremes=None):
+        """
+        Add counts from a sparse ``{index: count}`` dict or ``[index, count, ...]`` list.
+
+        ``layout`` is the layout the indexes refer to, when it is not this one.
+        ``extremes`` are the sender's exact ``(min, max, overflow)``; without
+        them, min and max are taken from the edges of the buckets.
+        """
+        pairs = sparse.items() if isinstance(sparse, dict) else list(zip(sparse[::2], sparse[1::2]))
+        layout = layout or self.layout
+        counts = self.counts
+        if layout.config == self.layout.config:
+            for index, count in pairs:
+                counts[index] += count
+                self.total += count
+        else:
+            for index, count in pairs:
+                low, high = layout.value_range(index)
+                counts[self.layout.index((low + high) // 2)] += count
+                self.total += count
+        if extremes is None and pairs:
+            indexes = [index for index, count in pairs if count]
+            if indexes:
+                extremes = (layout.value_range(min(indexes))[0], layout.value_range(max(indexes))[1], 0)
+        if extremes is not None:
+            self._add_extremes(extremes)
+
+    def sparse(self):
+        """Non-zero counters as a flat ``[index, count, ...]`` list"""
+        sparse = []
+        for index, count in enumerate(self.counts):
+            if count:
+                sparse += (index, count)
+        return sparse
+
+    def summary(self, quantiles, bounds):
+        """
+        ``(min, max, values at quantiles, counts at or below bounds)`` in one pass.
+
+        Quantiles are reported as the highest value equivalent to the recorded
+        ones, as HdrHistogram does, but never above the exact max. A bucket
+        that straddles a bound is counted against the next bound, so a count
+        may miss values below its bound by up to one bucket width (the
+        layout's precision) but never includes values above it. Min and max
+        are exact. The result is cached until the next change.
+        """
+        key = (self.total, self.extremes, quantiles, bounds)
+        if self._summary is not None and self._summary[0] == key:
+            return self._summary[1]
+        layout = self.layout
+        targets = [max(1, math.ceil(q * self.total)) for q in quantiles]
+        values = [0] * len(quantiles)
+        below = [0] * len(bounds)
+        highest = self.max or 0
+        seen = 0
+        q = b = 0
+        for index, count in enumerate(self.counts):
+            if not count:
+                continue
+            low, high = layout.value_range(index)
+            while b < len(bounds) and bounds[b] < high:
+                below[b] = seen
+                b += 1
+            seen += count
+            while q < len(targets) and targets[q] <= seen:
+                values[q] = min(high, highest)
+                q += 1
+        while b < len(bounds):
+            below[b] = seen
+            b += 1
+        result = (self.min or 0, highest, values, below)
+        self._summary = (key, result)
+        return result
@@ -0,0 +1,215 @@
+"""
+Asynchronous job queue for HAR conversion and script generation.
+
+Submitting a job returns its id immediately; the work itself runs on the
+process pool from workers.py. A fixed number of job workers pull from a
+bounded queue, which caps how many jobs run at once, and a submit against a
+full queue is rejected so the API can answer 429 instead of piling up work.
+
+Job functions report progress through a small JSON file (see
+workers.ProgressFile) that is polled while the job runs. Results that are too
+large to keep in memory, such as a conversion's flow data, are written under
+the jobs directory and served from there.
+"""
+import asyncio
+import logging
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+
+from workers import ProgressFile, run_cpu, run_io
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+FINISHED = (COMPLETED, FAILED)
+
+logger = logging.getLogger(__name__)
+
+# Seconds between progress polls of a running job
+POLL_INTERVAL = 0.5
+
+
+class JobQueueFull(Exception):
+    """Raised when a job is submitted while the queue is at capacity."""
+
+
+class Job:
+    """State of one submitted job."""
+
+    def __init__(self, job_id, kind, fn, args, params, result_path=None):
+        self.id = job_id
+        self.kind = kind
+        self.fn = fn
+        self.args = args
+        self.params = params
+        self.result_path = result_path
+        self.progress_path = None
+        self.status = QUEUED
+        self.progress = {"entries_processed": 0, "total_entries": None, "percent": 0.0}
+        self.result = None
+        self.error = None
+        self.created_at = datetime.now().isoformat()
+        self.started_at = None
+        self.finished_at = None
+        self.version = 0
+        self.changed = asyncio.Event()
+
+    @property
+    def finished(self):
+        return self.status in FINISHED
+
+    def touch(self):
+        """Bump the version and wake subscribers."""
+        self.version += 1
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": self.progress,
+            "params": self.params,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at
+        }
+
+
+class JobManager:
+    """Bounded job queue drained by a fixed number of workers."""
+
+    def __init__(self, jobs_dir, workers, max_queued, history=100):
+        self.jobs_dir = Path(jobs_dir)
+        self.jobs_dir.mkdir(exist_ok=True)
+        self.workers = workers
+        self.max_queued = max_queued
+        self.history = history
+        self.jobs = OrderedDict()
+        self._queue = None
+        self._tasks = []
+
+    def _ensure_started(self):
+        # The queue and worker tasks belong to the running event loop
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queued)
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    def submit(self, kind, fn, *args, params=None, result_suffix=None):
+        """
+        Queue ``fn(*args, progress_path=...)`` to run on the process pool.
+
+        When ``result_suffix`` is given the job also receives a
+        ``result_path`` under the jobs directory to write its output to.
+        Raises JobQueueFull if the queue is at capacity.
+        """
+        self._ensure_started()
+        job_id = uuid.uuid4().hex
+        result_path = self.jobs_dir / f"{job_id}{result_suffix}" if result_suffix else None
+        job = Job(job_id, kind, fn, args, params or {}, result_path)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise JobQueueFull(f"Job queue is full ({self.max_queued} jobs waiting)")
+
+        self.jobs[job_id] = job
+        self._prune()
+        logger.info("Queued %s job %s", kind, job_id)
+        return job
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def list(self):
+        return [job.to_dict() for job in reversed(self.jobs.values())]
+
+    def stats(self):
+        counts = {QUEUED: 0, RUNNING: 0, COMPLETED: 0, FAILED: 0}
+        for job in self.jobs.values():
+            counts[job.status] += 1
+        return {
+            "workers": self.workers,
+            "max_queued": self.max_queued,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "jobs": counts
+        }
+
+    async def subscribe(self, job_id):
+        """Yield the job's state each time it changes, until it finishes."""
+        job = self.jobs[job_id]
+        seen = -1
+        while True:
+            changed = job.changed
+            if job.version != seen:
+                seen = job.version
+                yield job.to_dict()
+                if job.finished:
+                    return
+            await changed.wait()
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run(job)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job):
+        job.status = RUNNING
+        job.started_at = datetime.now().isoformat()
+        job.progress_path = self.jobs_dir / f"{job.id}.progress.json"
+        job.touch()
+
+        kwargs = {"progress_path": str(job.progress_path)}
+        if job.result_path is not None:
+            kwargs["result_path"] = str(job.result_path)
+        future = asyncio.ensure_future(run_cpu(job.fn, *job.args, **kwargs))
+
+        try:
+            while True:
+                done, _ = await asyncio.wait({future}, timeout=POLL_INTERVAL)
+                await self._poll_progress(job)
+                if done:
+                    break
+            job.result = future.result()
+            job.status = COMPLETED
+        except Exception as e:
+            logger.exception("%s job %s failed", job.kind, job.id)
+            job.error = str(e)
+            job.status = FAILED
+            if job.result_path is not None:
+                job.result_path.unlink(missing_ok=True)
+        finally:
+            job.finished_at = datetime.now().isoformat()
+            job.progress_path.unlink(missing_ok=True)
+            job.touch()
+
+    async def _poll_progress(self, job):
+        progress = await run_io(ProgressFile.read, job.progress_path)
+        if progress:
+            merged = dict(job.progress, **progress)
+            if merged != job.progress:
+                job.progress = merged
+                job.touch()
+
+    def _prune(self):
+        """Forget the oldest finished jobs beyond the history limit."""
+        finished = [job for job in self.jobs.values() if job.finished]
+        for job in finished[:max(0, len(finished) - self.history)]:
+            del self.jobs[job.id]
+            if job.result_path is not None:
+                job.result_path.unlink(missing_ok=True)
+
+    async def shutdown(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        self._queue = None
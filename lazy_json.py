@@ -0,0 +1,101 @@
+"""
+Lazy, partial JSON access for response extraction in generated scripts.
+
+Extraction rules read a few key paths out of a response body (see
+flow_correlation.py). A LazyJson is created per response and shared by all
+of its extractors, so the body is decoded at most once. Bodies up to the
+partial threshold are decoded in full on first access. In larger ``{...}`` or
+``[...]`` documents the top-level members are decoded one at a time, in
+order, until the requested key or index is found; the members after it are
+not decoded at all (nor checked for errors). Decoding uses the C scanner of
+json.JSONDecoder.raw_decode throughout.
+
+This module is inlined into generated scripts (see
+locust_generator.TEMPLATE_HEADER), so it must only use the standard library.
+"""
+import json
+import re
+
+PARTIAL_THRESHOLD = 64 * 1024
+
+_DECODER = json.JSONDecoder()
+_WHITESPACE_RE = re.compile(r"[ \t\n\r]*")
+_COLON_RE = re.compile(r"[ \t\n\r]*:")
+_MISSING = object()
+
+
+class LazyJson:
+    """A JSON document decoded only as far as the requested paths need"""
+
+    def __init__(self, text, partial_threshold=PARTIAL_THRESHOLD):
+        self.text = text
+        self._document = _MISSING
+        # Top-level members (keys or indexes) decoded so far, and where the next one starts
+        self._members = {}
+        self._pos = _WHITESPACE_RE.match(text).end()
+        self._opening = text[self._pos:self._pos + 1] if len(text) > partial_threshold else ""
+        self._pos += 1
+        self._done = False
+
+    @property
+    def partial(self):
+        """Whether top-level members are decoded one at a time"""
+        return self._opening in ("{", "[")
+
+    def document(self):
+        """The whole decoded document"""
+        if self._document is _MISSING:
+            self._document = json.loads(self.text)
+        return self._document
+
+    def get(self, path, default=None):
+        """Value at a key path such as ("items", 0, "id"), or default if absent or not JSON"""
+        try:
+            if not path:
+                return self.document()
+            value = self._member(path[0])
+            for key in path[1:]:
+                value = value[key]
+            return value
+        except (ValueError, KeyError, IndexError, TypeError):
+            return default
+
+    def _member(self, key):
+        if self._document is not _MISSING or not self.partial:
+            return self.document()[key]
+        if key in self._members:
+            return self._members[key]
+        if self._opening == "{" and isinstance(key, str) or self._opening == "[" and isinstance(key, int) and key >= 0:
+            while not self._done:
+                if self._next_member() == key:
+                    return self._members[key]
+            raise KeyError(key)
+        return self.document()[key]
+
+    def _next_member(self):
+        """Decode the next top-level member and return its key or index"""
+        text = self.text
+        pos = _WHITESPACE_RE.match(text, self._pos).end()
+        closing = "}" if self._opening == "{" else "]"
+        if text.startswith(closing, pos) and not self._members:
+            self._done = True
+            return _MISSING
+        if self._opening == "{":
+            name, pos = _DECODER.raw_decode(text, pos)
+            colon = _COLON_RE.match(text, pos)
+            if not isinstance(name, str) or colon is None:
+                raise ValueError(f"Expecting property name and ':' at {pos}")
+            pos = colon.end()
+        else:
+            name = len(self._members)
+        value, pos = _DECODER.raw_decode(text, _WHITESPACE_RE.match(text, pos).end())
+        self._members[name] = value
+        pos = _WHITESPACE_RE.match(text, pos).end()
+        if text.startswith(",", pos):
+            pos += 1
+        elif text.startswith(closing, pos):
+            self._done = True
+        else:
+            raise ValueError(f"Expecting ',' delimiter at {pos}")
+        self._pos = pos
+        return name
@@ -1,118 +1,1121 @@
 import yaml
 import json
+import ast
+import inspect
+import logging
+import math
+import os
+import re
+from datetime import datetime
+from urllib.parse import urlsplit
 
-TEMPLATE_HEADER = '''from locust import HttpUser, task, between, events
-from prometheus_client import Counter, Histogram, Gauge, start_http_server
+from har_converter import collect_flow_data, iter_flow_events
+from har_storage import is_har_filename, open_har
+from blob_store import BlobStore
+from flow_filters import FlowFilter, format_stats, normalize_filter_config
+from flow_templates import cluster_flows
+from flow_correlation import context_rules, correlate_flows, json_path, response_text
+import endpoint_names
+from endpoint_names import clean_endpoint_name
+import hdr_histogram
+import lazy_json
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_HEADER = '''from locust import FastHttpUser, HttpUser, task, between, constant_throughput, events
+from locust.event import EventHook
+from locust.runners import MasterRunner, WorkerRunner
+from prometheus_client import start_http_server
+from prometheus_client.core import REGISTRY, CounterMetricFamily, GaugeMetricFamily, HistogramMetricFamily
+from prometheus_client.utils import floatToGoString
+from gevent.event import AsyncResult, Event
+from geventhttpclient.client import HTTPClientPool
+from geventhttpclient.connectionpool import ConnectionPool
+from requests.adapters import HTTPAdapter
+from contextlib import contextmanager
+import base64
+import csv
+import gevent
+import marshal
+import os
+import re
 import time
+import random
+import ssl
 import urllib3
+import weakref
 import json
 
 # Disable SSL warnings for self-signed certificates
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+# Per-request diagnostics (context extraction and substitution), off by default
+DEBUG = os.environ.get("LOCUST_DEBUG", "").lower() in ("1", "true", "yes")
+PLACEHOLDER_RE = re.compile(r"\{([^{}\s]+)\}")
+
 # Prometheus metrics - Cleaner structure
-REQUEST_COUNT = Counter('locust_requests_total', 'Total requests', ['method', 'endpoint', 'status'])
-REQUEST_DURATION = Histogram('locust_request_duration_seconds', 'Request duration in seconds', ['method', 'endpoint'], buckets=[0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0])
-ACTIVE_USERS = Gauge('locust_active_users', 'Number of active users')
-REQUEST_RATE = Gauge('locust_request_rate', 'Requests per second')
-ERROR_RATE = Gauge('locust_error_rate', 'Error rate percentage')
+#
+# The request listener runs for every request of every user, so it only
+# updates plain per-worker aggregates: one slot per method/endpoint/status,
+# with endpoint names cleaned once and cached. A background greenlet folds
+# the aggregates into cumulative totals every METRICS_FLUSH_INTERVAL seconds
+# (LOCUST_METRICS_FLUSH_INTERVAL), and RequestMetrics.collect() serves those
+# totals, so no prometheus_client lock is taken on the request path. At most
+# LOCUST_MAX_ENDPOINTS endpoint labels are exported; the rest count as "other".
+#
+# In distributed runs, workers serve nothing: each stats report to the master
+# carries the request and histogram deltas since the previous report, and the
+# master merges them and serves the only /metrics, on LOCUST_METRICS_PORT or
+# the next free port. With LOCUST_METRICS_DIR set (multiprocess mode), the
+# masters and standalone processes on a host also write their totals there on
+# each flush, and the one that owns LOCUST_METRICS_PORT serves a merged view.
+REQUEST_DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METRICS_FLUSH_INTERVAL = float(os.environ.get("LOCUST_METRICS_FLUSH_INTERVAL", 1.0))
+METRICS_PORT = int(os.environ.get("LOCUST_METRICS_PORT", 8002))
+METRICS_DIR = os.environ.get("LOCUST_METRICS_DIR")
+
+# @inline endpoint_names
+
+# @inline hdr_histogram
+
+# @inline lazy_json
+
+# Responses are only parsed by steps that extract from them, when declared as
+# JSON (or unlabelled and starting like JSON) and at most JSON_MAX_BYTES long
+# (LOCUST_JSON_MAX_BYTES). Bodies over JSON_PARTIAL_BYTES
+# (LOCUST_JSON_PARTIAL_BYTES) are decoded only as far as the extracted paths need.
+JSON_MAX_BYTES = int(os.environ.get("LOCUST_JSON_MAX_BYTES", 10 * 1024 * 1024))
+JSON_PARTIAL_BYTES = int(os.environ.get("LOCUST_JSON_PARTIAL_BYTES", PARTIAL_THRESHOLD))
+# Where authentication responses carry their token, in order of preference
+AUTH_TOKEN_FIELDS = ("token", "access_token", "auth_token", "jwt", "bearer_token", "session_token")
+AUTH_TOKEN_PATHS = tuple((field,) for field in AUTH_TOKEN_FIELDS) + tuple(("data", field) for field in AUTH_TOKEN_FIELDS)
+
+ENDPOINT_NAMES = EndpointNames(int(os.environ.get("LOCUST_MAX_ENDPOINTS", MAX_ENDPOINTS)))
+
+# Durations are recorded in microseconds, by default from 1 µs to 60 s within 1%
+HDR_LAYOUT = HdrLayout(
+    int(os.environ.get("LOCUST_HDR_LOWEST_US", LOWEST_VALUE)),
+    int(float(os.environ.get("LOCUST_HDR_HIGHEST_SECONDS", HIGHEST_VALUE / 1e6)) * 1e6),
+    int(os.environ.get("LOCUST_HDR_SIGNIFICANT_FIGURES", SIGNIFICANT_FIGURES))
+)
+EXPORT_QUANTILES = tuple(float(q) for q in os.environ.get("LOCUST_HDR_QUANTILES", ",".join(map(str, QUANTILES))).split(","))
+BUCKET_BOUNDS_US = tuple(int(bound * 1e6) for bound in REQUEST_DURATION_BUCKETS)
+AGGREGATED = ("", "Aggregated")
+CONNECTION_KINDS = ("new", "resumed", "reused")
+
+class RequestMetrics:
+    """Per-worker request aggregates, exported to Prometheus as a custom collector"""
+
+    def __init__(self, snapshot_dir=None):
+        # (method, endpoint, status) -> [count, duration sum (µs), {histogram index: count}, min, max, overflow]
+        self.pending = {}
+        # (method, endpoint) -> [new connections, resumed TLS sessions, requests on reused connections]
+        self.pending_connections = {}
+        # Cumulative totals and the last interval, replaced (never mutated) on flush.
+        # durations: (method, endpoint) -> (HdrHistogram, duration sum in µs)
+        self.requests = {}
+        self.connections = {}
+        self.durations = {}
+        self.aggregated = (HdrHistogram(HDR_LAYOUT), 0)
+        self.interval = (0, 0, 0.0)
+        self.environment = None
+        self.snapshot_dir = snapshot_dir
+        self.last_flush = time.monotonic()
+
+    def record(self, method, endpoint, status, microseconds):
+        slot = self.pending.get((method, endpoint, status))
+        if slot is None:
+            slot = self.pending[(method, endpoint, status)] = [0, 0, {}, microseconds, microseconds, 0]
+        slot[0] += 1
+        slot[1] += microseconds
+        if microseconds < slot[3]:
+            slot[3] = microseconds
+        elif microseconds > slot[4]:
+            slot[4] = microseconds
+        if microseconds > HDR_LAYOUT.highest:
+            slot[5] += 1
+        index = HDR_LAYOUT.index(microseconds)
+        slot[2][index] = slot[2].get(index, 0) + 1
+
+    def record_connections(self, method, endpoint, opened, resumed):
+        """Count the connections a request opened (see ConnectionTracker), or its reuse of a pooled one"""
+        slot = self.pending_connections.get((method, endpoint))
+        if slot is None:
+            slot = self.pending_connections[(method, endpoint)] = [0, 0, 0]
+        if opened:
+            slot[0] += opened - resumed
+            slot[1] += resumed
+        else:
+            slot[2] += 1
+
+    @staticmethod
+    def _add_connections(connections, rows):
+        """Add (method, endpoint, new, resumed, reused) rows to a connections dict"""
+        for method, endpoint, new, resumed, reused in rows:
+            previous = connections.get((method, endpoint), (0, 0, 0))
+            connections[(method, endpoint)] = (previous[0] + new, previous[1] + resumed, previous[2] + reused)
+
+    @staticmethod
+    def _add_durations(durations, aggregated, rows, layout=None):
+        """Copy-on-write add of (method, endpoint, µs sum, sparse counts, extremes) rows; returns the new aggregated"""
+        copied = set()
+        aggregated, aggregated_micros = aggregated
+        aggregated = aggregated.copy()
+        for method, endpoint, micros, sparse, extremes in rows:
+            previous = durations.get((method, endpoint))
+            if previous is None:
+                histogram, total_micros = HdrHistogram(HDR_LAYOUT), 0
+                copied.add((method, endpoint))
+            elif (method, endpoint) in copied:
+                histogram, total_micros = previous
+            else:
+                histogram, total_micros = previous[0].copy(), previous[1]
+                copied.add((method, endpoint))
+            histogram.add_sparse(sparse, layout, extremes)
+            durations[(method, endpoint)] = (histogram, total_micros + micros)
+            aggregated.add_sparse(sparse, layout, extremes)
+            aggregated_micros += micros
+        return (aggregated, aggregated_micros)
+
+    def flush(self):
+        """Fold pending aggregates into the exported totals"""
+        pending, self.pending = self.pending, {}
+        pending_connections, self.pending_connections = self.pending_connections, {}
+        now = time.monotonic()
+        elapsed, self.last_flush = now - self.last_flush, now
+
+        connections = dict(self.connections)
+        self._add_connections(connections, [(*labels, *counts) for labels, counts in pending_connections.items()])
+        self.connections = connections
+        requests = dict(self.requests)
+        durations = dict(self.durations)
+        total = failures = 0
+        for (method, endpoint, status), (count, *_) in pending.items():
+            requests[(method, endpoint, status)] = requests.get((method, endpoint, status), 0) + count
+            total += count
+            if status == 'failure':
+                failures += count
+        self.aggregated = self._add_durations(durations, self.aggregated, [
+            (method, endpoint, micros, sparse, extremes) for (method, endpoint, status), (count, micros, sparse, *extremes) in pending.items()
+        ])
+        self.requests, self.durations = requests, durations
+        self.interval = (total, failures, elapsed)
+        runner = getattr(self.environment, 'runner', None)
+        if isinstance(runner, MasterRunner):
+            # Worker deltas arrive with the stats reports, every few seconds;
+            # take the swarm-wide rates from the master's own stats instead
+            stats = runner.stats.total
+            self.interval = (stats.current_rps, stats.current_fail_per_sec, 1.0)
+        if self.snapshot_dir:
+            self.write_snapshot()
+
+    def reset(self):
+        """Drop everything recorded so far (Locust's --reset-stats)"""
+        self.pending, self.pending_connections = {}, {}
+        self.requests, self.connections, self.durations = {}, {}, {}
+        self.aggregated = (HdrHistogram(HDR_LAYOUT), 0)
+        self.interval = (0, 0, 0.0)
+
+    def take_delta(self):
+        """Requests recorded since the previous call, as msgpack-friendly rows (workers only)"""
+        pending, self.pending = self.pending, {}
+        pending_connections, self.pending_connections = self.pending_connections, {}
+        requests = []
+        durations = {}
+        for (method, endpoint, status), (count, micros, sparse, *extremes) in pending.items():
+            requests.append([method, endpoint, status, count])
+            row = durations.get((method, endpoint))
+            if row is None:
+                durations[(method, endpoint)] = [method, endpoint, micros, sparse, extremes]
+            else:
+                row[2] += micros
+                for index, count in sparse.items():
+                    row[3][index] = row[3].get(index, 0) + count
+                row[4] = list(merge_extremes(row[4], extremes))
+        rows = [[method, endpoint, micros, [n for pair in sparse.items() for n in pair], extremes]
+                for method, endpoint, micros, sparse, extremes in durations.values()]
+        connections = [[*labels, *counts] for labels, counts in pending_connections.items()]
+        return {"hdr": list(HDR_LAYOUT.config), "requests": requests, "durations": rows, "connections": connections}
+
+    def merge(self, delta):
+        """Add a worker's take_delta() rows to the totals (master only)"""
+        requests = dict(self.requests)
+        durations = dict(self.durations)
+        for method, endpoint, status, count in delta["requests"]:
+            labels = (method, ENDPOINT_NAMES.normalize(endpoint), status)
+            requests[labels] = requests.get(labels, 0) + count
+        self.aggregated = self._add_durations(durations, self.aggregated, [
+            (method, ENDPOINT_NAMES.normalize(endpoint), micros, sparse, extremes)
+            for method, endpoint, micros, sparse, extremes in delta["durations"]
+        ], HdrLayout(*delta["hdr"]))
+        self.requests, self.durations = requests, durations
+        connections = dict(self.connections)
+        self._add_connections(connections, [
+            (method, ENDPOINT_NAMES.normalize(endpoint), new, resumed, reused)
+            for method, endpoint, new, resumed, reused in delta.get("connections", [])
+        ])
+        self.connections = connections
+
+    def _local_users(self):
+        runner = getattr(self.environment, 'runner', None)
+        # A master's user_count is the swarm total; workers report their own users
+        return runner.user_count if runner is not None and not isinstance(runner, MasterRunner) else 0
+
+    def snapshot(self):
+        return {
+            "hdr": HDR_LAYOUT.config,
+            "requests": self.requests,
+            "connections": self.connections,
+            "durations": {labels: (histogram.sparse(), micros, histogram.extremes) for labels, (histogram, micros) in self.durations.items()},
+            "interval": self.interval,
+            "active_users": self._local_users(),
+            "time": time.time()
+        }
+
+    def _snapshot_path(self):
+        return os.path.join(self.snapshot_dir, f"{os.getpid()}.metrics")
+
+    def write_snapshot(self):
+        path = self._snapshot_path()
+        with open(f"{path}.tmp", "wb") as f:
+            marshal.dump(self.snapshot(), f)
+        os.replace(f"{path}.tmp", path)
+
+    def peer_snapshots(self):
+        """Snapshots written by the other processes sharing snapshot_dir"""
+        if not self.snapshot_dir:
+            return []
+        try:
+            names = os.listdir(self.snapshot_dir)
+        except OSError:
+            return []
+        own = os.path.basename(self._snapshot_path())
+        snapshots = []
+        for name in names:
+            if name.endswith(".metrics") and name != own:
+                try:
+                    with open(os.path.join(self.snapshot_dir, name), "rb") as f:
+                        snapshots.append(marshal.load(f))
+                except (OSError, EOFError, ValueError, TypeError):
+                    continue
+        return snapshots
+
+    def totals(self):
+        """Request counts, connection counts, durations and gauge inputs, merged with peer snapshots"""
+        requests, connections, durations, aggregated = self.requests, self.connections, self.durations, self.aggregated
+        total, failures, elapsed = self.interval
+        rate = total / elapsed if elapsed > 0 else 0
+        active_users = self._local_users()
+        peers = self.peer_snapshots()
+        if peers:
+            requests, connections, durations = dict(requests), dict(connections), dict(durations)
+            # Counters of exited processes are kept; only recent snapshots feed the gauges
+            fresh = time.time() - max(3 * METRICS_FLUSH_INTERVAL, 5.0)
+            for snapshot in peers:
+                for labels, count in snapshot["requests"].items():
+                    requests[labels] = requests.get(labels, 0) + count
+                self._add_connections(connections, [(*labels, *counts) for labels, counts in snapshot.get("connections", {}).items()])
+                aggregated = self._add_durations(durations, aggregated, [
+                    (method, endpoint, micros, sparse, extremes) for (method, endpoint), (sparse, micros, extremes) in snapshot["durations"].items()
+                ], HdrLayout(*snapshot["hdr"]))
+                if snapshot["time"] >= fresh:
+                    count, failed, elapsed = snapshot["interval"]
+                    total += count
+                    failures += failed
+                    rate += count / elapsed if elapsed > 0 else 0
+                    active_users += snapshot["active_users"]
+        runner = getattr(self.environment, 'runner', None)
+        if isinstance(runner, MasterRunner):
+            active_users = runner.user_count
+        return requests, connections, durations, aggregated, (total, failures, rate, active_users)
+
+    def collect(self):
+        requests, connections, durations, aggregated, (total, failures, rate, active_users) = self.totals()
+
+        request_family = CounterMetricFamily('locust_requests', 'Total requests', labels=['method', 'endpoint', 'status'])
+        for labels, count in requests.items():
+            request_family.add_metric(labels, count)
+        duration_family = HistogramMetricFamily('locust_request_duration_seconds', 'Request duration in seconds', labels=['method', 'endpoint'])
+        quantile_family = GaugeMetricFamily('locust_request_duration_quantile_seconds', 'Request duration quantiles from the HDR histogram',
+                                            labels=['method', 'endpoint', 'quantile'])
+        bounds = [floatToGoString(bound) for bound in REQUEST_DURATION_BUCKETS]
+        overflow_family = CounterMetricFamily('locust_request_duration_overflow', 'Requests slower than the HDR histogram range (LOCUST_HDR_HIGHEST_SECONDS)',
+                                              labels=['method', 'endpoint'])
+        quantiles = [floatToGoString(quantile) for quantile in EXPORT_QUANTILES]
+        for labels, (histogram, micros) in list(durations.items()) + [(AGGREGATED, aggregated)]:
+            lowest, highest, values, below = histogram.summary(EXPORT_QUANTILES, BUCKET_BOUNDS_US)
+            if labels != AGGREGATED:
+                duration_family.add_metric(labels, list(zip(bounds, below)) + [('+Inf', histogram.total)], micros / 1e6)
+                overflow_family.add_metric(labels, histogram.overflow)
+            for quantile, value in zip(quantiles, values):
+                quantile_family.add_metric([*labels, quantile], value / 1e6)
+        connection_family = CounterMetricFamily('locust_connections', 'Requests by connection: new, resumed (TLS session) or reused (pooled)',
+                                                labels=['method', 'endpoint', 'connection'])
+        for (method, endpoint), counts in connections.items():
+            for kind, count in zip(CONNECTION_KINDS, counts):
+                connection_family.add_metric([method, endpoint, kind], count)
+        yield request_family
+        yield connection_family
+        yield duration_family
+        yield quantile_family
+        yield overflow_family
+        yield GaugeMetricFamily('locust_active_users', 'Number of active users', value=active_users)
+        yield GaugeMetricFamily('locust_request_rate', 'Requests per second', value=rate)
+        yield GaugeMetricFamily('locust_error_rate', 'Error rate percentage', value=failures * 100.0 / total if total else 0)
+
+# Connection reuse
+#
+# Each user's client keeps up to RecordedUser.POOL_SIZE connections per host
+# (LOCUST_POOL_SIZE), retries failed connections RecordedUser.MAX_RETRIES
+# times (LOCUST_MAX_RETRIES) and keeps them alive unless KEEP_ALIVE is off
+# (LOCUST_KEEP_ALIVE). With TLS_SESSION_CACHE (LOCUST_TLS_SESSION_CACHE), new
+# TLS connections resume the session of the previous connection to the same
+# server, so they skip the full handshake. Both clients report each new
+# connection to CONNECTIONS. The request listener then counts each request as
+# new, resumed or reused (locust_connections_total).
+class ConnectionTracker:
+    """Connections opened by each greenlet since its last request"""
+
+    def __init__(self):
+        # greenlet -> [connections opened, TLS sessions resumed]
+        self.opened = {}
+
+    def connected(self, sock):
+        counts = self.opened.setdefault(gevent.getcurrent(), [0, 0])
+        counts[0] += 1
+        if getattr(sock, "session_reused", False):
+            counts[1] += 1
+
+    def take(self):
+        """(opened, resumed) for the current greenlet's request, and start over"""
+        return self.opened.pop(gevent.getcurrent(), (0, 0))
+
+CONNECTIONS = ConnectionTracker()
 
-# Start Prometheus metrics server on port 8002
-start_http_server(8002)
+class TlsSessionCache:
+    """The latest TLS session per server, offered when a new connection is opened"""
+
+    def __init__(self):
+        self.sessions = {}
+        # TLS 1.3 sends session tickets after the handshake: keep the latest
+        # socket per server and take its session once it holds a ticket
+        self.sockets = {}
+        self._context = None
+
+    def context(self, *args, **kwargs):
+        """SSLContext for both clients (an ssl_context_factory for FastHttpUser)"""
+        if self._context is None:
+            context = SessionCachingContext(ssl.PROTOCOL_TLS_CLIENT)
+            # Generated users skip certificate verification (self-signed certificates)
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+            self._context = context
+        return self._context
+
+    def session(self, server):
+        session = self.sessions.get(server)
+        if session is None or not session.has_ticket:
+            sock = self.sockets.get(server, lambda: None)()
+            try:
+                latest = sock.session if sock is not None else None
+            except (OSError, ValueError):
+                latest = None
+            if latest is not None and latest.has_ticket:
+                session = self.sessions[server] = latest
+        return session
+
+    def connected(self, server, sock):
+        self.sockets[server] = weakref.ref(sock)
+
+TLS_SESSIONS = TlsSessionCache()
+
+class SessionCachingContext(ssl.SSLContext):
+    """SSLContext that resumes TLS sessions from TLS_SESSIONS"""
+
+    def wrap_socket(self, sock, *args, server_hostname=None, session=None, **kwargs):
+        try:
+            server = (server_hostname, *sock.getpeername()[:2])
+        except OSError:
+            server = None
+        if session is None and server is not None:
+            session = TLS_SESSIONS.session(server)
+        sslsock = super().wrap_socket(sock, *args, server_hostname=server_hostname, session=session, **kwargs)
+        if server is not None:
+            TLS_SESSIONS.connected(server, sslsock)
+        return sslsock
+
+class CountingHTTPConnection(urllib3.connection.HTTPConnection):
+    def connect(self):
+        super().connect()
+        CONNECTIONS.connected(self.sock)
+
+class CountingHTTPSConnection(urllib3.connection.HTTPSConnection):
+    def connect(self):
+        super().connect()
+        CONNECTIONS.connected(self.sock)
+
+class CountingHTTPConnectionPool(urllib3.HTTPConnectionPool):
+    ConnectionCls = CountingHTTPConnection
+
+class CountingHTTPSConnectionPool(urllib3.HTTPSConnectionPool):
+    ConnectionCls = CountingHTTPSConnection
+
+try:
+    # Recent Locust versions ship an adapter that loads the CA certificates once
+    from locust.clients import LocustHttpAdapter
+except ImportError:
+    LocustHttpAdapter = None
+
+class TunedHttpAdapter(LocustHttpAdapter or HTTPAdapter):
+    """requests adapter with a sized pool, connection retries, TLS session resumption and connection counting"""
+
+    def __init__(self, pool_size, max_retries, tls_session_cache):
+        self.tls_session_cache = tls_session_cache
+        # LocustHttpAdapter takes an optional PoolManager first
+        args = (None,) if LocustHttpAdapter is not None else ()
+        super().__init__(*args, pool_maxsize=pool_size, max_retries=max_retries)
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        if self.tls_session_cache:
+            pool_kwargs["ssl_context"] = TLS_SESSIONS.context()
+        super().init_poolmanager(connections, maxsize, block, **pool_kwargs)
+        self.poolmanager.pool_classes_by_scheme = {"http": CountingHTTPConnectionPool, "https": CountingHTTPSConnectionPool}
+
+# geventhttpclient (FastHttpUser) reports new connections through this hook
+# in recent versions; without it, FastHttpUser connections are not counted
+AFTER_CONNECT_HOOK = callable(getattr(ConnectionPool, "after_connect", None))
+
+class CountingHTTPClientPool(HTTPClientPool):
+    """geventhttpclient client pool whose connection pools report to CONNECTIONS"""
+
+    def get_client(self, url):
+        client = super().get_client(url)
+        pool = getattr(client, "_connection_pool", None)
+        if pool is not None and "after_connect" not in vars(pool):
+            pool.after_connect = CONNECTIONS.connected
+        return client
+
+METRICS = RequestMetrics(METRICS_DIR)
+REGISTRY.register(METRICS)
+
+def start_metrics_server(port, attempts=50):
+    """Serve /metrics on port, or on the next free one; returns the port or None"""
+    for candidate in range(port, port + attempts):
+        try:
+            start_http_server(candidate)
+        except OSError:
+            continue
+        print(f"SUCCESS Prometheus metrics served on port {candidate}")
+        return candidate
+    print(f"WARNING  No free port for Prometheus metrics in {port}-{port + attempts - 1}")
+    return None
+
+def write_hdr_csv(path):
+    """Per-endpoint response times from the HDR histograms, in milliseconds"""
+    _, _, durations, aggregated, _ = METRICS.totals()
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Type", "Name", "Request Count", "Min Response Time", "Max Response Time", "Average Response Time"]
+                        + [f"{quantile * 100:g}%" for quantile in EXPORT_QUANTILES])
+        for (method, endpoint), (histogram, micros) in sorted(durations.items()) + [(AGGREGATED, aggregated)]:
+            lowest, highest, values, _ = histogram.summary(EXPORT_QUANTILES, BUCKET_BOUNDS_US)
+            writer.writerow([method, endpoint, histogram.total, lowest / 1000, highest / 1000,
+                             round(micros / histogram.total / 1000, 3) if histogram.total else 0]
+                            + [value / 1000 for value in values])
 
 # Custom metrics tracking
 @events.request.add_listener
 def track_request_metrics(request_type, name, response_time, response_length, response, context, exception, **kwargs):
-    """Track custom metrics for Prometheus with cleaner endpoint names"""
-    status = 'success' if exception is None else 'failure'
+    """Record a request into this worker's aggregates (flushed to Prometheus on a timer)"""
     method = request_type.upper() if request_type else 'UNKNOWN'
+    endpoint = ENDPOINT_NAMES.normalize(name)
+    METRICS.record(method, endpoint, 'success' if exception is None else 'failure', int((response_time or 0) * 1000))
+    # Page loads (see _load_page) open no connections of their own
+    if method != 'PAGE':
+        METRICS.record_connections(method, endpoint, *CONNECTIONS.take())
+
+def _flush_metrics_forever():
+    while True:
+        gevent.sleep(METRICS_FLUSH_INTERVAL)
+        try:
+            METRICS.flush()
+        except Exception as e:
+            print(f"WARNING  Could not flush metrics: {str(e)}")
+
+@events.init.add_listener
+def on_locust_init(environment, **kwargs):
+    """Start the metrics exporter and the periodic flush"""
+    METRICS.environment = environment
+    if isinstance(environment.runner, WorkerRunner):
+        # Workers only ship deltas to the master (see on_report_to_master)
+        METRICS.snapshot_dir = None
+        return
+    if METRICS_DIR:
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        # Multiprocess mode: one merged exporter, owned by whoever binds METRICS_PORT first
+        start_metrics_server(METRICS_PORT, attempts=1)
+    else:
+        start_metrics_server(METRICS_PORT)
+    gevent.spawn(_flush_metrics_forever)
 
-    # Clean up endpoint names - remove query parameters and cache IDs for cleaner metrics
-    endpoint = name or 'unknown'
-    if '?' in endpoint:
-        endpoint = endpoint.split('?')[0]
-    if '.dot.html' in endpoint:
-        endpoint = endpoint.replace('.dot.html', '')
-    if 'cacheId=' in endpoint:
-        endpoint = endpoint.split('cacheId=')[0].rstrip('?&')
+@events.report_to_master.add_listener
+def on_report_to_master(client_id, data, **kwargs):
+    """Attach this worker's metric deltas to its stats report"""
+    data["prometheus"] = METRICS.take_delta()
 
-    REQUEST_COUNT.labels(method=method, endpoint=endpoint, status=status).inc()
-    REQUEST_DURATION.labels(method=method, endpoint=endpoint).observe(response_time / 1000.0)
+@events.worker_report.add_listener
+def on_worker_report(client_id, data, **kwargs):
+    """Merge a worker's metric deltas into the master's totals"""
+    if "prometheus" in data:
+        METRICS.merge(data["prometheus"])
 
-    # Update active users count
-    if hasattr(context, 'environment') and hasattr(context.environment, 'runner'):
-        ACTIVE_USERS.set(context.environment.runner.user_count)
+@events.test_stop.add_listener
+def on_test_stop(environment, **kwargs):
+    """Publish the last partial interval"""
+    # A worker's pending requests go out with its final stats report
+    if not isinstance(environment.runner, WorkerRunner):
+        METRICS.flush()
 
-@events.test_start.add_listener
-def on_test_start(environment, **kwargs):
-    """Initialize metrics on test start"""
-    ACTIVE_USERS.set(0)
+@events.quitting.add_listener
+def on_quitting(environment, **kwargs):
+    """Write the HDR percentiles next to Locust's --csv files, and summarize connection reuse"""
+    csv_prefix = getattr(environment.parsed_options, 'csv_prefix', None)
+    if isinstance(environment.runner, WorkerRunner):
+        return
+    METRICS.flush()
+    if csv_prefix:
+        write_hdr_csv(f"{csv_prefix}_hdr_stats.csv")
+    _, connections, _, aggregated, _ = METRICS.totals()
+    if aggregated[0].overflow:
+        print(f"WARNING  {aggregated[0].overflow} request(s) took longer than {HDR_LAYOUT.highest / 1e6:g}s "
+              f"(LOCUST_HDR_HIGHEST_SECONDS); their percentiles are capped there")
+    new, resumed, reused = (sum(counts[i] for counts in connections.values()) for i in range(3))
+    if new + resumed + reused:
+        print(f"INFO Connections: {new} new, {resumed} resumed TLS session(s), {reused} request(s) on reused connections "
+              f"({reused / (new + resumed + reused):.1%})")
 
-class RecordedUser(HttpUser):
+# Warmup
+#
+# Every user warms up as it is spawned, so warmup follows the spawn rate: it
+# opens RecordedUser.WARMUP_CONNECTIONS connections to the target (the
+# connection test), joins a shared login (see TokenPool) and runs the recorded
+# GET steps (RecordedUser.WARMUP_STEPS) WARMUP_ITERATIONS times
+# (LOCUST_WARMUP_ITERATIONS) to prime caches, before its first task. None of
+# these requests reach Locust's statistics or the Prometheus metrics: they are
+# counted in WARMUP and reported when spawning completes. With --reset-stats
+# the Prometheus metrics are reset along with Locust's statistics.
+WARMUP_ITERATIONS = int(os.environ.get("LOCUST_WARMUP_ITERATIONS", 0))
+
+class WarmupStats:
+    """Requests sent while users warmed up, kept out of the statistics"""
+    
+    def __init__(self):
+        # Stands in for the request event on warming clients
+        self.request_event = EventHook()
+        self.request_event.add_listener(self._on_request)
+        self.requests = 0
+        self.failures = 0
+        self.users = 0
+        self.seconds = 0.0
+        # Users spawned when spawning completed, reported once all are warm
+        self.expected = None
+    
+    def _on_request(self, exception=None, **kwargs):
+        CONNECTIONS.take()
+        self.requests += 1
+        if exception is not None:
+            self.failures += 1
+    
+    def user_ready(self, seconds):
+        self.users += 1
+        self.seconds += seconds
+        self.report()
+    
+    def expect(self, user_count):
+        self.expected = user_count
+        self.report()
+    
+    def report(self):
+        if self.users and self.expected is not None and self.users >= self.expected:
+            self.expected = None
+            print(f"SUCCESS Warmup: {self.users} user(s), {self.requests} request(s) ({self.failures} failed), "
+                  f"{self.seconds / self.users:.2f} s per user - excluded from stats")
+
+WARMUP = WarmupStats()
+
+@events.spawning_complete.add_listener
+def on_spawning_complete(user_count, **kwargs):
+    """Measurement starts: report the warmup once all users are warm, and follow --reset-stats"""
+    WARMUP.expect(user_count)
+    environment = METRICS.environment
+    if environment is not None and environment.reset_stats:
+        METRICS.reset()
+    if RecordedUser.TARGET_RPS and not isinstance(environment and environment.runner, WorkerRunner):
+        rate = RecordedUser.TARGET_RPS * user_count / RecordedUser.TARGET_USERS
+        print(f"INFO Target throughput: {rate:.1f} requests/s from {user_count} user(s) "
+              f"(sized for {RecordedUser.TARGET_RPS:g} from {RecordedUser.TARGET_USERS})")
+
+# Target throughput
+#
+# Scripts generated with a target RPS (see throughput_model) pace each user
+# with constant_throughput, so the offered load is TARGET_RPS at TARGET_USERS
+# users and grows linearly with the user count, whatever the response times
+# (as long as users are not busy for longer than their pacing interval).
+# TARGET_USERS becomes the default for -u; LOCUST_TARGET_RPS and
+# LOCUST_TARGET_USERS override the generated values.
+
+@events.init_command_line_parser.add_listener
+def on_init_command_line_parser(parser, **kwargs):
+    """Default the user count to the one the target throughput was sized for"""
+    if RecordedUser.TARGET_USERS:
+        parser.set_defaults(num_users=RecordedUser.TARGET_USERS)
+
+# Shared authentication tokens
+#
+# Users do not log in one by one: each login is a TokenLease shared by up to
+# RecordedUser.USERS_PER_TOKEN users (LOCUST_AUTH_USERS_PER_TOKEN). A user
+# joins a lease with room left and only logs in when there is none, so the
+# auth endpoint sees one login per lease instead of one per spawned user.
+# Leases are refreshed AUTH_REFRESH_MARGIN seconds before their token expires
+# (the JWT exp claim, an expires_in field, or LOCUST_AUTH_TOKEN_TTL) and when a
+# request gets a 401; either way one user logs in again for all of them.
+#
+# Leases are pooled per process by default. With RecordedUser.AUTH_POOL set
+# to "master" (LOCUST_AUTH_POOL) in distributed runs, the master keeps the
+# leases and workers ask it for one over Locust's custom messages, so users
+# on different workers share logins too.
+AUTH_REFRESH_MARGIN = float(os.environ.get("LOCUST_AUTH_REFRESH_MARGIN", 60))
+AUTH_TOKEN_TTL = float(os.environ.get("LOCUST_AUTH_TOKEN_TTL", 0))
+AUTH_RETRY_INTERVAL = float(os.environ.get("LOCUST_AUTH_RETRY_INTERVAL", 5))
+AUTH_WAIT_TIMEOUT = float(os.environ.get("LOCUST_AUTH_WAIT_TIMEOUT", 60))
+
+def token_expiry(token):
+    """Expiry time (epoch seconds) from a JWT's exp claim, or None"""
+    if not isinstance(token, str) or token.count(".") != 2:
+        return None
+    payload = token.split(".")[1]
+    try:
+        claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+    except ValueError:
+        return None
+    exp = claims.get("exp") if isinstance(claims, dict) else None
+    return float(exp) if isinstance(exp, (int, float)) and not isinstance(exp, bool) else None
+
+class TokenLease:
+    """One login and the context it produced, shared by up to USERS_PER_TOKEN users"""
+    
+    def __init__(self, lease_id):
+        self.id = lease_id
+        self.users = 0
+        # Completed logins; 0 while the first one is pending
+        self.generation = 0
+        self.context = None
+        self.expires = None
+        self.refresh_at = None
+        self.refreshing = False
+        self.refresh_started = 0
+        self.retry_at = 0
+        self._updated = Event()
+    
+    def expiring(self, now):
+        return self.refresh_at is not None and now >= self.refresh_at
+    
+    def update(self, generation, context, expires):
+        """Publish a login's outcome and wake the users waiting for it"""
+        self.generation = generation
+        self.context = context
+        self.expires = expires
+        # Short-lived tokens are refreshed halfway through their lifetime instead
+        self.refresh_at = None if expires is None else expires - min(AUTH_REFRESH_MARGIN, max(0, expires - time.time()) / 2)
+        updated, self._updated = self._updated, Event()
+        updated.set()
+    
+    def wait(self, generation):
+        """Wait until the lease moves past a generation; False on timeout"""
+        deadline = time.time() + AUTH_WAIT_TIMEOUT
+        while self.generation == generation:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return False
+            self._updated.wait(remaining)
+        return True
+    
+    def state(self):
+        return {"lease": self.id, "generation": self.generation, "context": self.context, "expires": self.expires}
+
+class TokenPool:
+    """
+    Leases of one process, or of the whole run on the master.
+    
+    assign() and begin_refresh() tell the caller whether it has to log in;
+    complete() publishes the login. Only one login per lease is in flight.
+    """
+    
+    def __init__(self, users_per_token):
+        self.users_per_token = max(1, users_per_token)
+        self.leases = {}
+        # Leases with room for more users
+        self._open = {}
+        self._next_id = 0
+    
+    def assign(self):
+        """(lease, whether the caller must log in for it)"""
+        now = time.time()
+        for lease in self._open.values():
+            if not lease.expiring(now):
+                self._join(lease)
+                return lease, False
+        self._next_id += 1
+        lease = self.leases[self._next_id] = TokenLease(self._next_id)
+        lease.refreshing, lease.refresh_started = True, now
+        self._join(lease)
+        return lease, True
+    
+    def _join(self, lease):
+        lease.users += 1
+        if lease.users >= self.users_per_token:
+            self._open.pop(lease.id, None)
+        else:
+            self._open[lease.id] = lease
+    
+    def begin_refresh(self, lease, generation):
+        """Whether the caller must log in again for a lease it last saw at generation"""
+        now = time.time()
+        if lease.generation != generation or now < lease.retry_at:
+            return False
+        # A login that outlived AUTH_WAIT_TIMEOUT (its user or worker went away) is retried
+        if lease.refreshing and now - lease.refresh_started < AUTH_WAIT_TIMEOUT:
+            return False
+        lease.refreshing, lease.refresh_started = True, now
+        return True
+    
+    def complete(self, lease, context, expires):
+        """Publish a login for a lease (context None: it failed, keep the previous one)"""
+        lease.refreshing = False
+        # At most one login per lease every AUTH_RETRY_INTERVAL, whatever the outcome
+        lease.retry_at = time.time() + AUTH_RETRY_INTERVAL
+        if context is None:
+            lease.update(lease.generation + 1, lease.context, None)
+        else:
+            lease.update(lease.generation + 1, context, expires)
+    
+    def release(self, lease):
+        lease.users -= 1
+        if lease.users <= 0:
+            self.leases.pop(lease.id, None)
+            self._open.pop(lease.id, None)
+        else:
+            self._open[lease.id] = lease
+    
+    def acquire(self, user):
+        """A lease for a starting user, logging in on its behalf if needed"""
+        lease, login = self.assign()
+        if login:
+            self.complete(lease, *user._obtain_token())
+        elif not lease.wait(0) and lease.generation == 0:
+            print("WARNING  Timed out waiting for a shared login")
+        return lease
+    
+    def refresh(self, user, lease, generation):
+        """Log in again for a lease whose token expired or was rejected, once for all its users"""
+        if self.begin_refresh(lease, generation):
+            self.complete(lease, *user._obtain_token())
+        elif lease.refreshing:
+            lease.wait(generation)
+
+class RemoteTokenPool:
+    """A worker's view of the master's TokenPool (AUTH_POOL = "master")"""
+    
+    def __init__(self, runner):
+        self.runner = runner
+        # Local copies of the master's leases, updated by its auth_lease broadcasts
+        self.leases = {}
+        self._replies = {}
+        self._next_id = 0
+        runner.register_message("auth_reply", self._on_reply)
+        runner.register_message("auth_lease", self._on_lease)
+    
+    def _on_reply(self, environment, msg, **kwargs):
+        reply = self._replies.pop(msg.data["id"], None)
+        if reply is not None:
+            reply.set(msg.data)
+    
+    def _on_lease(self, environment, msg, **kwargs):
+        self._lease(msg.data)
+    
+    def _lease(self, state):
+        lease = self.leases.get(state["lease"])
+        if lease is None:
+            lease = self.leases[state["lease"]] = TokenLease(state["lease"])
+        if state["generation"] > lease.generation:
+            lease.update(state["generation"], state["context"], state["expires"])
+        return lease
+    
+    def _call(self, message, data):
+        """Send a request to the master and wait for its auth_reply"""
+        self._next_id += 1
+        reply = self._replies[self._next_id] = AsyncResult()
+        self.runner.send_message(message, dict(data, id=self._next_id))
+        try:
+            return reply.get(timeout=AUTH_WAIT_TIMEOUT)
+        except gevent.Timeout:
+            self._replies.pop(self._next_id, None)
+            print(f"WARNING  No {message} reply from the master")
+            return None
+    
+    def _login(self, user, lease):
+        context, expires = user._obtain_token()
+        self.runner.send_message("auth_complete", {"lease": lease.id, "context": context, "expires": expires})
+    
+    def acquire(self, user):
+        reply = self._call("auth_assign", {})
+        if reply is None:
+            return None
+        lease = self._lease(reply)
+        if reply["login"]:
+            self._login(user, lease)
+        if not lease.wait(0) and lease.generation == 0:
+            print("WARNING  Timed out waiting for a shared login")
+        return lease
+    
+    def refresh(self, user, lease, generation):
+        reply = self._call("auth_refresh", {"lease": lease.id, "generation": generation})
+        if reply is None:
+            return
+        self._lease(reply)
+        if reply["login"]:
+            self._login(user, lease)
+        if reply["login"] or reply["refreshing"]:
+            lease.wait(generation)
+    
+    def release(self, lease):
+        self.runner.send_message("auth_release", {"lease": lease.id})
+
+def serve_token_pool(runner, pool):
+    """Answer the workers' lease requests on the master (AUTH_POOL = "master")"""
+    def broadcast(lease):
+        runner.send_message("auth_lease", lease.state())
+    
+    def on_assign(environment, msg, **kwargs):
+        lease, login = pool.assign()
+        runner.send_message("auth_reply", dict(lease.state(), id=msg.data["id"], login=login), msg.node_id)
+    
+    def on_refresh(environment, msg, **kwargs):
+        lease = pool.leases.get(msg.data["lease"])
+        login = lease is not None and pool.begin_refresh(lease, msg.data["generation"])
+        state = lease.state() if lease is not None else {"lease": msg.data["lease"], "generation": 0, "context": None, "expires": None}
+        runner.send_message("auth_reply", dict(state, id=msg.data["id"], login=login,
+                                               refreshing=lease is not None and lease.refreshing), msg.node_id)
+    
+    def on_complete(environment, msg, **kwargs):
+        lease = pool.leases.get(msg.data["lease"])
+        if lease is not None:
+            pool.complete(lease, msg.data["context"], msg.data["expires"])
+            broadcast(lease)
+    
+    def on_release(environment, msg, **kwargs):
+        lease = pool.leases.get(msg.data["lease"])
+        if lease is not None:
+            pool.release(lease)
+    
+    runner.register_message("auth_assign", on_assign)
+    runner.register_message("auth_refresh", on_refresh)
+    runner.register_message("auth_complete", on_complete)
+    runner.register_message("auth_release", on_release)
+
+# Set up on init: a TokenPool, a RemoteTokenPool on workers with AUTH_POOL = "master"
+TOKEN_POOL = None
+
+@events.init.add_listener
+def on_token_pool_init(environment, **kwargs):
+    """Pool logins per process, or across workers through the master"""
+    global TOKEN_POOL
+    if not RecordedUser.HAS_LOGIN:
+        return
+    distributed = RecordedUser.AUTH_POOL == "master"
+    if isinstance(environment.runner, MasterRunner):
+        if distributed:
+            serve_token_pool(environment.runner, TokenPool(RecordedUser.USERS_PER_TOKEN))
+    elif isinstance(environment.runner, WorkerRunner) and distributed:
+        TOKEN_POOL = RemoteTokenPool(environment.runner)
+    else:
+        TOKEN_POOL = TokenPool(RecordedUser.USERS_PER_TOKEN)
+
+class RecordedUserMixin:
+    """
+    Behaviour shared by generated users, whichever HTTP client they run on.
+    
+    The generated RecordedUser subclasses RecordedHttpUser or
+    RecordedFastHttpUser (see get_template_header), adding one method per recorded step and overriding the
+    class attributes below.
+    """
     wait_time = between(1, 3)
+    # Recorded values of correlated context keys, used until a step extracts them
+    CONTEXT_DEFAULTS = {}
+    # Set with a generated _login when the recording has an authentication request
+    HAS_LOGIN = False
+    # Concurrent connections opened during warmup, and the steps it runs
+    WARMUP_CONNECTIONS = 1
+    WARMUP_STEPS = ()
+    # Set with a constant_throughput wait_time when generated for a target RPS
+    TARGET_RPS = None
+    TARGET_USERS = None
+    USERS_PER_TOKEN = int(os.environ.get("LOCUST_AUTH_USERS_PER_TOKEN", 1))
+    AUTH_POOL = os.environ.get("LOCUST_AUTH_POOL", "worker")
+    # HTTP client tuning (see TunedHttpAdapter)
+    POOL_SIZE = int(os.environ.get("LOCUST_POOL_SIZE", 10))
+    MAX_RETRIES = int(os.environ.get("LOCUST_MAX_RETRIES", 0))
+    KEEP_ALIVE = os.environ.get("LOCUST_KEEP_ALIVE", "true").lower() in ("1", "true", "yes")
+    TLS_SESSION_CACHE = os.environ.get("LOCUST_TLS_SESSION_CACHE", "true").lower() in ("1", "true", "yes")
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        # Disable SSL verification for self-signed certificates
-        self.client.verify = False
         # Initialize session context
-        self._context = {}
+        self._context = dict(self.CONTEXT_DEFAULTS)
         self._authenticated = False
+        # Shared login (see TokenPool) and the generation of it copied into _context
+        self._lease = None
+        self._token_generation = 0
 
     def on_start(self):
-        """Authentication runs before any tasks - proper flow"""
-        # Test initial connection
-        self._test_connection()
-        
-        # Perform authentication if needed
-        self._authenticate()
+        """Warm up before any tasks, outside the statistics"""
+        started = time.time()
+        with self._warming_up():
+            # Test initial connection, opening the warm connections alongside
+            extra = [gevent.spawn(self._test_connection, report=False) for _ in range(self.WARMUP_CONNECTIONS - 1)]
+            self._test_connection()
+            gevent.joinall(extra)
+            
+            # Perform authentication if needed
+            self._authenticate()
+            
+            for _ in range(WARMUP_ITERATIONS):
+                for step in self.WARMUP_STEPS:
+                    getattr(self, step)()
+        WARMUP.user_ready(time.time() - started)
     
-    def _test_connection(self):
+    @contextmanager
+    def _warming_up(self):
+        """Send this user's requests to WARMUP instead of the statistics"""
+        request_event = self.client.request_event
+        self.client.request_event = WARMUP.request_event
+        try:
+            yield
+        finally:
+            self.client.request_event = request_event
+    
+    def _test_connection(self, report=True):
         """Test initial connection to provide early feedback"""
         try:
             with self.client.get("/", catch_response=True) as response:
+                response.success()
+                if not report:
+                    return
                 if response.status_code == 0:
                     print("WARNING: Cannot connect to the target server. Please ensure the application is running and accessible.")
                 elif response.status_code >= 400:
                     print(f"WARNING  WARNING: Server returned status {response.status_code}. Check if the application is properly configured.")
                 else:
                     print("SUCCESS Successfully connected to the target server.")
-                response.success()
         except Exception as e:
             print(f"WARNING  WARNING: Connection test failed - {str(e)}")
     
+    def on_stop(self):
+        if self._lease is not None and TOKEN_POOL is not None:
+            TOKEN_POOL.release(self._lease)
+            self._lease = None
+    
     def _authenticate(self):
-        """Handle authentication flow - runs once per user"""
+        """Join a shared login from TOKEN_POOL - logs in only when no lease has room"""
+        if TOKEN_POOL is None:
+            return
+        self._lease = TOKEN_POOL.acquire(self)
+        self._sync_token()
+    
+    def _login(self):
+        """Send the authentication request; True on success"""
         # This will be populated with actual authentication logic
         # based on the flows that contain authentication requests
-        pass
+        return False
     
-    def _extract_auth_token(self, response):
-        """Extract authentication token from response"""
-        try:
-            if response.status_code == 200:
-                data = response.json()
-                # Common token field names
-                token_fields = ['token', 'access_token', 'auth_token', 'jwt', 'bearer_token', 'session_token']
-                for field in token_fields:
-                    if field in data:
-                        self._context[f'auth_{field}'] = data[field]
-                        print(f"SUCCESS Extracted {field} from authentication response")
-                        return data[field]
-                
-                # Check for nested token structures
-                if 'data' in data and isinstance(data['data'], dict):
-                    for field in token_fields:
-                        if field in data['data']:
-                            self._context[f'auth_{field}'] = data['data'][field]
-                            print(f"SUCCESS Extracted {field} from nested data")
-                            return data['data'][field]
-        except Exception as e:
-            print(f"WARNING  Could not extract token: {str(e)}")
+    def _obtain_token(self):
+        """Log in for a lease: (context values the login set, or None; token expiry or None)"""
+        before = dict(self._context)
+        if not self._login():
+            return None, None
+        context = {key: value for key, value in self._context.items() if key not in before or before[key] != value}
+        expires = None
+        for key, value in context.items():
+            if key.startswith("auth_") and key != "auth_expires_at":
+                expires = token_expiry(value)
+                if expires is not None:
+                    break
+        if expires is None:
+            expires = context.get("auth_expires_at") or (time.time() + AUTH_TOKEN_TTL if AUTH_TOKEN_TTL > 0 else None)
+        return context, expires
+    
+    def _sync_token(self):
+        """Copy the lease's current login into this user's context"""
+        lease = self._lease
+        if lease is None or lease.generation == self._token_generation:
+            return
+        if lease.context is not None:
+            self._context.update(lease.context)
+        self._authenticated = lease.context is not None
+        self._token_generation = lease.generation
+    
+    def _reauthenticate(self):
+        """A request was rejected with 401: refresh the shared login (once for all its users)"""
+        if self._lease is not None:
+            TOKEN_POOL.refresh(self, self._lease, self._token_generation)
+            self._sync_token()
+    
+    def _extract_auth_token(self, response, body=None):
+        """Extract authentication token from response (body: its _json_body, if already parsed)"""
+        if response.status_code != 200:
+            return None
+        if body is None:
+            body = self._json_body(response)
+        if body is None:
+            return None
+        for path in AUTH_TOKEN_PATHS:
+            token = body.get(path)
+            if token is not None:
+                self._context[f'auth_{path[-1]}'] = token
+                # OAuth-style lifetime, used when the token is not a JWT (see _obtain_token)
+                expires_in = body.get(path[:-1] + ("expires_in",))
+                if isinstance(expires_in, (int, float)) and not isinstance(expires_in, bool):
+                    self._context['auth_expires_at'] = time.time() + expires_in
+                print(f"SUCCESS Extracted {path[-1]} from {'nested data' if len(path) > 1 else 'authentication response'}")
+                return token
         return None
     
+    def _json_body(self, response):
+        """
+        The response body as a LazyJson, or None when it is not JSON or too large.
+        
+        JSON is UTF-8 (RFC 8259), so the body is decoded directly rather than
+        through the client's charset detection.
+        """
+        content = response.content
+        if not content or len(content) > JSON_MAX_BYTES:
+            return None
+        content_type = response.headers.get("Content-Type")
+        if content_type is not None and "json" not in content_type.lower():
+            return None
+        text = content.decode("utf-8", "replace")
+        if content_type is None and text.lstrip()[:1] not in ("{", "["):
+            return None
+        return LazyJson(text, JSON_PARTIAL_BYTES)
+    
     def _add_auth_headers(self, headers):
         """Add authentication headers if token is available"""
+        lease = self._lease
+        if lease is not None:
+            if lease.expiring(time.time()):
+                TOKEN_POOL.refresh(self, lease, self._token_generation)
+            if lease.generation != self._token_generation:
+                self._sync_token()
         auth_headers = {}
         for key, value in headers.items():
             auth_headers[key] = value
@@ -129,68 +1132,136 @@ class RecordedUser(HttpUser):
         
         return auth_headers
     
-    def _extract_context_from_response(self, response, flow_name):
-        """Extract context values from response for use in subsequent requests"""
-        try:
-            if response.status_code == 200:
-                data = response.json()
-                
-                # Extract common context values
-                context_extractions = {
-                    'participationId': ['participationId', 'id', 'participation_id'],
-                    'applicationId': ['applicationId', 'appId', 'application_id'],
-                    'eventId': ['eventId', 'event_id'],
-                    'userId': ['userId', 'user_id', 'id'],
-                    'sessionId': ['sessionId', 'session_id'],
-                    'companyId': ['companyId', 'company_id'],
-                    'language': ['language', 'lang'],
-                    'application': ['application', 'app']
-                }
-                
-                for context_key, possible_keys in context_extractions.items():
-                    for key in possible_keys:
-                        if key in data:
-                            self._context[context_key] = data[key]
-                            print(f"SUCCESS Extracted {context_key}={data[key]} from {flow_name}")
-                            break
-                        # Check nested structures
-                        elif isinstance(data, dict) and 'data' in data and isinstance(data['data'], dict):
-                            if key in data['data']:
-                                self._context[context_key] = data['data'][key]
-                                print(f"SUCCESS Extracted {context_key}={data['data'][key]} from nested data in {flow_name}")
-                                break
-                
-                # Extract arrays of IDs
-                if 'participations' in data and isinstance(data['participations'], list) and len(data['participations']) > 0:
-                    first_participation = data['participations'][0]
-                    if 'id' in first_participation:
-                        self._context['participationId'] = first_participation['id']
-                        print(f"SUCCESS Extracted participationId={first_participation['id']} from participations array in {flow_name}")
-                
-        except Exception as e:
-            print(f"WARNING  Could not extract context from {flow_name}: {str(e)}")
+    def _extract(self, response, rules, body=None):
+        """
+        Store the values this response hands to later steps (rules are generated
+        from the recording). body is the response's _json_body, if already parsed.
+        """
+        parsed = body is not None
+        for name, kind, source in rules:
+            try:
+                if kind == "json":
+                    if not parsed:
+                        body, parsed = self._json_body(response), True
+                    value = body.get(source) if body is not None else None
+                elif kind == "header":
+                    value = response.headers.get(source)
+                elif kind == "cookie":
+                    value = self._response_cookies(response).get(source)
+                else:
+                    match = source.search(response.text or "")
+                    value = match.group(1) if match else None
+            except (ValueError, KeyError, IndexError, TypeError):
+                value = None
+            if value is not None:
+                self._context[name] = value
+                if DEBUG:
+                    print(f"SUCCESS Extracted {name}={value}")
+    
+    def _render(self, segments):
+        """Substitute context values into a template pre-parsed at generation time"""
+        # Literal text at even positions, context keys at odd ones
+        parts = list(segments)
+        context = self._context
+        for i in range(1, len(parts), 2):
+            key = parts[i]
+            if key in context:
+                parts[i] = str(context[key])
+                if DEBUG:
+                    print(f"🔄 Substituted {{{key}}} with {context[key]}")
+            else:
+                parts[i] = f"{{{key}}}"
+        return "".join(parts)
     
     def _substitute_context_values(self, text):
         """Substitute context values in text/URLs"""
-        if not text or not isinstance(text, str):
+        if not text or not isinstance(text, str) or "{" not in text:
             return text
-            
-        # Replace context variables in the text
-        for key, value in self._context.items():
-            placeholder = f"{{{key}}}"
-            if placeholder in text:
-                text = text.replace(placeholder, str(value))
-                print(f"🔄 Substituted {placeholder} with {value}")
-        
-        return text
+        return self._render(PLACEHOLDER_RE.split(text))
+    
+    def _response_cookies(self, response):
+        """Cookies set by a response"""
+        return response.cookies
     
     def context(self):
         """Return shared context for correlation"""
         return self._context
+
+class RecordedHttpUser(RecordedUserMixin, HttpUser):
+    """Generated user on python-requests"""
+    abstract = True
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Disable SSL verification for self-signed certificates
+        self.client.verify = False
+        adapter = TunedHttpAdapter(self.POOL_SIZE, self.MAX_RETRIES, self.TLS_SESSION_CACHE)
+        self.client.mount("https://", adapter)
+        self.client.mount("http://", adapter)
+        if not self.KEEP_ALIVE:
+            self.client.headers["Connection"] = "close"
+
+class RecordedFastHttpUser(RecordedUserMixin, FastHttpUser):
+    """Generated user on geventhttpclient, for several times the RPS per worker core"""
+    abstract = True
+    # Disable SSL verification for self-signed certificates
+    insecure = True
+    
+    def __init__(self, *args, **kwargs):
+        # HTTP client tuning, read by FastHttpUser.__init__
+        self.concurrency = self.POOL_SIZE
+        self.max_retries = self.MAX_RETRIES
+        if self.TLS_SESSION_CACHE:
+            self.ssl_context_factory = TLS_SESSIONS.context
+        if not self.KEEP_ALIVE:
+            self.default_headers = dict(self.default_headers or {}, Connection="close")
+        super().__init__(*args, **kwargs)
+        # Count this user's connections through its own client pool, unless a
+        # shared client_pool was configured
+        agent = self.client.client
+        if AFTER_CONNECT_HOOK and self.client_pool is None and type(agent.clientpool) is HTTPClientPool:
+            agent.clientpool = CountingHTTPClientPool(**agent.clientpool.client_args)
+    
+    def _response_cookies(self, response):
+        """Cookies known to the session (geventhttpclient responses carry none)"""
+        return {cookie.name: cookie.value for cookie in self.client.cookiejar}
 '''
 
+def inline_module_source(module):
+    """Source of a leaf module for pasting into generated scripts, without its docstring"""
+    source = inspect.getsource(module)
+    body = ast.parse(source).body
+    if body and isinstance(body[0], ast.Expr) and isinstance(body[0].value, ast.Constant):
+        source = "\n".join(source.splitlines()[body[0].end_lineno:]).lstrip("\n")
+    return f"# --- {module.__name__}.py (inlined) ---\n{source.rstrip()}\n# --- end {module.__name__}.py ---\n"
+
+# Generated scripts are self-contained: shared helpers are pasted in
+for _module in (endpoint_names, hdr_histogram, lazy_json):
+    TEMPLATE_HEADER = TEMPLATE_HEADER.replace(f"# @inline {_module.__name__}\n", inline_module_source(_module))
+
+# Base class of the generated RecordedUser (see TEMPLATE_HEADER) for each target user class
+USER_BASE_CLASSES = {"HttpUser": "RecordedHttpUser", "FastHttpUser": "RecordedFastHttpUser"}
+USER_CLASSES = tuple(USER_BASE_CLASSES)
+
+USER_CLASS_TEMPLATE = """
+class RecordedUser({base_class}):
+    \"\"\"Recorded session replayed on Locust's {user_class}\"\"\"
+"""
+
+def get_template_header(user_class="HttpUser"):
+    """
+    Script header for the given Locust user class.
+    
+    FastHttpUser runs on geventhttpclient instead of python-requests, for
+    several times the RPS per worker core; auth, context extraction and
+    catch_response handling are the same for both (RecordedUserMixin).
+    """
+    if user_class not in USER_BASE_CLASSES:
+        raise ValueError(f"Unsupported user class '{user_class}'. Use one of {', '.join(USER_CLASSES)}")
+    return TEMPLATE_HEADER + USER_CLASS_TEMPLATE.format(base_class=USER_BASE_CLASSES[user_class], user_class=user_class)
+
 STEP_TEMPLATE = """
-    @task
+    {task_decorator}
     def step_{idx}(self):
         \"\"\"{name} - {method} request (Permission: {permission_level})\"\"\"
         # Check if user has required permissions
@@ -198,8 +1269,8 @@ STEP_TEMPLATE = """
             print(f"WARNING  Skipping {name} - authentication required")
             return
         
-        # Substitute context values in URL and body
-        substituted_url = self._substitute_context_values({url})
+        # Context placeholders were pre-parsed at generation time
+        substituted_url = {url}
         substituted_body = {body}
         
         # Add authentication headers if available
@@ -215,13 +1286,9 @@ STEP_TEMPLATE = """
             # Simplified response handling - let real issues surface
             if resp.status_code == 200:
                 resp.success()
-                # Extract tokens if this is an authentication endpoint
-                if "{is_auth_endpoint}":
-                    self._extract_auth_token(resp)
-                # Extract context values for subsequent requests
-                self._extract_context_from_response(resp, "{name}")
-            elif resp.status_code == 401:
+{extract_code}            elif resp.status_code == 401:
                 resp.failure("Authentication required - check credentials or token")
+                self._reauthenticate()
             elif resp.status_code == 403:
                 resp.failure("Access denied - check permissions or token scope for {permission_level} level")
             elif resp.status_code == 404:
@@ -230,7 +1297,73 @@ STEP_TEMPLATE = """
                 resp.failure(f"Server error: {{resp.status_code}}")
             else:
                 resp.failure(f"Request failed: {{resp.status_code}}")
-{set_context_code}
+"""
+
+REPLAY_TEMPLATE = """
+    # Timing-faithful replay: steps run in recorded order, each one started at
+    # its recorded offset (seconds after the first step) divided by
+    # TIME_COMPRESSION. Override at run time with LOCUST_TIME_COMPRESSION=<factor>.
+    TIME_COMPRESSION = float(os.environ.get("LOCUST_TIME_COMPRESSION", {time_compression!r}))
+    REPLAY_SCHEDULE = [
+{schedule}
+    ]
+
+    @task
+    def replay_session(self):
+        \"\"\"Replay the recorded session with its original think times\"\"\"
+        session_start = time.monotonic()
+        for offset, step in self.REPLAY_SCHEDULE:
+            delay = session_start + offset / self.TIME_COMPRESSION - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            getattr(self, step)()
+"""
+
+PARALLEL_TEMPLATE = """
+    # Browser-like page loads: the requests of a page batch run concurrently,
+    # at most MAX_CONNECTIONS_PER_HOST at a time to each recorded host
+    # (browsers open about 6). Override at run time with
+    # LOCUST_MAX_CONNECTIONS_PER_HOST=<n>.
+    MAX_CONNECTIONS_PER_HOST = int(os.environ.get("LOCUST_MAX_CONNECTIONS_PER_HOST", {max_connections}))
+    WARMUP_CONNECTIONS = MAX_CONNECTIONS_PER_HOST
+
+    def _host_slot(self, host):
+        \"\"\"The user's connection semaphore for a recorded host\"\"\"
+        from gevent.lock import BoundedSemaphore
+        slots = self.__dict__.setdefault("_host_slots", {{}})
+        if host not in slots:
+            slots[host] = BoundedSemaphore(self.MAX_CONNECTIONS_PER_HOST)
+        return slots[host]
+
+    def _fetch(self, step, host):
+        \"\"\"Run one page step once its host has a free connection\"\"\"
+        with self._host_slot(host):
+            getattr(self, step)()
+
+    def _load_page(self, name, steps):
+        \"\"\"Run (step, host) pairs concurrently and report the whole page load as a PAGE request\"\"\"
+        from gevent.pool import Group
+        group = Group()
+        start = time.perf_counter()
+        greenlets = [group.spawn(self._fetch, step, host) for step, host in steps]
+        group.join()
+        errors = [g.exception for g in greenlets if g.exception is not None]
+        self.environment.events.request.fire(
+            request_type="PAGE",
+            name=name,
+            response_time=(time.perf_counter() - start) * 1000,
+            response_length=0,
+            response=None,
+            context={{}},
+            exception=errors[0] if errors else None
+        )
+"""
+
+PAGE_TEMPLATE = """
+    {task_decorator}
+    def page_{idx}(self):
+        \"\"\"{name} - {count} requests fetched concurrently\"\"\"
+        self._load_page({name!r}, {steps!r})
 """
 
 BROWSER_TEMPLATE = """
@@ -244,18 +1377,110 @@ BROWSER_TEMPLATE = """
         driver.quit()
 """
 
-def generate_step_code(idx, flow, target_host=None):
-    # Extract relative path from full URL
-    full_url = flow["url"]
+# "{key}" placeholders for values from the user's context; keep in sync with
+# PLACEHOLDER_RE in TEMPLATE_HEADER
+PLACEHOLDER_RE = re.compile(r"\{([^{}\s]+)\}")
+
+def compile_substitution(text, keys=None):
+    """
+    Pre-parse a text with "{key}" context placeholders into segments.
+    
+    Literal text sits at even positions and context keys at odd ones, so the
+    generated script substitutes with a single join (RecordedUser._render).
+    With ``keys``, only those placeholders are substituted. Returns None when
+    the text has no placeholders.
+    """
+    parts = PLACEHOLDER_RE.split(text)
+    if keys is not None:
+        merged = [parts[0]]
+        for i in range(1, len(parts), 2):
+            if parts[i] in keys:
+                merged += [parts[i], parts[i + 1]]
+            else:
+                merged[-1] += f"{{{parts[i]}}}{parts[i + 1]}"
+        parts = merged
+    return tuple(parts) if len(parts) > 1 else None
+
+def substitution_code(text, keys=None):
+    """Python expression for a text with its context placeholders substituted"""
+    if not isinstance(text, str):
+        return repr(text)
+    segments = compile_substitution(text, keys)
+    return repr(text) if segments is None else f"self._render({segments!r})"
+
+def generate_extract_code(attribute, rules, indent, body=None):
+    """
+    Class attribute holding a step's extraction rules, and the call applying them.
+    
+    ``body`` names a variable holding the already parsed response (see
+    RecordedUser._json_body). Returns ``("", "")`` for steps that feed
+    nothing, so they never parse their response.
+    """
+    if not rules:
+        return "", ""
+    lines = []
+    for name, kind, source in rules:
+        if kind == "json":
+            lines.append(f"        ({name!r}, 'json', {tuple(source)!r}),  # {json_path(source)}")
+        elif kind == "regex":
+            lines.append(f"        ({name!r}, 'regex', re.compile({source!r})),")
+        else:
+            lines.append(f"        ({name!r}, {kind!r}, {source!r}),")
+    attribute_code = f"\n    # Values used by later requests\n    {attribute} = (\n" + "\n".join(lines) + "\n    )\n"
+    return attribute_code, f"{' ' * indent}self._extract(resp, self.{attribute}{', ' + body if body else ''})\n"
+
+def generate_context_defaults(correlations):
+    """CONTEXT_DEFAULTS class attribute: recorded values of correlated keys"""
+    if not correlations:
+        return ""
+    lines = [f"        {c.name!r}: {c.value!r},  # request {c.producer + 1}: {c.kind} {c.describe()}" for c in correlations]
+    return "\n    CONTEXT_DEFAULTS = {\n" + "\n".join(lines) + "\n    }\n"
+
+def headers_code(headers, keys=None):
+    """Python expression for a headers dict, substituting the ``keys`` placeholders in values"""
+    if not keys:
+        return str(headers)
+    return "{" + ", ".join(f"{name!r}: {substitution_code(value, keys)}" for name, value in headers.items()) + "}"
+
+def get_relative_url(full_url):
+    """Extract the relative path from a full URL (e.g., "http://localhost/path" -> "/path")"""
     if "://" in full_url:
-        # Extract path from full URL (e.g., "http://localhost/path" -> "/path")
         url_parts = full_url.split("://", 1)[1].split("/", 1)
         if len(url_parts) > 1:
-            relative_url = "/" + url_parts[1]
-        else:
-            relative_url = "/"
-    else:
-        relative_url = full_url
+            return "/" + url_parts[1]
+        return "/"
+    return full_url
+
+def generate_step_code(idx, flow, target_host=None, cluster=None, replay=False, in_page=False):
+    """
+    Generate one task for a flow.
+    
+    With an EndpointCluster (see flow_templates.py) the task stands for all
+    requests merged into it: it is weighted by the observed count and picks
+    one of the recorded URLs at random. Replay steps are plain methods called
+    by the replay_session task (see generate_replay_code), and steps of a page
+    batch are called by their page task (see generate_page_code).
+    """
+    relative_url = get_relative_url(flow["url"])
+    url_code = substitution_code(relative_url)
+    context_keys = set(cluster.use_context if cluster is not None else flow.get("use_context", []))
+    rules = cluster.extract if cluster is not None else context_rules(flow)
+    task_decorator = "@task"
+    if in_page:
+        task_decorator = "# Page step, fetched concurrently by its page task"
+    elif replay:
+        task_decorator = "# Replay step, called in order by replay_session"
+    if cluster is not None:
+        urls = tuple(get_relative_url(url) for url in cluster.urls)
+        if len(urls) > 1:
+            url_code = f"random.choice({urls!r})"
+            segments = [compile_substitution(url) for url in urls]
+            if any(segments):
+                segments = tuple(segment or (url,) for segment, url in zip(segments, urls))
+                url_code = f"self._render(random.choice({segments!r}))"
+        if cluster.count > 1:
+            task_decorator = f"@task({cluster.count})"
+        relative_url = get_relative_url(cluster.template)
     
     # Keep URL as string for template substitution
     # The template will handle the context substitution
@@ -309,7 +1534,7 @@ def generate_step_code(idx, flow, target_host=None):
     if not any(key.lower() == 'x-requested-with' for key in filtered_headers.keys()):
         filtered_headers['X-Requested-With'] = 'XMLHttpRequest'
     
-    headers_code = str(filtered_headers)
+    step_headers_code = headers_code(filtered_headers, context_keys)
     
     # Enhanced JSON handling for all APIs - check content-type to determine parameter
     data_param = "data"  # Default to 'data' parameter
@@ -322,7 +1547,10 @@ def generate_step_code(idx, flow, target_host=None):
             content_type = value.lower()
             break
     
-    if flow.get("body"):
+    if flow.get("body") and context_keys and isinstance(flow["body"], str) and compile_substitution(flow["body"], context_keys):
+        # Correlated values: send the recorded text with the extracted values substituted
+        body_code = substitution_code(flow["body"], context_keys)
+    elif flow.get("body"):
         try:
             # Try to parse as JSON to validate and re-serialize properly
             body_data = json.loads(flow.get("body"))
@@ -349,53 +1577,226 @@ def generate_step_code(idx, flow, target_host=None):
                 body_code = f'json.dumps({repr(body_data)})'
         except (json.JSONDecodeError, TypeError):
             # If not valid JSON, use as raw data with context substitution
-            body_code = f'self._substitute_context_values({repr(flow.get("body"))})'
+            body_code = substitution_code(flow.get("body"))
     else:
         body_code = "None"
     
     cookies_code = "{" + ", ".join([f'"{k.replace("cookie_","")}": self._context.get("{k}", "")' for k in flow.get("use_context", []) if k.startswith("cookie_")]) + "}" if any(k.startswith("cookie_") for k in flow.get("use_context", [])) else "None"
 
-    set_context_code = ""
-    for k in flow.get("set_context", []):
-        if k.startswith("cookie_"):
-            cname = k.replace("cookie_", "")
-            set_context_code += f'                        if "{cname}" in resp.cookies:\n'
-            set_context_code += f'                            self._context["{k}"] = resp.cookies["{cname}"]\n'
-        else:
-            set_context_code += f'                        if "{k}" in data:\n'
-            set_context_code += f'                            self._context["{k}"] = data.get("{k}")\n'
-
-    # Create cleaner task name
-    task_name = relative_url.split("/")[-1] or f"Step{idx}"
-    if '?' in task_name:
-        task_name = task_name.split('?')[0]
-    if '.dot.html' in task_name:
-        task_name = task_name.replace('.dot.html', '')
-    if 'cacheId=' in task_name:
-        task_name = task_name.split('cacheId=')[0].rstrip('?&')
-    
     # Check if this is an authentication endpoint
     is_auth_endpoint = is_authentication_flow(flow)
     
+    # Responses are parsed only by steps that extract from them, and once
+    if is_auth_endpoint and rules:
+        extract_attribute, extract_code = generate_extract_code(f"step_{idx}_extract", rules, 16, "json_body")
+        extract_code = ("                json_body = self._json_body(resp)\n"
+                        "                self._extract_auth_token(resp, json_body)\n" + extract_code)
+    else:
+        extract_attribute, extract_code = generate_extract_code(f"step_{idx}_extract", rules, 16)
+        if is_auth_endpoint:
+            extract_code = "                self._extract_auth_token(resp)\n"
+
+    # Create cleaner task name
+    path = relative_url.split('?')[0]
+    task_name = path.split("/")[-1] or f"Step{idx}"
+    if task_name.startswith("{") and path.count("/") > 1:
+        # Templated segment: keep the resource it belongs to (e.g. "users/{id}")
+        task_name = "/".join(path.split("/")[-2:])
+    task_name = clean_endpoint_name(task_name)
+    
     # Check permission requirements
     needs_permissions = requires_permissions(flow)
     permission_level = get_permission_level(flow)
     
-    return STEP_TEMPLATE.format(
+    return extract_attribute + STEP_TEMPLATE.format(
         idx=idx,
+        task_decorator=task_decorator,
         method=flow["method"].lower(),
-        url=repr(relative_url),
-        headers=headers_code,
+        url=url_code,
+        headers=step_headers_code,
         data_param=data_param,
         body=body_code,
         cookies=cookies_code,
         name=task_name,
-        is_auth_endpoint=str(is_auth_endpoint).lower(),
         requires_permissions=str(needs_permissions).lower(),
         permission_level=permission_level,
-        set_context_code=set_context_code
+        extract_code=extract_code
     )
 
+def parse_started_time(value):
+    """Epoch seconds of a HAR startedDateTime, or None if missing or invalid"""
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+def replay_offsets(flows):
+    """
+    Start offset of each flow in seconds, from startedDateTime deltas.
+    
+    Flows without a usable timestamp start together with the previous one.
+    """
+    offsets = []
+    first = None
+    offset = 0.0
+    for flow in flows:
+        started = parse_started_time(flow.get("timestamp"))
+        if started is not None:
+            if first is None:
+                first = started
+            offset = max(started - first, 0.0)
+        offsets.append(offset)
+    return offsets
+
+def group_page_batches(indexed_flows):
+    """
+    Group (idx, flow) pairs into batches a browser fetched concurrently.
+    
+    A flow joins the current batch when it belongs to the same page (HAR
+    pageref) and starts before the requests already in the batch have all
+    finished, going by startedDateTime and the entry time. Flows without a
+    timestamp start a batch of their own.
+    """
+    batches = []
+    batch_end = None
+    pageref = None
+    for idx, flow in indexed_flows:
+        started = parse_started_time(flow.get("timestamp"))
+        overlaps = (
+            batches and started is not None and batch_end is not None
+            and flow.get("pageref") == pageref and started < batch_end
+        )
+        if overlaps:
+            batches[-1].append((idx, flow))
+        else:
+            batches.append([(idx, flow)])
+            batch_end = None
+            pageref = flow.get("pageref")
+        if started is not None:
+            end = started + (flow.get("response_time") or 0) / 1000.0
+            batch_end = end if batch_end is None else max(batch_end, end)
+    return batches
+
+def generate_page_code(idx, batch, replay=False):
+    """Generate the task that loads a batch of steps (see group_page_batches) concurrently"""
+    pageref = batch[0][1].get("pageref")
+    name = f"Page {idx} ({pageref})" if pageref else f"Page {idx}"
+    return PAGE_TEMPLATE.format(
+        idx=idx,
+        task_decorator="# Replay step, called in order by replay_session" if replay else "@task",
+        name=name,
+        count=len(batch),
+        steps=[(f"step_{step_idx}", urlsplit(flow["url"]).netloc) for step_idx, flow in batch]
+    )
+
+def generate_parallel_code(max_connections=6):
+    """Generate the page-load helper shared by all page tasks"""
+    return PARALLEL_TEMPLATE.format(max_connections=int(max_connections))
+
+def generate_client_code(pool_size=10, max_retries=0, keep_alive=True, tls_session_cache=True):
+    """HTTP client tuning class attributes that differ from the TEMPLATE_HEADER defaults"""
+    lines = []
+    if pool_size != 10:
+        lines.append(f'    POOL_SIZE = int(os.environ.get("LOCUST_POOL_SIZE", {int(pool_size)}))')
+    if max_retries != 0:
+        lines.append(f'    MAX_RETRIES = int(os.environ.get("LOCUST_MAX_RETRIES", {int(max_retries)}))')
+    if not keep_alive:
+        lines.append('    KEEP_ALIVE = os.environ.get("LOCUST_KEEP_ALIVE", "false").lower() in ("1", "true", "yes")')
+    if not tls_session_cache:
+        lines.append('    TLS_SESSION_CACHE = os.environ.get("LOCUST_TLS_SESSION_CACHE", "false").lower() in ("1", "true", "yes")')
+    if not lines:
+        return ""
+    return "\n    # HTTP client tuning\n" + "\n".join(lines) + "\n"
+
+def generate_warmup_code(step_flows):
+    """WARMUP_STEPS class attribute: the GET steps among (index, flow) pairs, run to prime caches"""
+    steps = tuple(f"step_{idx}" for idx, flow in step_flows if flow.get("method", "").upper() == "GET")
+    if not steps:
+        return ""
+    return f"\n    # Recorded GET steps run during warmup (LOCUST_WARMUP_ITERATIONS)\n    WARMUP_STEPS = {steps!r}\n"
+
+# Largest share of its time a user may spend waiting for responses before
+# throughput_model adds users: constant_throughput cannot catch up on a user
+# that is still busy when its next task is due
+TARGET_UTILIZATION = 0.5
+
+def task_costs(batches, replay=False, time_compression=1.0):
+    """
+    (requests, seconds) that one run of each task costs.
+    
+    ``batches`` holds the (idx, flow) steps of each task: one step, or a page
+    batch fetched concurrently (see group_page_batches). Seconds are the
+    slowest recorded response time in the batch. With replay, the batches make
+    up the single replay_session task, which also waits out the recorded
+    offsets divided by time_compression.
+    """
+    costs = [
+        (len(batch), max((flow.get("response_time") or 0) / 1000.0 for _, flow in batch))
+        for batch in batches if batch
+    ]
+    if replay and costs:
+        offsets = replay_offsets([flow for batch in batches for _, flow in batch])
+        span = (max(offsets) - min(offsets)) / time_compression
+        costs = [(sum(requests for requests, _ in costs), span + costs[-1][1])]
+    return costs
+
+def throughput_model(costs, target_rps, users=None, user_rps=1.0):
+    """
+    Size a run that offers target_rps requests per second in total.
+    
+    ``costs`` are the (requests, seconds) of each task (see task_costs), which
+    users pick with equal probability; deduplicated tasks are weighted by their
+    recorded count, so pass one entry per recorded request for them. Unless
+    ``users`` is given, there is one user per user_rps requests per second,
+    and more if the recorded response times would keep users busy for over
+    TARGET_UTILIZATION of their time (Little's law).
+    
+    Returns a dict with the user count, each user's task rate (for
+    constant_throughput), the mean requests and seconds per task, and the
+    expected utilization of a user.
+    """
+    costs = costs or [(1, 0.0)]
+    requests = sum(requests for requests, _ in costs) / len(costs)
+    seconds = sum(seconds for _, seconds in costs) / len(costs)
+    # Users waiting for responses at any time, at the target rate
+    busy = target_rps / requests * seconds
+    if users is None:
+        users = max(math.ceil(target_rps / user_rps - 1e-9), math.ceil(busy / TARGET_UTILIZATION - 1e-9), 1)
+    return {
+        "target_rps": float(target_rps),
+        "users": int(users),
+        "task_rate": target_rps / users / requests,
+        "requests_per_task": requests,
+        "task_seconds": seconds,
+        "utilization": busy / users
+    }
+
+def generate_throughput_code(model):
+    """Pace users for a throughput_model: TARGET_RPS, TARGET_USERS and a constant_throughput wait_time"""
+    if not model:
+        return ""
+    return f"""
+    # Target throughput: {model['users']} user(s) each starting {model['task_rate']:.4g} task(s)/s
+    # of {model['requests_per_task']:.3g} request(s) (recorded {model['task_seconds'] * 1000:.0f} ms per task)
+    TARGET_RPS = float(os.environ.get("LOCUST_TARGET_RPS", {model['target_rps']!r}))
+    TARGET_USERS = int(os.environ.get("LOCUST_TARGET_USERS", {model['users']}))
+    REQUESTS_PER_TASK = {model['requests_per_task']!r}
+    wait_time = constant_throughput(TARGET_RPS / TARGET_USERS / REQUESTS_PER_TASK)
+"""
+
+def generate_replay_code(schedule, time_compression=1.0):
+    """
+    Generate the replay_session task from (offset, step method name) pairs.
+    
+    Steps are sorted by offset, and offsets are made relative to the first step.
+    """
+    if not schedule:
+        return ""
+    schedule = sorted(schedule, key=lambda item: item[0])
+    base = schedule[0][0]
+    lines = ",\n".join(f"        ({offset - base:.3f}, {step!r})" for offset, step in schedule)
+    return REPLAY_TEMPLATE.format(time_compression=float(time_compression), schedule=lines)
+
 def is_authentication_flow(flow):
     """Detect if a flow is an authentication request"""
     url = flow.get("url", "").lower()
@@ -437,24 +1838,22 @@ def get_permission_level(flow):
     else:
         return "public"
 
-def generate_authentication_code(auth_flows, target_host):
-    """Generate authentication code for on_start method"""
+def generate_authentication_code(auth_flows, target_host, users_per_token=1, auth_pool="worker"):
+    """
+    Generate the login used by on_start (see TokenPool in TEMPLATE_HEADER).
+    
+    users_per_token users share each login; auth_pool is "worker" (pooled per
+    process) or "master" (pooled across workers by the master).
+    """
     if not auth_flows:
         return ""
     
     # Use the first authentication flow
     idx, flow = auth_flows[0]
+    context_keys = set(flow.get("use_context", []))
     
     # Extract relative path from full URL
-    full_url = flow["url"]
-    if "://" in full_url:
-        url_parts = full_url.split("://", 1)[1].split("/", 1)
-        if len(url_parts) > 1:
-            relative_url = "/" + url_parts[1]
-        else:
-            relative_url = "/"
-    else:
-        relative_url = full_url
+    relative_url = get_relative_url(flow["url"])
     
     # Keep URL as string for template substitution
     # The template will handle the context substitution
@@ -497,7 +1896,10 @@ def generate_authentication_code(auth_flows, target_host):
             content_type = value.lower()
             break
     
-    if flow.get("body"):
+    if flow.get("body") and context_keys and isinstance(flow["body"], str) and compile_substitution(flow["body"], context_keys):
+        # Correlated values: send the recorded text with the extracted values substituted
+        body_code = substitution_code(flow["body"], context_keys)
+    elif flow.get("body"):
         try:
             body_data = json.loads(flow.get("body"))
             if method in ['put', 'post'] and isinstance(body_data, dict):
@@ -521,131 +1923,394 @@ def generate_authentication_code(auth_flows, target_host):
             # If not valid JSON, use as raw data
             body_code = repr(flow.get("body"))
     
-    auth_code = f'''
-    def _authenticate(self):
-        """Handle authentication flow - runs once per user"""
+    extract_attribute, extract_code = generate_extract_code("auth_extract", context_rules(flow), 20, "json_body")
+    
+    auth_code = extract_attribute + f'''
+    # Shared logins: override with LOCUST_AUTH_USERS_PER_TOKEN / LOCUST_AUTH_POOL
+    HAS_LOGIN = True
+    USERS_PER_TOKEN = int(os.environ.get("LOCUST_AUTH_USERS_PER_TOKEN", {users_per_token!r}))
+    AUTH_POOL = os.environ.get("LOCUST_AUTH_POOL", "{auth_pool}")
+
+    def _login(self):
+        """Send the recorded authentication request; True on success"""
         try:
             with self.client.{method}(
-                {repr(relative_url)},
-                headers={str(filtered_headers)},
+                {substitution_code(relative_url)},
+                headers={headers_code(filtered_headers, context_keys)},
                 {data_param}={body_code},
                 catch_response=True,
                 name="Authentication"
             ) as resp:
                 if resp.status_code == 200:
                     resp.success()
-                    self._authenticated = True
                     print("SUCCESS Authentication successful")
                     
-                    # Extract and store authentication token
-                    token = self._extract_auth_token(resp)
+                    # Extract and store authentication token (one parse for all extractors)
+                    json_body = self._json_body(resp)
+                    token = self._extract_auth_token(resp, json_body)
                     if token:
                         print(f"SUCCESS Authentication token extracted and stored")
                     else:
                         print("WARNING  No authentication token found in response")
                     
-                    # Extract context values for subsequent requests
-                    self._extract_context_from_response(resp, "Authentication")
-                else:
-                    resp.failure(f"Authentication failed: {{resp.status_code}}")
-                    print(f"ERROR Authentication failed: {{resp.status_code}}")
+{extract_code}                    return True
+                resp.failure(f"Authentication failed: {{resp.status_code}}")
+                print(f"ERROR Authentication failed: {{resp.status_code}}")
         except Exception as e:
             print(f"ERROR Authentication error: {{str(e)}}")
+        return False
 '''
     
     return auth_code
 
-def generate_locust(input_path, out_path, target_host=None):
-    # Check if input is HAR or YAML
-    if input_path.endswith('.har'):
-        # Process HAR file directly
-        import json
-        with open(input_path, "r", encoding="utf-8") as f:
-            har_data = json.load(f)
+# Ranges of numeric generation options
+POSITIVE = "positive"
+NON_NEGATIVE = "non-negative"
+
+# Script generation options for /generate, /jobs/generate and the command
+# line: name -> (type, range, default). The range of a number is POSITIVE or
+# NON_NEGATIVE, that of a string the tuple of accepted values. Options left
+# out (or null) take their default; None defaults make an option optional.
+GENERATE_OPTIONS = {
+    # Merge requests into one weighted task per URL template
+    "dedupe": (bool, None, True),
+    # Weighted random tasks, or the recorded order and think times (dedupe does not apply)
+    "mode": (str, ("random", "replay"), "random"),
+    # Replay speed-up factor
+    "time_compression": (float, POSITIVE, 1.0),
+    # Fetch the requests of a page load concurrently, like a browser (dedupe does not apply)
+    "parallel": (bool, None, False),
+    # Requests in flight per recorded host during parallel page loads
+    "max_connections_per_host": (int, POSITIVE, 6),
+    # python-requests or geventhttpclient (see USER_BASE_CLASSES)
+    "user_class": (str, USER_CLASSES, "HttpUser"),
+    # Extract values that responses hand to later requests instead of replaying the recorded ones
+    "correlate": (bool, None, True),
+    # Users sharing one login
+    "users_per_token": (int, POSITIVE, 1),
+    # Logins shared per process, or across the workers of a distributed run
+    "auth_pool": (str, ("worker", "master"), "worker"),
+    # Connections kept per host by each user's client
+    "pool_size": (int, POSITIVE, 10),
+    # Retries of failed connections
+    "max_retries": (int, NON_NEGATIVE, 0),
+    # Reuse connections between requests
+    "keep_alive": (bool, None, True),
+    # Resume TLS sessions on new connections
+    "tls_session_cache": (bool, None, True),
+    # Total requests per second to offer; users are paced with constant_throughput
+    # to reach it (by default they wait between(1, 3) seconds)
+    "target_rps": (float, POSITIVE, None),
+    # User count for target_rps (by default derived, see throughput_model)
+    "users": (int, POSITIVE, None),
+    # Requests per second per user when deriving users
+    "user_rps": (float, POSITIVE, 1.0),
+}
+
+def normalize_generate_options(data):
+    """
+    Validate the GENERATE_OPTIONS in ``data`` and fill in their defaults.
+    
+    Other keys are ignored. Raises ValueError with a message naming the
+    offending option.
+    """
+    options = {}
+    for name, (kind, allowed, default) in GENERATE_OPTIONS.items():
+        value = data.get(name)
+        if value is None or (kind is str and not value):
+            options[name] = default
+            continue
+        if kind is bool:
+            if not isinstance(value, bool):
+                raise ValueError(f"{name} must be true or false")
+        elif kind is str:
+            if value not in allowed:
+                raise ValueError(f"Unsupported {name}. Use one of: {', '.join(allowed)}")
+        else:
+            number = (int, float) if kind is float else int
+            if isinstance(value, bool) or not isinstance(value, number) or not (value > 0 if allowed == POSITIVE else value >= 0):
+                raise ValueError(f"{name} must be a {allowed} {'number' if kind is float else 'integer'}")
+            value = kind(value)
+        options[name] = value
+    if options["users"] is not None and options["target_rps"] is None:
+        raise ValueError("users requires target_rps")
+    options["dedupe"] = options["dedupe"] and options["mode"] != "replay" and not options["parallel"]
+    return options
+
+def load_flows(input_path):
+    """
+    /convert flows and metadata of a HAR file (plain, .har.gz or .har.zst) or a YAML file.
+    
+    A YAML file holds a /convert response body, or just its list of flows.
+    """
+    if is_har_filename(input_path):
+        with open_har(input_path) as f:
+            flow_data = collect_flow_data(iter_flow_events(f), datetime.now().isoformat())
+        return flow_data["flows"], flow_data["metadata"]
+    with open(input_path, "r", encoding="utf-8") as f:
+        flow_data = yaml.safe_load(f)
+    if isinstance(flow_data, dict):
+        return flow_data.get("flows", []), flow_data.get("metadata", {})
+    return flow_data or [], {}
+
+def generate_locust(input_path, out_path, target_host=None, filters=None, **options):
+    """
+    Write a Locust script for a HAR or YAML flow file (the command line entry point).
+    
+    Flows go through the same conversion and generation as /convert and
+    /generate; ``options`` are GENERATE_OPTIONS and ``filters`` a flow_filters
+    preset name or rule dict. Raises ValueError for invalid options or filters.
+    """
+    options = normalize_generate_options(options)
+    filters = normalize_filter_config(filters)
+    flows, metadata = load_flows(input_path)
+    content = generate_locust_script_content(
+        flows, metadata, os.path.basename(out_path), target_host, filters=filters, options=options
+    )
+    with open(out_path, "w", encoding="utf-8") as f:
+        f.write(content)
+    logger.info("Locust script generated at %s from %d request(s)", out_path, len(flows))
+    return out_path
+
+def generate_locust_script_content(flows: list, metadata: dict, script_filename: str, target_host: str = None, progress=None, filters=None, options=None, blob_dir=None) -> str:
+    """
+    Generate Locust script content from /convert flows (used by /generate and generation jobs).
+    
+    ``progress``, if given, is called as progress(done, total) after each task.
+    ``filters`` is a normalized flow_filters configuration; flows it rejects
+    get no task. ``options`` holds generator switches (see
+    normalize_generate_options). ``blob_dir`` is the blob store holding
+    bodies=ref response bodies. This runs in worker processes, so it takes
+    all of its state as arguments.
+    """
+    blob_store = BlobStore(blob_dir) if blob_dir else None
+    options = options or {}
+    replay = options.get('mode') == "replay"
+    parallel = options.get('parallel', False)
+    dedupe = options.get('dedupe', True) and not replay and not parallel
+    correlate = options.get('correlate', True)
+    filter_line = ""
+    if filters:
+        flow_filter = FlowFilter(filters)
+        flows = [flow for flow in flows if not isinstance(flow, dict) or flow_filter.accept_flow(flow)]
+        filter_stats = flow_filter.stats()
+        filter_line = f"\nFiltered: {format_stats(filter_stats)}"
+        logger.debug("Filtered out %d flow(s): %s", filter_stats['dropped'], filter_stats['by_rule'])
+    
+    # Extract target host from flows if not provided
+    if not target_host and flows:
+        # Try to extract host from the first flow's URL
+        first_flow = flows[0] if flows else {}
+        first_url = first_flow.get('url', '')
+        if '://' in first_url:
+            # Extract host from URL (e.g., "https://example.com/path" -> "https://example.com")
+            target_host = first_url.split('://')[0] + '://' + first_url.split('://')[1].split('/')[0]
+            print(f"DEBUG: Extracted target host from flows: {target_host}")
+    
+    # Convert flows to the format expected by the improved generator
+    converted_flows = []
+    for i, flow in enumerate(flows):
+        # Check if flow is a dictionary, if not skip it
+        if not isinstance(flow, dict):
+            print(f"WARNING: Skipping non-dict flow: {type(flow)} - {flow}")
+            continue
         
-        # Convert HAR to flows (simplified version)
-        flows = []
-        for entry in har_data.get("log", {}).get("entries", []):
-            request = entry.get("request", {})
-            response = entry.get("response", {})
-            
-            # Extract headers
-            headers = {}
-            for header in request.get("headers", []):
-                headers[header["name"]] = header["value"]
-            
-            # Extract body
-            body = ""
-            if request.get("postData"):
-                body = request["postData"].get("text", "")
-            
-            flow = {
-                "method": request.get("method", "GET"),
-                "url": request.get("url", ""),
-                "headers": headers,
-                "body": body,
-                "status_code": response.get("status", 200)
+        # Convert headers from list format to dict format
+        headers_dict = {}
+        for header in flow.get('request_headers', []):
+            if isinstance(header, dict) and 'name' in header and 'value' in header:
+                headers_dict[header['name']] = header['value']
+        
+        # Convert request body - handle both dict and string formats
+        body_data = flow.get('request_body', {})
+        if isinstance(body_data, dict) and body_data:
+            # If it's a dict, convert to JSON string
+            body_str = json.dumps(body_data)
+        elif isinstance(body_data, str) and body_data:
+            # If it's already a string, use it as-is
+            body_str = body_data
+        else:
+            body_str = None
+        
+        # Create converted flow
+        converted_flow = {
+            "method": flow.get('method', 'GET'),
+            "url": flow.get('url', ''),
+            "headers": headers_dict,
+            "body": body_str,
+            "timestamp": flow.get('timestamp'),
+            "response_time": flow.get('response_time'),
+            "pageref": flow.get('pageref'),
+            "set_context": [],  # Filled in by correlate_flows (extract rules)
+            "use_context": []
+        }
+        if correlate:
+            # The recorded response, for finding values that later requests send back
+            converted_flow["response_headers"] = {
+                header['name']: header['value'] for header in flow.get('response_headers', [])
+                if isinstance(header, dict) and 'name' in header and 'value' in header
             }
-            flows.append(flow)
-    else:
-        # Process YAML file
-        with open(input_path, "r", encoding="utf-8") as f:
-            flows = yaml.safe_load(f)
+            converted_flow["response_text"] = response_text(flow.get('response_body'), blob_store)
+        converted_flows.append(converted_flow)
+    
+    correlations = []
+    if correlate:
+        converted_flows, correlations = correlate_flows(converted_flows)
+        logger.debug("Found %d correlated value(s)", len(correlations))
+        for flow in converted_flows:
+            flow.pop("response_text", None)
+            flow.pop("response_headers", None)
+    
+    # Merge requests that only differ by IDs or cache busters into weighted tasks
+    task_flows = [flow for flow in converted_flows if not is_authentication_flow(flow)]
+    clusters = cluster_flows(task_flows) if dedupe else None
+    task_count = len(clusters) if dedupe else len(task_flows)
+    mode_line = ""
+    if replay:
+        mode_line = f"\nMode: replay ({options.get('time_compression', 1.0)}x time compression)"
+    batches = None
+    if parallel:
+        batches = group_page_batches([
+            (i+1, flow) for i, flow in enumerate(converted_flows) if not is_authentication_flow(flow)
+        ])
+        pages = sum(1 for batch in batches if len(batch) > 1)
+        mode_line += f"\nParallel page loads: {pages} (up to {options.get('max_connections_per_host', 6)} connections per host)"
+    if correlations:
+        mode_line += f"\nCorrelated values: {len(correlations)}"
+    model = None
+    if options.get('target_rps'):
+        # What one run of each task costs; every recorded request is equally
+        # likely in random mode (deduplicated tasks are weighted by their count)
+        if batches is not None:
+            costs = task_costs(batches, replay, options.get('time_compression', 1.0))
+        else:
+            costs = task_costs([[(i+1, flow)] for i, flow in enumerate(task_flows)], replay, options.get('time_compression', 1.0))
+        model = throughput_model(costs, options['target_rps'], options.get('users'), options.get('user_rps', 1.0))
+        mode_line += f"\nTarget throughput: {options['target_rps']:g} requests/s from {model['users']} user(s)"
+        logger.debug("Throughput model: %s", model)
+        if model['utilization'] > TARGET_UTILIZATION:
+            mode_line += f" (too few: users would wait for responses {model['utilization']:.0%} of the time)"
+            logger.warning("Users would wait for responses %.0f%% of the time at %g requests/s; use more users",
+                           model['utilization'] * 100, options['target_rps'])
+    
+    # Generate script using the improved template
+    script_content = f'''
+"""
+Generated Locust script from HAR file
+Generated at: {datetime.now().isoformat()}
+Total requests: {len(converted_flows)}
+Tasks: {task_count}{filter_line}{mode_line}
+"""
 
-    code = TEMPLATE_HEADER
-    json_apis_count = 0
-    auth_flows = []
+{get_template_header(options.get('user_class', "HttpUser"))}
+'''
+    script_content += generate_context_defaults(correlations)
+    script_content += generate_client_code(
+        options.get('pool_size', 10), options.get('max_retries', 0),
+        options.get('keep_alive', True), options.get('tls_session_cache', True)
+    )
     
     # Identify authentication flows
-    for i, flow in enumerate(flows, 1):
+    auth_flows = []
+    for i, flow in enumerate(converted_flows):
         if is_authentication_flow(flow):
-            auth_flows.append((i, flow))
+            auth_flows.append((i+1, flow))
     
     # Generate authentication code if found
     if auth_flows:
-        code += generate_authentication_code(auth_flows, target_host)
+        print(f"DEBUG: Found {len(auth_flows)} authentication flow(s)")
+        auth_code = generate_authentication_code(
+            auth_flows, target_host, options.get('users_per_token', 1), options.get('auth_pool', "worker")
+        )
+        script_content += auth_code
     
-    # Generate regular task flows
-    for i, flow in enumerate(flows, 1):
-        if not is_authentication_flow(flow):
-            code += generate_step_code(i, flow, target_host)
-        
-        # Count APIs that will use enhanced JSON handling
-        if flow.get("body") and flow["method"].lower() in ['put', 'post']:
-            try:
-                json.loads(flow.get("body"))
-                json_apis_count += 1
-            except (json.JSONDecodeError, TypeError):
-                pass
+    # Generate task methods for each flow using the improved template
+    print(f"DEBUG: Generating tasks for {len(converted_flows)} converted flows")
+    if dedupe:
+        logger.debug("Merged %d request(s) into %d endpoint task(s)", len(task_flows), len(clusters))
+        for i, cluster in enumerate(clusters):
+            script_content += generate_step_code(i+1, cluster.flow, target_host, cluster)
+            if progress:
+                progress(i + 1, len(clusters))
+        script_content += generate_warmup_code([(i+1, cluster.flow) for i, cluster in enumerate(clusters)])
+    elif replay or parallel:
+        # Replay keeps the recorded order and think times (startedDateTime
+        # deltas); parallel mode fetches each page batch concurrently
+        offsets = replay_offsets(converted_flows)
+        if batches is None:
+            batches = [
+                [(i+1, flow)] for i, flow in enumerate(converted_flows) if not is_authentication_flow(flow)
+            ]
+        schedule = []
+        for page_idx, batch in enumerate(batches, 1):
+            in_page = len(batch) > 1
+            for idx, flow in batch:
+                script_content += generate_step_code(idx, flow, target_host, replay=replay, in_page=in_page)
+            if in_page:
+                script_content += generate_page_code(page_idx, batch, replay)
+            schedule.append((offsets[batch[0][0] - 1], f"page_{page_idx}" if in_page else f"step_{batch[0][0]}"))
+            if progress:
+                progress(page_idx, len(batches))
+        script_content += generate_warmup_code([step for batch in batches for step in batch])
+        if parallel:
+            logger.debug("Grouped requests into %d batch(es) for parallel page loads", len(batches))
+            script_content += generate_parallel_code(options.get('max_connections_per_host', 6))
+        if replay:
+            logger.debug("Replaying %d step(s) in recorded order", len(schedule))
+            script_content += generate_replay_code(schedule, options.get('time_compression', 1.0))
+    else:
+        for i, flow in enumerate(converted_flows):
+            if not is_authentication_flow(flow):
+                print(f"DEBUG: Processing flow {i+1}: {flow.get('method', 'UNKNOWN')} {flow.get('url', 'UNKNOWN')[:50]}...")
                 
-        # Skip browser tasks for load testing - only generate HTTP tasks
-        # if flow.get("frontend_task"):
-        #     code += BROWSER_TEMPLATE.format(idx=i, url=flow["url"], wait_time=2)
+                # Use the generate_step_code function from locust_generator.py
+                task_method = generate_step_code(i+1, flow, target_host)
+                script_content += task_method
+            if progress:
+                progress(i + 1, len(converted_flows))
+        script_content += generate_warmup_code([
+            (i+1, flow) for i, flow in enumerate(converted_flows) if not is_authentication_flow(flow)
+        ])
+    
+    script_content += generate_throughput_code(model)
+    
+    # Add footer with target host information
+    host_info = f"# Target host: {target_host}" if target_host else "# Target host: Will be set via --host parameter"
+    script_content += f'''
 
-    with open(out_path, "w", encoding="utf-8") as f:
-        f.write(code)
-    
-    print(f"SUCCESS Observability-ready Locust script generated at {out_path}")
-    if json_apis_count > 0:
-        print(f"🔧 Enhanced JSON handling applied to {json_apis_count} PUT/POST API(s)")
-        print("   - Using 'json' parameter for proper JSON serialization")
-        print("   - Enhanced response validation for all APIs")
-        print("   - Better error detection and reporting")
-    
-    # Print token management features
-    print("🔐 Token Management Features:")
-    print("   - Automatic token extraction from authentication responses")
-    print("   - Token storage in user context for subsequent requests")
-    print("   - Authorization header injection for protected endpoints")
-    print("   - Permission-based access control (admin, manager, user, public)")
-    print("   - Authentication state tracking per user")
+# Configuration for running the script
+{host_info}
+# Command to run: locust -f {script_filename} --host=<target_host>
+# Web UI: http://localhost:8089
+# Prometheus metrics: http://localhost:8001/metrics
+'''
+    
+    return script_content
+
+def build_arg_parser():
+    """Command line for generate_locust: one flag per GENERATE_OPTIONS entry"""
+    import argparse
+    parser = argparse.ArgumentParser(description="Generate a Locust script from a HAR or YAML flow file")
+    parser.add_argument("input_file", help="HAR (.har, .har.gz, .har.zst) or YAML flow file")
+    parser.add_argument("output_file", help="Locust script to write")
+    parser.add_argument("filters", nargs="?", help="flow_filters preset name")
+    parser.add_argument("--target-host", help="Target host (default: the host of the first request)")
+    for name, (kind, allowed, default) in GENERATE_OPTIONS.items():
+        flag = f"--{name.replace('_', '-')}"
+        if kind is bool:
+            parser.add_argument(flag, dest=name, action=argparse.BooleanOptionalAction, default=None,
+                                help=f"(default: {default})")
+        elif kind is str:
+            parser.add_argument(flag, dest=name, choices=allowed, help=f"(default: {default})")
+        else:
+            parser.add_argument(flag, dest=name, type=kind, help=f"{allowed} (default: {default})")
+    return parser
 
 if __name__ == "__main__":
-    import sys
-    if len(sys.argv) != 3:
-        print("Usage: python locust_generator.py <yaml_file> <output_file>")
-        sys.exit(1)
-    
-    yaml_file = sys.argv[1]
-    output_file = sys.argv[2]
-    generate_locust(yaml_file, output_file)
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+    parser = build_arg_parser()
+    args = vars(parser.parse_args())
+    try:
+        generate_locust(args.pop("input_file"), args.pop("output_file"), args.pop("target_host"), args.pop("filters"), **args)
+    except ValueError as e:
+        parser.error(str(e))
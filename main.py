@@ -1,5 +1,5 @@
 from fastapi import FastAPI, File, UploadFile, HTTPException, Query, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 import os
 import shutil
@@ -11,8 +11,29 @@ from datetime import datetime
 import subprocess
 import threading
 import time
+import asyncio
+import logging
+import uuid
+
+from har_stream import HarFormatError
+from har_converter import iter_flow_events, iter_ndjson
+from flow_cache import FlowCache, copy_and_hash
+from har_storage import HAR_SUFFIXES, UnsupportedCompression, har_codec, har_variants, is_har_filename, open_har
+from blob_store import BlobStore
+from flow_filters import FilterConfigError, FlowFilter, filter_fingerprint, normalize_filter_config
+from locust_generator import generate_locust_script_content, normalize_generate_options
+from har_upload import (
+    PART_MAX_AGE, UploadOffsetMismatch, UploadSessionManager, UploadVerificationError, remove_stale_parts,
+    save_har_upload
+)
+from workers import (
+    CPU_WORKERS, convert_entry_range, convert_har_file, convert_har_job, generate_script_job,
+    run_cpu, run_io, shutdown_pools
+)
+from jobs import COMPLETED, JobManager, JobQueueFull
 
 app = FastAPI(title="HAR File Upload API", version="1.0.0")
+logger = logging.getLogger(__name__)
 
 # Add CORS middleware
 app.add_middleware(
@@ -32,13 +53,56 @@ app.add_middleware(
     allow_headers=["*"],  # Allow all headers
 )
 
-# Create uploads directory if it doesn't exist
+# Uploaded HAR files
 UPLOAD_DIR = Path("uploads")
-UPLOAD_DIR.mkdir(exist_ok=True)
 
-# Create scripts directory if it doesn't exist
+# Optionally recompress plain uploads at rest ("gzip" or "zstd")
+HAR_STORE_COMPRESSION = os.environ.get("HAR_STORE_COMPRESSION") or None
+
+# Single-request uploads are written here before being moved into place
+INCOMING_DIR = UPLOAD_DIR / ".incoming"
+
+# Part files left by crashed uploads are removed at startup once this old (seconds)
+UPLOAD_PART_MAX_AGE = int(os.environ.get("UPLOAD_PART_MAX_AGE", PART_MAX_AGE))
+
+# Buffer request body chunks up to this size before writing a session chunk
+UPLOAD_WRITE_SIZE = 1024 * 1024
+
+# Generated Locust scripts
 SCRIPTS_DIR = Path("scripts")
-SCRIPTS_DIR.mkdir(exist_ok=True)
+
+# Converted flows are cached by HAR content hash (LRU under a size budget)
+CACHE_DIR = Path("cache")
+FLOW_CACHE_MAX_BYTES = int(os.environ.get("FLOW_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+
+# Response bodies moved out of flows by bodies=ref conversions
+BLOB_DIR = Path("blobs")
+
+# Background conversion/generation jobs (bounded queue, results under jobs/)
+JOBS_DIR = Path("jobs")
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", CPU_WORKERS))
+JOB_QUEUE_SIZE = int(os.environ.get("JOB_QUEUE_SIZE", 32))
+
+# Chunked upload sessions, the flow cache, the blob store and the job queue
+# are created by init_state() at startup, not on import: the spawned worker
+# processes re-import the __main__ module when the server runs as
+# ``python main.py``
+upload_sessions = None
+flow_cache = None
+blob_store = None
+job_manager = None
+
+@app.on_event("startup")
+def init_state():
+    """Create the storage directories and the managers that own them."""
+    global upload_sessions, flow_cache, blob_store, job_manager
+    for directory in (UPLOAD_DIR, INCOMING_DIR, SCRIPTS_DIR):
+        directory.mkdir(parents=True, exist_ok=True)
+    # Chunked upload sessions keep their part files here until completed
+    upload_sessions = UploadSessionManager(UPLOAD_DIR / ".partial", UPLOAD_DIR, HAR_STORE_COMPRESSION)
+    flow_cache = FlowCache(CACHE_DIR, FLOW_CACHE_MAX_BYTES)
+    blob_store = BlobStore(BLOB_DIR)
+    job_manager = JobManager(JOBS_DIR, JOB_WORKERS, JOB_QUEUE_SIZE)
 
 # Store running Locust processes
 running_processes = {}
@@ -72,6 +136,11 @@ def find_available_port(start_port=8089):
                 port += 1
         raise Exception(f"No available ports found starting from {start_port}")
 
+def terminate_process(process):
+    """Terminate a process and wait up to 5 seconds for it to exit"""
+    process.terminate()
+    process.wait(timeout=5)
+
 def cleanup_process(process_id):
     """Clean up a process and free its port"""
     if process_id in running_processes:
@@ -95,34 +164,180 @@ def cleanup_process(process_id):
         # Remove from tracking
         del running_processes[process_id]
 
+def resolve_har_path(filename):
+    """
+    Resolve a HAR filename to a file in the uploads directory.
+    
+    Returns:
+        Tuple of (filename, file_path); raises 404 if no matching file exists
+    """
+    # Check if the HAR file exists (with .har extension if not provided)
+    if not is_har_filename(filename):
+        filename = f"{filename}.har"
+    
+    file_path = UPLOAD_DIR / filename
+    
+    # If file doesn't exist, try to find a similar file with different naming convention
+    if not file_path.exists():
+        # Try alternative filename formats
+        alternative_filenames = [
+            filename.replace('_', '.'),  # Convert underscores to dots
+            filename.replace('.', '_'),  # Convert dots to underscores
+            filename.replace('_', '-'),  # Convert underscores to dashes
+            filename.replace('.', '-'),  # Convert dots to dashes
+        ]
+        
+        # Each name may also be stored compressed (.har.gz / .har.zst)
+        for alt_filename in [filename] + alternative_filenames:
+            for alt_path in har_variants(UPLOAD_DIR / alt_filename):
+                if alt_path.exists():
+                    return filename, alt_path
+        
+        # List available files for better error message
+        available_files = sorted(
+            f.name for suffix in HAR_SUFFIXES for f in UPLOAD_DIR.glob(f"*{suffix}")
+        )
+        raise HTTPException(
+            status_code=404,
+            detail=f"HAR file '{filename}' not found in uploads directory. Available files: {available_files}"
+        )
+    
+    return filename, file_path
+
+def check_stream_mode(stream):
+    """Validate the optional ``stream`` query parameter of the convert endpoints."""
+    if stream is not None and stream != "ndjson":
+        raise HTTPException(
+            status_code=400,
+            detail="Unsupported stream mode. Use stream=ndjson or omit the parameter."
+        )
+
+def check_bodies_mode(bodies):
+    """
+    Validate the ``bodies`` conversion mode.
+    
+    Returns:
+        The blob store directory for bodies=ref, otherwise None
+    """
+    if bodies in (None, "inline"):
+        return None
+    if bodies == "ref":
+        return str(BLOB_DIR)
+    raise HTTPException(
+        status_code=400,
+        detail="Unsupported bodies mode. Use bodies=inline (default) or bodies=ref."
+    )
+
+def check_filters(filters):
+    """Validate a filter configuration (object or preset name); returns it normalized."""
+    try:
+        return normalize_filter_config(filters)
+    except FilterConfigError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid filters: {e}")
+
+def conversion_key(digest, blob_dir=None, filters=None):
+    """Flow cache key for a HAR digest under the given conversion options."""
+    variant = []
+    if blob_dir:
+        variant.append("bodies=ref")
+    if filters:
+        variant.append(f"filters={filter_fingerprint(filters)}")
+    return flow_cache.key(digest, "|".join(variant))
+
+def ndjson_response(key, har_path, timestamp, filename, temp_file=False, blob_dir=None, filters=None):
+    """
+    Stream a conversion as NDJSON: metadata first, one flow per line, summary last.
+    
+    Flows come from the flow cache when ``key`` is cached and are written
+    through to it otherwise. The generator is synchronous, so Starlette runs
+    it in its threadpool rather than on the event loop.
+    """
+    def generate():
+        try:
+            with open_har(har_path) as har_stream:
+                events = flow_cache.load(key)
+                if events is None:
+                    body_store = BlobStore(blob_dir) if blob_dir else None
+                    flow_filter = FlowFilter(filters) if filters else None
+                    events = flow_cache.store(key, iter_flow_events(har_stream, body_store, flow_filter))
+                yield from iter_ndjson(events, timestamp, filename)
+        finally:
+            if temp_file:
+                Path(har_path).unlink(missing_ok=True)
+    
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+async def run_conversion(har_path, filename, timestamp, digest, source_size, stream, temp_file=False, bodies=None,
+                         filters=None):
+    """
+    Convert a HAR file without blocking the event loop.
+    
+    The JSON response is built and serialized in the process pool; NDJSON
+    streams are produced in a worker thread. ``filters`` must already be
+    normalized with check_filters().
+    """
+    blob_dir = check_bodies_mode(bodies)
+    key = conversion_key(digest, blob_dir, filters)
+    flow_cache.lookup(key, source_size)
+    if stream:
+        return ndjson_response(key, har_path, timestamp, filename, temp_file, blob_dir, filters)
+    
+    try:
+        body = await run_cpu(
+            convert_har_file, str(har_path), filename, timestamp,
+            str(CACHE_DIR), FLOW_CACHE_MAX_BYTES, key, blob_dir, filters
+        )
+    finally:
+        if temp_file:
+            await run_io(Path(har_path).unlink, missing_ok=True)
+    
+    return Response(content=body, media_type="application/json")
+
+def check_compression(compress):
+    """Validate a compress= parameter; returns the codec to store plain uploads with."""
+    if compress is None:
+        return HAR_STORE_COMPRESSION
+    if compress == "none":
+        return None
+    if compress not in ("gzip", "zstd"):
+        raise HTTPException(
+            status_code=400,
+            detail="Invalid compress value. Supported values: 'gzip', 'zstd', 'none'"
+        )
+    return compress
+
 @app.post("/upload")
-async def upload_har_file(file: UploadFile = File(...)):
+async def upload_har_file(
+    file: UploadFile = File(...),
+    compress: Optional[str] = Query(None, description="Recompress a plain .har at rest: 'gzip', 'zstd' or 'none'")
+):
     """
     Upload a HAR file and save it to the /uploads directory.
     
     Args:
-        file: The HAR file to upload
+        file: The HAR file to upload (.har, .har.gz or .har.zst)
+        compress: Optional at-rest compression for plain uploads (defaults to HAR_STORE_COMPRESSION)
         
     Returns:
         JSON response with upload status and file information
     """
-    # Check if file has .har extension
-    if not file.filename.lower().endswith('.har'):
+    # Check if file has a HAR extension
+    if not is_har_filename(file.filename):
         raise HTTPException(
             status_code=400, 
-            detail="Only HAR files are allowed. Please upload a file with .har extension."
+            detail="Only HAR files are allowed. Please upload a file with .har, .har.gz or .har.zst extension."
         )
+    compression = check_compression(compress)
     
     try:
         # Create file path
         file_path = UPLOAD_DIR / file.filename
         
-        # Save the file
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        # Get file size
-        file_size = file_path.stat().st_size
+        # Save the file in the I/O pool, validating, hashing and indexing it on the way
+        file_path, digest, file_size, index = await run_io(
+            save_har_upload, file.file, file_path, INCOMING_DIR, compression
+        )
+        await run_io(flow_cache.record_upload, file_path, digest)
         
         return JSONResponse(
             status_code=200,
@@ -130,16 +345,203 @@ async def upload_har_file(file: UploadFile = File(...)):
                 "message": "File uploaded successfully",
                 "filename": file.filename,
                 "file_size": file_size,
-                "file_path": str(file_path)
+                "file_path": str(file_path),
+                "stored_size": file_path.stat().st_size,
+                "sha256": digest,
+                "entries": index["entries"]
             }
         )
     
+    except HarFormatError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid HAR file format: {e}"
+        )
+    except UnsupportedCompression as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Error uploading file: {str(e)}"
         )
 
+@app.post("/uploads")
+async def create_upload_session(data: Dict[str, Any]):
+    """
+    Start a chunked, resumable HAR upload.
+    
+    Args:
+        data: JSON data containing filename (required), and optionally the
+            total size in bytes and the expected sha256, both verified on completion
+        
+    Returns:
+        JSON response with the upload_id and the offset to send the first chunk at
+    """
+    filename = Path(data.get('filename') or '').name
+    if not is_har_filename(filename):
+        raise HTTPException(
+            status_code=400, 
+            detail="Only HAR files are allowed. Please upload a file with .har, .har.gz or .har.zst extension."
+        )
+    
+    try:
+        session = await run_io(upload_sessions.create, filename, data.get('size'), data.get('sha256'))
+    except UnsupportedCompression as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return JSONResponse(status_code=201, content=session.to_dict())
+
+@app.get("/uploads/{upload_id}")
+async def get_upload_session(upload_id: str):
+    """Current offset of an upload session; resume by sending the next chunk at this offset."""
+    session = await run_io(upload_sessions.get, upload_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail=f"Upload session '{upload_id}' not found")
+    return session.to_dict()
+
+@app.put("/uploads/{upload_id}")
+async def upload_chunk(
+    upload_id: str,
+    request: Request,
+    offset: int = Query(..., description="Byte offset of this chunk; must equal the session's current offset")
+):
+    """
+    Append the raw request body to an upload session.
+    
+    Each chunk is validated as HAR, hashed and indexed as it is written. If the
+    connection drops, the bytes that arrived are kept: GET the session for the
+    offset to resume from.
+    """
+    session = await run_io(upload_sessions.get, upload_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail=f"Upload session '{upload_id}' not found")
+    if session.busy:
+        raise HTTPException(status_code=409, detail="Another chunk is being written to this upload")
+    
+    session.busy = True
+    try:
+        session.check_offset(offset)
+        buffer = bytearray()
+        async for chunk in request.stream():
+            buffer += chunk
+            if len(buffer) >= UPLOAD_WRITE_SIZE:
+                await write_upload_chunk(session, bytes(buffer))
+                buffer.clear()
+        if buffer:
+            await write_upload_chunk(session, bytes(buffer))
+    
+    except UploadOffsetMismatch as e:
+        raise HTTPException(status_code=409, detail=str(e), headers={"Upload-Offset": str(e.expected)})
+    except HarFormatError as e:
+        # The parser can't continue past invalid data, so the session is over
+        await run_io(upload_sessions.abort, session)
+        raise HTTPException(status_code=400, detail=f"Invalid HAR file format: {e}")
+    finally:
+        session.busy = False
+    
+    return session.to_dict()
+
+async def write_upload_chunk(session, data):
+    if session.expected_size is not None and session.offset + len(data) > session.expected_size:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Chunk extends past the declared upload size of {session.expected_size} bytes"
+        )
+    await run_io(session.write, data)
+
+@app.post("/uploads/{upload_id}/complete")
+async def complete_upload_session(upload_id: str):
+    """
+    Finish an upload: verify it and atomically move it into the uploads directory.
+    
+    Returns:
+        JSON response like /upload, plus the number of indexed entries
+    """
+    session = await run_io(upload_sessions.get, upload_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail=f"Upload session '{upload_id}' not found")
+    if session.busy:
+        raise HTTPException(status_code=409, detail="Another chunk is being written to this upload")
+    
+    # Chunks arriving while the writer is finished get a 409 instead of a closed file
+    session.busy = True
+    try:
+        file_path, digest, file_size, index = await run_io(upload_sessions.complete, session)
+    except UploadVerificationError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HarFormatError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid HAR file format: {e}")
+    finally:
+        session.busy = False
+    
+    await run_io(flow_cache.record_upload, file_path, digest)
+    
+    return {
+        "message": "File uploaded successfully",
+        "filename": session.filename,
+        "file_size": file_size,
+        "file_path": str(file_path),
+        "stored_size": file_path.stat().st_size,
+        "sha256": digest,
+        "entries": index["entries"]
+    }
+
+@app.delete("/uploads/{upload_id}")
+async def abort_upload_session(upload_id: str):
+    """Abandon an upload session and delete its partial data."""
+    session = await run_io(upload_sessions.get, upload_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail=f"Upload session '{upload_id}' not found")
+    if session.busy:
+        raise HTTPException(status_code=409, detail="Another chunk is being written to this upload")
+    await run_io(upload_sessions.abort, session)
+    return {"message": "Upload aborted", "upload_id": upload_id}
+
+@app.get("/flows/{filename}")
+async def get_flow_range(
+    filename: str,
+    start: int = Query(0, ge=0, description="Index of the first entry"),
+    limit: int = Query(100, ge=1, le=1000, description="Number of entries to convert"),
+    bodies: Optional[str] = Query(None, description="Set to 'ref' to store response bodies in the blob store"),
+    filters: Optional[str] = Query(None, description="Name of a filter preset to drop static assets and noise")
+):
+    """
+    Convert a window of entries from an uploaded HAR file.
+    
+    Seeks straight to the requested entries using the byte-offset index
+    recorded at upload time instead of parsing the archive from the start.
+    """
+    blob_dir = check_bodies_mode(bodies)
+    filters = check_filters(filters)
+    filename, har_path = resolve_har_path(filename)
+    try:
+        result = await run_cpu(convert_entry_range, str(har_path), start, start + limit, blob_dir, filters)
+    except HarFormatError:
+        raise HTTPException(
+            status_code=400,
+            detail="Invalid HAR file format. Please ensure the file is a valid JSON HAR file."
+        )
+    return {"filename": filename, "limit": limit, **result}
+
+@app.get("/blobs/{digest}")
+async def get_blob(
+    digest: str,
+    mime_type: Optional[str] = Query(None, description="Content type to serve the body with (the flow's mimeType)")
+):
+    """
+    Fetch a response body stored by a bodies=ref conversion.
+    
+    Args:
+        digest: The 'blob' value of a flow's response_body reference
+        mime_type: Optional content type; defaults to application/octet-stream
+    """
+    if not blob_store.exists(digest):
+        raise HTTPException(status_code=404, detail=f"Blob '{digest}' not found")
+    return FileResponse(
+        blob_store.path(digest),
+        media_type=mime_type or "application/octet-stream",
+        headers={"Cache-Control": "public, max-age=31536000, immutable"}
+    )
+
 @app.get("/")
 async def root():
     """Root endpoint with API information."""
@@ -147,9 +549,16 @@ async def root():
         "message": "HAR File Upload API",
         "version": "1.0.0",
         "endpoints": {
-            "POST /upload": "Upload HAR files",
-            "POST /convert": "Convert HAR files to flow format",
-            "POST /convert-timestamp": "Convert HAR files to flow format using timestamp",
+            "POST /upload": "Upload HAR files (.har, .har.gz, .har.zst; ?compress=gzip|zstd to store compressed)",
+            "POST /uploads": "Start a chunked, resumable HAR upload",
+            "PUT /uploads/{upload_id}?offset=N": "Append a chunk to an upload",
+            "GET /uploads/{upload_id}": "Current offset of an upload (to resume from)",
+            "POST /uploads/{upload_id}/complete": "Verify an upload and move it into uploads/",
+            "DELETE /uploads/{upload_id}": "Abort an upload",
+            "GET /flows/{filename}?start=N&limit=M": "Convert a window of entries using the upload index",
+            "POST /convert": "Convert HAR files to flow format (add ?stream=ndjson to stream flows, ?bodies=ref to externalize response bodies)",
+            "POST /convert-timestamp": "Convert HAR files to flow format using timestamp (add ?stream=ndjson to stream flows, ?bodies=ref to externalize response bodies)",
+            "GET /blobs/{digest}": "Response body referenced by a bodies=ref flow",
             "POST /generate": "Generate Locust script from flow data (supports filename and replace_existing parameters)",
             "GET /generate-examples": "Get usage examples for the generate endpoint",
             "GET /scripts": "List available Locust scripts",
@@ -159,20 +568,33 @@ async def root():
             "GET /stop-all": "Stop all running Locust processes",
             "GET /stop/{process_id}": "Stop specific Locust process by process ID",
             "GET /status": "Get status of all processes",
+            "POST /jobs/convert": "Queue a HAR conversion job (returns a job id immediately)",
+            "POST /jobs/generate": "Queue a Locust script generation job (flows or conversion_job_id)",
+            "GET /jobs": "List jobs",
+            "GET /jobs/{job_id}": "Job status and progress",
+            "GET /jobs/{job_id}/events": "Server-sent events with job progress",
+            "GET /jobs/{job_id}/result": "Result of a completed job",
             "GET /": "API information",
             "GET /health": "Health check"
         }
     }
 
 @app.post("/convert")
-async def convert_har_to_flow(request: Request):
+async def convert_har_to_flow(
+    request: Request,
+    stream: Optional[str] = Query(None, description="Set to 'ndjson' to stream one flow per line"),
+    bodies: Optional[str] = Query(None, description="Set to 'ref' to store response bodies in the blob store")
+):
     """
     Convert a HAR file to flow format.
-    Supports both file upload and JSON data with timestamp.
+    Supports both file upload and JSON data with timestamp. An optional
+    'filters' field (form field or JSON member) drops static assets and noise.
     
     Returns:
-        JSON response with converted flow data
+        JSON response with converted flow data, or an NDJSON stream when stream=ndjson
     """
+    check_stream_mode(stream)
+    check_bodies_mode(bodies)
     content_type = request.headers.get("content-type", "")
     
     if "multipart/form-data" in content_type:
@@ -186,24 +608,40 @@ async def convert_har_to_flow(request: Request):
                 detail="No file provided"
             )
         
-        if not file.filename.lower().endswith('.har'):
+        if not is_har_filename(file.filename):
             raise HTTPException(
                 status_code=400, 
-                detail="Only HAR files are allowed. Please upload a file with .har extension."
+                detail="Only HAR files are allowed. Please upload a file with .har, .har.gz or .har.zst extension."
             )
         
+        # Spool the upload to a named file (hashing it on the way) so the
+        # conversion can run in the process pool; the suffix keeps it readable
+        # if it is compressed
+        file.file.seek(0)
+        codec = har_codec(file.filename)
+        har_path = CACHE_DIR / f"upload-{uuid.uuid4().hex}{Path(file.filename).suffix.lower()}"
         try:
-            # Read the HAR file content
-            content = await file.read()
-            har_data = json.loads(content.decode('utf-8'))
-            filename = file.filename
-            timestamp = datetime.now().isoformat()
-            
-        except json.JSONDecodeError:
-            raise HTTPException(
-                status_code=400,
-                detail="Invalid HAR file format. Please ensure the file is a valid JSON HAR file."
-            )
+            digest, source_size = await run_io(copy_and_hash, file.file, har_path, codec)
+        except (HarFormatError, UnsupportedCompression) as e:
+            await run_io(har_path.unlink, missing_ok=True)
+            raise HTTPException(status_code=400, detail=f"Invalid HAR file format: {e}")
+        temp_file = True
+        filename = file.filename
+        timestamp = datetime.now().isoformat()
+        
+        # Form fields are strings: a preset name or a JSON object
+        filters = form.get("filters")
+        if filters and filters.lstrip().startswith("{"):
+            try:
+                filters = json.loads(filters)
+            except json.JSONDecodeError:
+                await run_io(har_path.unlink, missing_ok=True)
+                raise HTTPException(status_code=400, detail="Invalid filters: not valid JSON")
+        try:
+            filters = check_filters(filters)
+        except HTTPException:
+            await run_io(har_path.unlink, missing_ok=True)
+            raise
     
     elif "application/json" in content_type:
         # JSON data mode
@@ -224,47 +662,11 @@ async def convert_har_to_flow(request: Request):
                 detail="Timestamp is required in the request body"
             )
         
-        # Check if the HAR file exists (with .har extension if not provided)
-        if not filename.lower().endswith('.har'):
-            filename = f"{filename}.har"
-        
-        file_path = UPLOAD_DIR / filename
-        
-        # If file doesn't exist, try to find a similar file with different naming convention
-        if not file_path.exists():
-            # Try alternative filename formats
-            alternative_filenames = [
-                filename.replace('_', '.'),  # Convert underscores to dots
-                filename.replace('.', '_'),  # Convert dots to underscores
-                filename.replace('_', '-'),  # Convert underscores to dashes
-                filename.replace('.', '-'),  # Convert dots to dashes
-            ]
-            
-            found_file = None
-            for alt_filename in alternative_filenames:
-                alt_path = UPLOAD_DIR / alt_filename
-                if alt_path.exists():
-                    found_file = alt_filename
-                    file_path = alt_path
-                    break
-            
-            if not found_file:
-                # List available files for better error message
-                available_files = [f.name for f in UPLOAD_DIR.glob("*.har")]
-                raise HTTPException(
-                    status_code=404,
-                    detail=f"HAR file '{filename}' not found in uploads directory. Available files: {available_files}"
-                )
-        
-        try:
-            # Read the HAR file content
-            with open(file_path, 'r', encoding='utf-8') as f:
-                har_data = json.load(f)
-        except json.JSONDecodeError:
-            raise HTTPException(
-                status_code=400,
-                detail="Invalid HAR file format. Please ensure the file is a valid JSON HAR file."
-            )
+        filters = check_filters(data.get('filters'))
+        filename, har_path = resolve_har_path(filename)
+        digest = await run_io(flow_cache.digest_for, har_path)
+        source_size = har_path.stat().st_size
+        temp_file = False
     
     else:
         raise HTTPException(
@@ -273,77 +675,14 @@ async def convert_har_to_flow(request: Request):
         )
     
     try:
-        # Extract basic information from HAR
-        log = har_data.get('log', {})
-        entries = log.get('entries', [])
-        print(f"DEBUG: Found {len(entries)} entries in HAR file")
-        
-        # Convert HAR entries to flow format
-        flows = []
-        for i, entry in enumerate(entries):
-            request = entry.get('request', {})
-            response = entry.get('response', {})
-            
-            if i < 3:  # Debug first 3 entries
-                print(f"DEBUG: Entry {i}: method={request.get('method')}, url={request.get('url', '')[:50]}...")
-            
-            # Create a flow entry with better data preservation
-            # Extract request body properly from postData
-            request_body = None
-            post_data = request.get('postData', {})
-            if post_data:
-                if isinstance(post_data, dict):
-                    # Extract text content from postData
-                    request_body = post_data.get('text', '')
-                else:
-                    request_body = str(post_data)
-            
-            flow_entry = {
-                "id": f"flow_{i+1}",
-                "name": f"Request {i+1}",
-                "method": request.get('method', 'GET'),
-                "url": request.get('url', ''),
-                "status_code": response.get('status', 200),
-                "response_time": entry.get('time', 0),
-                "request_headers": request.get('headers', []),
-                "response_headers": response.get('headers', []),
-                "request_body": request_body,  # Now contains the actual body text
-                "response_body": response.get('content', {}),
-                "timestamp": entry.get('startedDateTime', ''),
-                "flow_type": "http_request"
-            }
-            flows.append(flow_entry)
-        
-        # Create the flow structure
-        flow_data = {
-            "metadata": {
-                "version": log.get('version', '1.2'),
-                "creator": log.get('creator', {}),
-                "browser": log.get('browser', {}),
-                "pages": log.get('pages', []),
-                "total_entries": len(entries),
-                "converted_at": timestamp,
-                "requested_at": timestamp
-            },
-            "flows": flows,
-            "summary": {
-                "total_requests": len(flows),
-                "unique_domains": len(set(flow['url'].split('/')[2] if '://' in flow['url'] else '' for flow in flows)),
-                "methods": list(set(flow['method'] for flow in flows)),
-                "status_codes": list(set(flow['status_code'] for flow in flows))
-            }
-        }
-        
-        return JSONResponse(
-            status_code=200,
-            content={
-                "message": "HAR file converted to flow successfully",
-                "filename": filename,
-                "timestamp": timestamp,
-                "flow_data": flow_data
-            }
-        )
+        # Walk log.entries incrementally instead of materializing the archive
+        return await run_conversion(har_path, filename, timestamp, digest, source_size, stream, temp_file, bodies, filters)
     
+    except HarFormatError:
+        raise HTTPException(
+            status_code=400,
+            detail="Invalid HAR file format. Please ensure the file is a valid JSON HAR file."
+        )
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -351,16 +690,24 @@ async def convert_har_to_flow(request: Request):
         )
 
 @app.post("/convert-timestamp")
-async def convert_with_timestamp(data: Dict[str, Any]):
+async def convert_with_timestamp(
+    data: Dict[str, Any],
+    stream: Optional[str] = Query(None, description="Set to 'ndjson' to stream one flow per line"),
+    bodies: Optional[str] = Query(None, description="Set to 'ref' to store response bodies in the blob store")
+):
     """
     Convert HAR file to flow format using a timestamp parameter.
     
     Args:
-        data: JSON data containing timestamp and optional filename
+        data: JSON data containing timestamp and optional filename and filters
+        stream: Optional streaming mode ('ndjson')
+        bodies: Optional response body mode ('inline' or 'ref')
         
     Returns:
-        JSON response with converted flow data
+        JSON response with converted flow data, or an NDJSON stream when stream=ndjson
     """
+    check_stream_mode(stream)
+    check_bodies_mode(bodies)
     try:
         timestamp = data.get('timestamp')
         filename = data.get('filename', 'recording.har')
@@ -371,110 +718,19 @@ async def convert_with_timestamp(data: Dict[str, Any]):
                 detail="Timestamp is required in the request body"
             )
         
-        # Check if the HAR file exists (with .har extension if not provided)
-        if not filename.lower().endswith('.har'):
-            filename = f"{filename}.har"
-        
-        file_path = UPLOAD_DIR / filename
-        
-        # If file doesn't exist, try to find a similar file with different naming convention
-        if not file_path.exists():
-            # Try alternative filename formats
-            alternative_filenames = [
-                filename.replace('_', '.'),  # Convert underscores to dots
-                filename.replace('.', '_'),  # Convert dots to underscores
-                filename.replace('_', '-'),  # Convert underscores to dashes
-                filename.replace('.', '-'),  # Convert dots to dashes
-            ]
-            
-            found_file = None
-            for alt_filename in alternative_filenames:
-                alt_path = UPLOAD_DIR / alt_filename
-                if alt_path.exists():
-                    found_file = alt_filename
-                    file_path = alt_path
-                    break
-            
-            if not found_file:
-                # List available files for better error message
-                available_files = [f.name for f in UPLOAD_DIR.glob("*.har")]
-                raise HTTPException(
-                    status_code=404,
-                    detail=f"HAR file '{filename}' not found in uploads directory. Available files: {available_files}"
-                )
+        filters = check_filters(data.get('filters'))
+        filename, file_path = resolve_har_path(filename)
+        digest = await run_io(flow_cache.digest_for, file_path)
+        source_size = file_path.stat().st_size
         
-        # Read the HAR file content
-        with open(file_path, 'r', encoding='utf-8') as f:
-            har_data = json.load(f)
-        
-        # Extract basic information from HAR
-        log = har_data.get('log', {})
-        entries = log.get('entries', [])
-        
-        # Convert HAR entries to flow format
-        flows = []
-        for i, entry in enumerate(entries):
-            request = entry.get('request', {})
-            response = entry.get('response', {})
-            
-            # Create a flow entry with better data preservation
-            # Extract request body properly from postData
-            request_body = None
-            post_data = request.get('postData', {})
-            if post_data:
-                if isinstance(post_data, dict):
-                    # Extract text content from postData
-                    request_body = post_data.get('text', '')
-                else:
-                    request_body = str(post_data)
-            
-            flow_entry = {
-                "id": f"flow_{i+1}",
-                "name": f"Request {i+1}",
-                "method": request.get('method', 'GET'),
-                "url": request.get('url', ''),
-                "status_code": response.get('status', 200),
-                "response_time": entry.get('time', 0),
-                "request_headers": request.get('headers', []),
-                "response_headers": response.get('headers', []),
-                "request_body": request_body,  # Now contains the actual body text
-                "response_body": response.get('content', {}),
-                "timestamp": entry.get('startedDateTime', ''),
-                "flow_type": "http_request"
-            }
-            flows.append(flow_entry)
-        
-        # Create the flow structure
-        flow_data = {
-            "metadata": {
-                "version": log.get('version', '1.2'),
-                "creator": log.get('creator', {}),
-                "browser": log.get('browser', {}),
-                "pages": log.get('pages', []),
-                "total_entries": len(entries),
-                "converted_at": timestamp,
-                "requested_at": timestamp
-            },
-            "flows": flows,
-            "summary": {
-                "total_requests": len(flows),
-                "unique_domains": len(set(flow['url'].split('/')[2] if '://' in flow['url'] else '' for flow in flows)),
-                "methods": list(set(flow['method'] for flow in flows)),
-                "status_codes": list(set(flow['status_code'] for flow in flows))
-            }
-        }
-        
-        return JSONResponse(
-            status_code=200,
-            content={
-                "message": "HAR file converted to flow successfully",
-                "filename": filename,
-                "timestamp": timestamp,
-                "flow_data": flow_data
-            }
+        # Walk log.entries incrementally instead of materializing the archive
+        return await run_conversion(
+            file_path, filename, timestamp, digest, source_size, stream, bodies=bodies, filters=filters
         )
     
-    except json.JSONDecodeError:
+    except HTTPException:
+        raise
+    except HarFormatError:
         raise HTTPException(
             status_code=400,
             detail="Invalid HAR file format. Please ensure the file is a valid JSON HAR file."
@@ -485,6 +741,40 @@ async def convert_with_timestamp(data: Dict[str, Any]):
             detail=f"Error converting HAR file: {str(e)}"
         )
 
+def check_generate_options(data):
+    """Validate script generation switches from a /generate or /jobs/generate body (see GENERATE_OPTIONS)."""
+    try:
+        return normalize_generate_options(data)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def resolve_script_path(custom_filename, replace_existing):
+    """Pick the script filename and refuse to overwrite unless asked to."""
+    # Determine filename
+    if custom_filename:
+        # Use provided filename + .py extension
+        script_filename = f"{custom_filename}.py"
+    else:
+        # Generate timestamp for unique filename (fallback)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        script_filename = f"locust_script_{timestamp}.py"
+    
+    script_path = SCRIPTS_DIR / script_filename
+    
+    # Check if file exists and handle replacement
+    if script_path.exists():
+        if replace_existing:
+            print(f"INFO: Replacing existing file: {script_filename}")
+        else:
+            raise HTTPException(
+                status_code=409,
+                detail=f"File '{script_filename}' already exists. Set 'replace_existing': true to overwrite."
+            )
+    else:
+        print(f"INFO: Creating new file: {script_filename}")
+    
+    return script_filename, script_path
+
 @app.post("/generate")
 async def generate_locust_script(flow_data: Dict[str, Any]):
     """
@@ -497,10 +787,20 @@ async def generate_locust_script(flow_data: Dict[str, Any]):
         - replace_existing: Whether to replace existing files (optional, defaults to false)
         - target_host: Target host URL for the script (optional, will be extracted from flows if not provided)
         - metadata: Additional metadata (optional)
+        - filters: Filter configuration or preset name to drop static assets and noise (optional)
+        - dedupe: Merge requests that differ only by IDs into weighted tasks (optional, default true)
+        - mode: 'replay' to keep recorded order and think times (optional, default 'random')
+        - time_compression: Replay speed-up factor (optional, default 1.0)
+        - parallel: Fetch each page's requests concurrently (optional, default false)
+        - max_connections_per_host: Concurrency cap for parallel page loads (optional, default 6)
+        - user_class: 'FastHttpUser' for a geventhttpclient-based script (optional, default 'HttpUser')
+        - target_rps: Total requests per second to pace users for (optional, see GENERATE_OPTIONS in locust_generator.py)
         
     Returns:
         JSON response with generated script information
     """
+    filters = check_filters(flow_data.get('filters'))
+    options = check_generate_options(flow_data)
     try:
         # Extract flows from the input data
         flows = flow_data.get('flows', [])
@@ -520,35 +820,16 @@ async def generate_locust_script(flow_data: Dict[str, Any]):
                 detail="No flows found in the provided data. Please ensure 'flows' array is present."
             )
         
-        # Determine filename
-        if custom_filename:
-            # Use provided filename + .py extension
-            script_filename = f"{custom_filename}.py"
-        else:
-            # Generate timestamp for unique filename (fallback)
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            script_filename = f"locust_script_{timestamp}.py"
-        
-        script_path = SCRIPTS_DIR / script_filename
+        script_filename, script_path = resolve_script_path(custom_filename, replace_existing)
         
-        # Check if file exists and handle replacement
-        if script_path.exists():
-            if replace_existing:
-                print(f"INFO: Replacing existing file: {script_filename}")
-            else:
-                raise HTTPException(
-                    status_code=409,
-                    detail=f"File '{script_filename}' already exists. Set 'replace_existing': true to overwrite."
-                )
-        else:
-            print(f"INFO: Creating new file: {script_filename}")
-        
-        # Generate Locust script content
-        locust_script = generate_locust_script_content(flows, flow_data.get('metadata', {}), script_filename, target_host)
+        # Generate Locust script content in the process pool
+        locust_script = await run_cpu(
+            generate_locust_script_content, flows, flow_data.get('metadata', {}), script_filename, target_host,
+            filters=filters, options=options, blob_dir=str(BLOB_DIR)
+        )
         
         # Write script to file
-        with open(script_path, 'w', encoding='utf-8') as f:
-            f.write(locust_script)
+        await run_io(script_path.write_text, locust_script, encoding='utf-8')
         
         # Get file size
         file_size = script_path.stat().st_size
@@ -575,103 +856,152 @@ async def generate_locust_script(flow_data: Dict[str, Any]):
             detail=f"Error generating Locust script: {str(e)}"
         )
 
-def generate_locust_script_content(flows: list, metadata: dict, script_filename: str, target_host: str = None) -> str:
-    """Generate Locust script content from flows using the improved generator."""
-    
-    # Extract target host from flows if not provided
-    if not target_host and flows:
-        # Try to extract host from the first flow's URL
-        first_flow = flows[0] if flows else {}
-        first_url = first_flow.get('url', '')
-        if '://' in first_url:
-            # Extract host from URL (e.g., "https://example.com/path" -> "https://example.com")
-            target_host = first_url.split('://')[0] + '://' + first_url.split('://')[1].split('/')[0]
-            print(f"DEBUG: Extracted target host from flows: {target_host}")
+def job_response(job, status_code=200):
+    return JSONResponse(status_code=status_code, content=job.to_dict())
+
+def get_job_or_404(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found")
+    return job
+
+def submit_job(kind, fn, *args, **kwargs):
+    try:
+        return job_manager.submit(kind, fn, *args, **kwargs)
+    except JobQueueFull as e:
+        raise HTTPException(
+            status_code=429,
+            detail=f"{e}. Retry later.",
+            headers={"Retry-After": "5"}
+        )
+
+@app.post("/jobs/convert")
+async def submit_convert_job(data: Dict[str, Any]):
+    """
+    Queue a HAR to flow conversion and return its job id immediately.
     
-    # Convert flows to the format expected by the improved generator
-    converted_flows = []
-    for i, flow in enumerate(flows):
-        # Check if flow is a dictionary, if not skip it
-        if not isinstance(flow, dict):
-            print(f"WARNING: Skipping non-dict flow: {type(flow)} - {flow}")
-            continue
-        
-        # Convert headers from list format to dict format
-        headers_dict = {}
-        for header in flow.get('request_headers', []):
-            if isinstance(header, dict) and 'name' in header and 'value' in header:
-                headers_dict[header['name']] = header['value']
-        
-        # Convert request body - handle both dict and string formats
-        body_data = flow.get('request_body', {})
-        if isinstance(body_data, dict) and body_data:
-            # If it's a dict, convert to JSON string
-            body_str = json.dumps(body_data)
-        elif isinstance(body_data, str) and body_data:
-            # If it's already a string, use it as-is
-            body_str = body_data
-        else:
-            body_str = None
+    Args:
+        data: JSON data containing filename (optional, defaults to recording.har),
+            timestamp (optional, defaults to now), bodies (optional, 'inline' or 'ref')
+            and filters (optional)
         
-        # Create converted flow
-        converted_flow = {
-            "method": flow.get('method', 'GET'),
-            "url": flow.get('url', ''),
-            "headers": headers_dict,
-            "body": body_str,
-            "set_context": [],  # No context setting for now
-            "use_context": []   # No context usage for now
-        }
-        converted_flows.append(converted_flow)
+    Returns:
+        202 with the job record; poll /jobs/{job_id} or subscribe to
+        /jobs/{job_id}/events, then fetch /jobs/{job_id}/result
+    """
+    filename = data.get('filename', 'recording.har')
+    timestamp = data.get('timestamp') or datetime.now().isoformat()
+    blob_dir = check_bodies_mode(data.get('bodies'))
+    filters = check_filters(data.get('filters'))
     
-    # Use the improved template from locust_generator.py
-    from locust_generator import TEMPLATE_HEADER, generate_step_code, is_authentication_flow, generate_authentication_code, requires_permissions, get_permission_level
+    filename, har_path = resolve_har_path(filename)
+    digest = await run_io(flow_cache.digest_for, har_path)
+    key = conversion_key(digest, blob_dir, filters)
+    flow_cache.lookup(key, har_path.stat().st_size)
     
-    # Generate script using the improved template
-    script_content = f'''
-"""
-Generated Locust script from HAR file
-Generated at: {datetime.now().isoformat()}
-Total requests: {len(converted_flows)}
-"""
-
-{TEMPLATE_HEADER}
-'''
+    job = submit_job(
+        "convert", convert_har_job,
+        str(har_path), filename, timestamp, str(CACHE_DIR), FLOW_CACHE_MAX_BYTES, key, blob_dir, filters,
+        params={
+            "filename": filename,
+            "timestamp": timestamp,
+            "bodies": data.get('bodies') or "inline",
+            "filters": filters
+        },
+        result_suffix=".json"
+    )
+    return job_response(job, 202)
+
+@app.post("/jobs/generate")
+async def submit_generate_job(data: Dict[str, Any]):
+    """
+    Queue Locust script generation and return its job id immediately.
     
-    # Identify authentication flows
-    auth_flows = []
-    for i, flow in enumerate(converted_flows):
-        if is_authentication_flow(flow):
-            auth_flows.append((i+1, flow))
+    Args:
+        data: Same fields as /generate; instead of 'flows' a
+            'conversion_job_id' of a completed conversion job can be given
+        
+    Returns:
+        202 with the job record
+    """
+    flows = data.get('flows')
+    conversion_job_id = data.get('conversion_job_id')
+    conversion_result = None
+    
+    if conversion_job_id:
+        conversion_job = get_job_or_404(conversion_job_id)
+        if conversion_job.kind != "convert" or conversion_job.status != COMPLETED:
+            raise HTTPException(
+                status_code=409,
+                detail=f"Job '{conversion_job_id}' is not a completed conversion job"
+            )
+        flows = None
+        conversion_result = str(conversion_job.result_path)
+    elif not flows:
+        raise HTTPException(
+            status_code=400,
+            detail="No flows found in the provided data. Please ensure 'flows' array or 'conversion_job_id' is present."
+        )
     
-    # Generate authentication code if found
-    if auth_flows:
-        print(f"DEBUG: Found {len(auth_flows)} authentication flow(s)")
-        auth_code = generate_authentication_code(auth_flows, target_host)
-        script_content += auth_code
+    filters = check_filters(data.get('filters'))
+    options = check_generate_options(data)
+    script_filename, script_path = resolve_script_path(data.get('filename'), data.get('replace_existing', False))
+    target_host = data.get('target_host')
     
-    # Generate task methods for each flow using the improved template
-    print(f"DEBUG: Generating tasks for {len(converted_flows)} converted flows")
-    for i, flow in enumerate(converted_flows):
-        if not is_authentication_flow(flow):
-            print(f"DEBUG: Processing flow {i+1}: {flow.get('method', 'UNKNOWN')} {flow.get('url', 'UNKNOWN')[:50]}...")
-            
-            # Use the generate_step_code function from locust_generator.py
-            task_method = generate_step_code(i+1, flow, target_host)
-            script_content += task_method
+    job = submit_job(
+        "generate", generate_script_job,
+        flows, conversion_result, data.get('metadata', {}),
+        script_filename, target_host, filters, options, str(BLOB_DIR), str(script_path),
+        params={
+            "filename": script_filename,
+            "conversion_job_id": conversion_job_id,
+            "total_flows": len(flows) if flows is not None else None,
+            "target_host": target_host,
+            "options": options
+        }
+    )
+    return job_response(job, 202)
+
+@app.get("/jobs")
+async def list_jobs():
+    """List known jobs, newest first."""
+    return {"jobs": job_manager.list(), **job_manager.stats()}
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Status and progress of a job."""
+    return job_response(get_job_or_404(job_id))
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """Server-sent events with the job record on every progress or status change."""
+    get_job_or_404(job_id)
     
-    # Add footer with target host information
-    host_info = f"# Target host: {target_host}" if target_host else "# Target host: Will be set via --host parameter"
-    script_content += f'''
-
-# Configuration for running the script
-{host_info}
-# Command to run: locust -f {script_filename} --host=<target_host>
-# Web UI: http://localhost:8089
-# Prometheus metrics: http://localhost:8001/metrics
-'''
+    async def events():
+        async for state in job_manager.subscribe(job_id):
+            yield f"event: {state['status']}\ndata: {json.dumps(state)}\n\n"
     
-    return script_content
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"}
+    )
+
+@app.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str):
+    """
+    Result of a completed job: the /convert response body for conversion
+    jobs, the script information for generation jobs.
+    """
+    job = get_job_or_404(job_id)
+    if job.status != COMPLETED:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Job '{job_id}' is {job.status}" + (f": {job.error}" if job.error else "")
+        )
+    if job.result_path is not None:
+        return FileResponse(job.result_path, media_type="application/json")
+    return job.result
 
 @app.get("/scripts")
 async def list_scripts():
@@ -738,7 +1068,7 @@ async def run_locust_script_internal(script: Optional[str], host: str, port: int
         
         # Check if Locust is installed
         try:
-            subprocess.run(["python", "-m", "locust", "--version"], capture_output=True, check=True)
+            await run_io(subprocess.run, ["python", "-m", "locust", "--version"], capture_output=True, check=True)
         except (subprocess.CalledProcessError, FileNotFoundError):
             raise HTTPException(
                 status_code=500,
@@ -770,7 +1100,8 @@ async def run_locust_script_internal(script: Optional[str], host: str, port: int
             cmd.extend(["--run-time", "30s"])
         
         # Start Locust process
-        process = subprocess.Popen(
+        process = await run_io(
+            subprocess.Popen,
             cmd,
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
@@ -791,7 +1122,7 @@ async def run_locust_script_internal(script: Optional[str], host: str, port: int
         }
         
         # Wait a moment for Locust to start
-        time.sleep(2)
+        await asyncio.sleep(2)
         
         # Check if process is still running
         if process.poll() is None:
@@ -818,7 +1149,7 @@ async def run_locust_script_internal(script: Optional[str], host: str, port: int
             )
         else:
             # Process failed to start
-            stdout, stderr = process.communicate()
+            stdout, stderr = await run_io(process.communicate)
             raise HTTPException(
                 status_code=500,
                 detail=f"Failed to start Locust: {stderr or stdout}"
@@ -907,7 +1238,7 @@ async def stop_all_locust_processes():
         
         for process_id in list(running_processes.keys()):
             try:
-                cleanup_process(process_id)
+                await run_io(cleanup_process, process_id)
                 stopped_processes.append(process_id)
             except Exception as e:
                 failed_processes.append({
@@ -952,8 +1283,7 @@ async def stop_locust_by_script(script: Optional[str] = Query(None, description=
                     process = process_info["process"]
                     if process.poll() is None:  # Process is still running
                         try:
-                            process.terminate()
-                            process.wait(timeout=5)
+                            await run_io(terminate_process, process)
                             process_info["status"] = "stopped"
                             process_info["stopped_at"] = datetime.now().isoformat()
                             stopped_processes.append(process_id)
@@ -1009,7 +1339,7 @@ async def stop_locust_process(process_id: str):
         process = process_info["process"]
         
         # Use the cleanup function for proper process termination
-        cleanup_process(process_id)
+        await run_io(cleanup_process, process_id)
         
         return JSONResponse(
             status_code=200,
@@ -1191,8 +1521,24 @@ async def health_check():
     return {
         "status": "healthy",
         "active_processes": len(running_processes),
-        "cleaned_dead_processes": cleaned
+        "cleaned_dead_processes": cleaned,
+        "flow_cache": await run_io(flow_cache.stats),
+        "jobs": job_manager.stats()
     }
 
+@app.on_event("startup")
+async def remove_orphaned_uploads():
+    """Delete part files of uploads interrupted by a previous server run."""
+    removed = await run_io(upload_sessions.cleanup, UPLOAD_PART_MAX_AGE)
+    removed += await run_io(remove_stale_parts, INCOMING_DIR, UPLOAD_PART_MAX_AGE)
+    if removed:
+        logger.info("Removed %d orphaned upload part file(s)", removed)
+
+@app.on_event("shutdown")
+async def shutdown_worker_pools():
+    """Stop the job workers and worker pools when the server shuts down."""
+    await job_manager.shutdown()
+    shutdown_pools()
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=9001)
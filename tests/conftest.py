@@ -0,0 +1,36 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+
+@pytest.fixture
+def recorded_flows():
+    """A login, a page load of three overlapping item requests, then an orders request."""
+    flows = [{
+        "method": "POST",
+        "url": "http://shop.test/api/auth/login",
+        "request_headers": [{"name": "Content-Type", "value": "application/json"}],
+        "request_body": {"user": "alice", "password": "secret"},
+        "timestamp": "2024-01-01T00:00:00.000Z",
+    }]
+    for i in range(3):
+        flows.append({
+            "method": "GET",
+            "url": f"http://shop.test/api/items/{i + 1}",
+            "request_headers": [],
+            "response_time": 40,
+            "timestamp": f"2024-01-01T00:00:01.0{i}0Z",
+            "pageref": "page_1",
+        })
+    flows.append({
+        "method": "GET",
+        "url": "http://shop.test/api/orders",
+        "request_headers": [],
+        "response_time": 120,
+        "timestamp": "2024-01-01T00:00:05.000Z",
+    })
+    return flows
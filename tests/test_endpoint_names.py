@@ -0,0 +1,43 @@
+import logging
+
+from endpoint_names import OTHER_ENDPOINT, EndpointNames, clean_endpoint_name
+
+
+def test_clean_endpoint_name():
+    assert clean_endpoint_name("/Wizer/Home/Index.dot.html?cacheId=1759239051683") == "/Wizer/Home/Index"
+    assert clean_endpoint_name("/api/items?page=2") == "/api/items"
+    assert clean_endpoint_name("/api/items&cacheId=42") == "/api/items"
+    assert clean_endpoint_name("") == "unknown"
+    assert clean_endpoint_name(None) == "unknown"
+
+
+def test_names_are_cached_by_raw_name():
+    names = EndpointNames(cache_size=2)
+    assert names.normalize("/api/items?page=1") == "/api/items"
+    assert names.normalize("/api/items?page=1") == "/api/items"
+    assert names.normalize("/api/items?page=2") == "/api/items"
+    info = names.normalize.cache_info()
+    assert (info.hits, info.misses, info.currsize) == (1, 2, 2)
+    assert names.labels == {"/api/items"}
+
+
+def test_labels_past_the_cap_are_other(caplog):
+    names = EndpointNames(max_endpoints=2)
+    with caplog.at_level(logging.WARNING, logger="endpoint_names"):
+        labels = [names.normalize(f"/api/{i}") for i in range(4)]
+        # Known labels keep their name after the cap is reached
+        assert names.normalize("/api/0?retry=1") == "/api/0"
+    assert labels == ["/api/0", "/api/1", OTHER_ENDPOINT, OTHER_ENDPOINT]
+    assert names.overflowed == 2
+    # Warned once, when the first label overflowed
+    assert [record.getMessage() for record in caplog.records] == [
+        f"More than 2 endpoint labels; counting new ones as '{OTHER_ENDPOINT}'"
+    ]
+
+
+def test_evicted_names_keep_their_label():
+    names = EndpointNames(max_endpoints=1, cache_size=1)
+    assert names.normalize("/api/items?page=1") == "/api/items"
+    names.normalize("/api/orders")
+    # Dropped from the LRU cache, but still a known label
+    assert names.normalize("/api/items?page=1") == "/api/items"
@@ -0,0 +1,134 @@
+import io
+import marshal
+import os
+import struct
+import subprocess
+import sys
+import time
+import zlib
+
+import pytest
+
+import flow_cache
+from flow_cache import CACHE_SUFFIX, LOCK_NAME, MAGIC, FlowCache, hash_stream
+from har_converter import FILTERED, FLOW
+
+FLOWS = [{"method": "GET", "url": f"http://shop.test/api/items/{i}", "status": 200} for i in range(3)]
+
+
+def events(flows=FLOWS, filtered=None):
+    yield ("field", "version", "1.2")
+    for flow in flows:
+        yield (FLOW, flow)
+    if filtered is not None:
+        yield (FILTERED, filtered)
+
+
+def store(cache, key, *args):
+    # store() writes the entry as its events are consumed
+    return list(cache.store(key, events(*args)))
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return FlowCache(tmp_path / "cache", 1024 * 1024)
+
+
+def test_store_and_load_round_trip(cache):
+    stored = store(cache, "k", FLOWS, {"static": 2})
+    assert stored == list(events(FLOWS, {"static": 2}))
+    assert list(cache.load("k")) == stored
+    assert cache.load("missing") is None
+
+
+def test_frame_format(cache):
+    store(cache, "k")
+    data = (cache.cache_dir / f"k{CACHE_SUFFIX}").read_bytes()
+    header_len, magic = struct.unpack("<I4s", data[-8:])
+    assert magic == MAGIC
+    header = marshal.loads(zlib.decompress(data[-8 - header_len:-8]))
+    assert header == {"fields": {"version": "1.2"}, "count": 3, "filtered": None}
+    # Length-prefixed marshal frames in one zlib stream
+    frames = io.BytesIO(zlib.decompress(data[:-8 - header_len]))
+    flows = []
+    while size := frames.read(4):
+        flows.append(marshal.loads(frames.read(struct.unpack("<I", size)[0])))
+    assert flows == FLOWS
+
+
+def test_abandoned_store_leaves_nothing(cache):
+    stream = cache.store("k", events())
+    next(stream)
+    stream.close()
+    assert list(cache.cache_dir.iterdir()) == []
+    assert cache.load("k") is None
+
+
+def test_corrupt_entry_is_dropped(cache):
+    path = cache.cache_dir / f"k{CACHE_SUFFIX}"
+    path.write_bytes(b"not a cache file")
+    assert cache.load("k") is None
+    assert not path.exists()
+
+
+def test_key_covers_converter_version_and_variant(cache, monkeypatch):
+    key = cache.key("abc")
+    assert cache.key("abc") == key
+    assert cache.key("abc", "filters") != key
+    assert cache.key("abd") != key
+    monkeypatch.setattr(flow_cache, "CONVERTER_VERSION", "next")
+    assert cache.key("abc") != key
+
+
+def test_lookup_counts_hits_and_misses(cache):
+    store(cache, "k")
+    assert cache.lookup("k", 500)
+    assert not cache.lookup("missing")
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["bytes_saved"], stats["entries"]) == (1, 1, 500, 1)
+
+
+def test_lru_eviction(cache):
+    now = time.time()
+    for age, key in ((300, "old"), (200, "used"), (100, "recent")):
+        store(cache, key, FLOWS * 50)
+        os.utime(cache.cache_dir / f"{key}{CACHE_SUFFIX}", (now - age, now - age))
+    # A hit makes "used" the most recently used entry
+    assert cache.lookup("used")
+    size = (cache.cache_dir / f"used{CACHE_SUFFIX}").stat().st_size
+    cache.max_bytes = 3 * size
+    store(cache, "new", FLOWS * 50)
+    remaining = {path.name[:-len(CACHE_SUFFIX)] for path in cache.cache_dir.glob(f"*{CACHE_SUFFIX}")}
+    assert remaining == {"recent", "used", "new"}
+
+
+@pytest.mark.skipif(flow_cache.fcntl is None, reason="needs fcntl")
+def test_eviction_waits_for_other_processes(cache):
+    store(cache, "k")
+    cache.max_bytes = 0
+    # Another process holding the lock file, as a conversion worker would
+    holder = subprocess.Popen([sys.executable, "-c", (
+        "import fcntl, sys, time\n"
+        "f = open(sys.argv[1], 'a')\n"
+        "fcntl.flock(f, fcntl.LOCK_EX)\n"
+        "print('locked', flush=True)\n"
+        "time.sleep(0.5)\n"
+    ), str(cache.cache_dir / LOCK_NAME)], stdout=subprocess.PIPE, text=True)
+    try:
+        assert holder.stdout.readline() == "locked\n"
+        started = time.monotonic()
+        cache._evict()
+        assert time.monotonic() - started > 0.2
+    finally:
+        holder.wait(5)
+    assert cache.load("k") is None
+
+
+def test_digest_for_uses_upload_index(cache, tmp_path):
+    har = tmp_path / "recording.har"
+    har.write_bytes(b'{"log": {"entries": []}}')
+    digest = cache.digest_for(har)
+    with open(har, "rb") as f:
+        assert digest == hash_stream(f)
+    # A fresh cache reads the index instead of hashing again
+    assert FlowCache(cache.cache_dir, cache.max_bytes)._uploads[str(har)]["sha256"] == digest
@@ -0,0 +1,106 @@
+import json
+import re
+
+from flow_correlation import correlate_flows
+
+PLACEHOLDER_RE = re.compile(r"\{([^{}\s]+)\}")
+
+
+def recorded_session():
+    return [
+        {
+            "method": "POST",
+            "url": "https://shop.test/api/login",
+            "headers": {"Content-Type": "application/json"},
+            "body": json.dumps({"user": "alice"}),
+            "response_headers": {"X-CSRF-Token": "csrf-7f3a9c2e1b"},
+            "response_text": json.dumps({"session": {"id": 84213}, "cart": [{"uuid": "c0ffee00-1234-4abc-9def-001122334455"}]}),
+        },
+        {
+            "method": "GET",
+            "url": "https://shop.test/api/sessions/84213/cart?cart=c0ffee00-1234-4abc-9def-001122334455",
+            "headers": {"X-CSRF-Token": "csrf-7f3a9c2e1b"},
+            "response_text": '<form><input type="hidden" name="checkoutToken" value="tok-99887766"></form>',
+        },
+        {
+            "method": "POST",
+            "url": "https://shop.test/api/checkout",
+            "headers": {"Authorization": "Bearer csrf-7f3a9c2e1b"},
+            "body": json.dumps({"session": 84213, "token": "tok-99887766", "note": "keep"}),
+        },
+        {
+            "method": "POST",
+            "url": "https://shop.test/api/confirm",
+            "headers": {},
+            "body": "checkoutToken=tok-99887766&step=2",
+        },
+    ]
+
+
+def extract(flow, rule):
+    """What a generated script extracts for rule from the recorded response"""
+    name, kind, source = rule
+    if kind == "header":
+        return flow["response_headers"][source]
+    if kind == "json":
+        value = json.loads(flow["response_text"])
+        for key in source:
+            value = value[key]
+        return str(value)
+    assert kind == "regex"
+    return re.search(source, flow["response_text"]).group(1)
+
+
+def render(text, context):
+    return PLACEHOLDER_RE.sub(lambda match: context.get(match.group(1), match.group(0)), text)
+
+
+def test_rewrite_round_trips():
+    recorded = recorded_session()
+    flows, correlations = correlate_flows(recorded)
+
+    context = {}
+    for flow in flows:
+        for rule in flow.get("extract", []):
+            context[rule[0]] = extract(flow, rule)
+    assert set(context) == {correlation.name for correlation in correlations}
+
+    for original, flow in zip(recorded, flows):
+        assert render(flow["url"], context) == original["url"]
+        assert {key: render(value, context) for key, value in flow["headers"].items()} == original["headers"]
+        if "body" in original:
+            body = render(flow["body"], context)
+            if original["body"].startswith("{"):
+                assert json.loads(body) == json.loads(original["body"])
+            else:
+                assert body == original["body"]
+        assert set(flow.get("use_context", [])) <= set(context)
+
+
+def test_consumers_use_placeholders():
+    flows, correlations = correlate_flows(recorded_session())
+    assert len(correlations) == 4
+    assert "84213" not in flows[1]["url"]
+    assert "tok-99887766" not in flows[2]["body"]
+    assert "tok-99887766" not in flows[3]["body"]
+    assert '"note": "keep"' in flows[2]["body"]
+    assert flows[0].get("use_context") is None
+    by_kind = {correlation.kind: correlation for correlation in correlations}
+    assert by_kind["header"].producer == 0
+    assert by_kind["regex"].producer == 1
+    assert by_kind["regex"].consumers == [2, 3]
+
+
+def test_input_is_not_modified():
+    recorded = recorded_session()
+    snapshot = json.dumps(recorded, sort_keys=True)
+    correlate_flows(recorded)
+    assert json.dumps(recorded, sort_keys=True) == snapshot
+
+
+def test_values_sent_before_the_response_are_not_correlated():
+    recorded = recorded_session()
+    recorded.insert(0, {"method": "GET", "url": "https://shop.test/api/sessions/84213", "headers": {}})
+    flows, correlations = correlate_flows(recorded)
+    assert all(correlation.value != "84213" for correlation in correlations)
+    assert "84213" in flows[2]["url"]
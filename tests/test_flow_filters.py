@@ -0,0 +1,97 @@
+import re
+
+import pytest
+
+from flow_filters import (
+    ANALYTICS_DOMAINS, STATIC_ASSET_MIME_TYPES, FilterConfigError, FlowFilter, filter_fingerprint, format_stats,
+    normalize_filter_config
+)
+
+
+def entry(url, mime_type="application/json", status=200):
+    return {"request": {"url": url}, "response": {"status": status, "content": {"mimeType": mime_type}}}
+
+
+def test_static_preset():
+    config = normalize_filter_config("static")
+    assert config == normalize_filter_config({"preset": "static"})
+    assert config["mime_types"] == STATIC_ASSET_MIME_TYPES
+    assert config["deny_domains"] == ANALYTICS_DOMAINS
+    flow_filter = FlowFilter(config)
+    assert flow_filter.accept_entry(entry("https://shop.test/api/items"))
+    assert not flow_filter.accept_entry(entry("https://shop.test/logo.png?v=2", "image/png"))
+    assert not flow_filter.accept_entry(entry("https://shop.test/app.js", "text/plain"))
+    assert not flow_filter.accept_entry(entry("https://www.google-analytics.com/collect"))
+
+
+def test_preset_is_extended_without_duplicates():
+    config = normalize_filter_config({"preset": "static", "mime_types": ["text/css", "text/html"], "status_codes": ["3xx"]})
+    assert config["mime_types"] == STATIC_ASSET_MIME_TYPES + ["text/html"]
+    assert config["status_codes"] == ["3xx"]
+
+
+@pytest.mark.parametrize("config", [None, "", {}, {"mime_types": []}])
+def test_empty_configs_filter_nothing(config):
+    assert normalize_filter_config(config) is None
+
+
+@pytest.mark.parametrize("config, message", [
+    ("images", "Unknown filter preset 'images'"),
+    (["static"], "filters must be an object"),
+    ({"mime": ["image/*"]}, "Unknown filter keys: ['mime']"),
+    ({"url_patterns": "\\.css"}, "filters.url_patterns must be a list"),
+    ({"url_patterns": ["("]}, "Invalid url_patterns entry '('"),
+    ({"status_codes": ["4x"]}, "Invalid status_codes entry '4x'"),
+    ({"status_codes": [True]}, "Invalid status_codes entry True"),
+])
+def test_invalid_configs_are_rejected(config, message):
+    with pytest.raises(FilterConfigError, match=re.escape(message)):
+        normalize_filter_config(config)
+
+
+def test_rule_order_and_per_rule_stats():
+    flow_filter = FlowFilter(normalize_filter_config({
+        "allow_domains": ["shop.test"],
+        "deny_domains": ["cdn.shop.test"],
+        "status_codes": [304, "5xx"],
+        "mime_types": ["image/*", "text/css"],
+        "url_patterns": ["\\.dot\\.html"],
+    }))
+    # Each request matches several rules; the first in rule order counts
+    requests = [
+        (entry("https://other.test/logo.png", "image/png", 500), "allow_domains"),
+        (entry("https://cdn.shop.test/logo.png", "image/png", 500), "deny_domain:cdn.shop.test"),
+        (entry("https://shop.test/Index.dot.html", "image/png", 503), "status_code:5xx"),
+        (entry("https://shop.test/Index.dot.html", "text/css; charset=utf-8", 304), "status_code:304"),
+        (entry("https://shop.test/Index.dot.html", "IMAGE/PNG"), "mime_type:image/*"),
+        (entry("https://shop.test/Index.dot.html", "text/css"), "mime_type:text/css"),
+        (entry("https://shop.test/Home/Index.DOT.html"), "url_pattern:\\.dot\\.html"),
+        (entry("https://api.shop.test/items"), None),
+    ]
+    for request, rule in requests:
+        request_url = request["request"]["url"]
+        response = request["response"]
+        assert flow_filter.drop_reason(request_url, response["content"]["mimeType"], response["status"]) == rule
+        assert flow_filter.accept_entry(request) is (rule is None)
+    stats = flow_filter.stats()
+    assert (stats["kept"], stats["dropped"]) == (1, 7)
+    assert stats["by_rule"] == {rule: 1 for _, rule in requests if rule}
+
+
+def test_converted_flows_are_filtered_like_entries():
+    config = normalize_filter_config("static")
+    flow_filter = FlowFilter(config)
+    assert not flow_filter.accept_flow({"url": "https://shop.test/a", "response_body": {"mimeType": "font/woff2"}})
+    # Bodies kept as plain text carry no mime type; the URL still matches
+    assert not flow_filter.accept_flow({"url": "https://shop.test/app.css", "status_code": 200, "response_body": "a{}"})
+    assert flow_filter.accept_flow({"url": "https://shop.test/api/items"})
+    assert flow_filter.stats()["by_rule"] == {"mime_type:font/*": 1, f"url_pattern:{config['url_patterns'][0]}": 1}
+
+
+def test_fingerprint_and_format():
+    config = normalize_filter_config("static")
+    assert filter_fingerprint(config) == filter_fingerprint(normalize_filter_config({"preset": "static"}))
+    assert filter_fingerprint(config) != filter_fingerprint(normalize_filter_config({"status_codes": [404]}))
+    assert format_stats(None) == "none dropped"
+    assert format_stats({"dropped": 3, "by_rule": {"mime_type:image/*": 2, "allow_domains": 1}}) == \
+        "3 dropped (mime_type:image/*=2, allow_domains=1)"
@@ -0,0 +1,57 @@
+import pytest
+
+from flow_templates import cluster_flows, template_url
+
+
+@pytest.mark.parametrize("url, template", [
+    ("https://shop.test/api/items/42", "https://shop.test/api/items/{id}"),
+    ("/api/orders/9b1d5e2c-4c1a-4f0e-8f3a-2d6c1e7b9a10?_=1759239051683", "/api/orders/{uuid}?_={_}"),
+    ("/Wizer/UserAdmin/UserProfile?userId=22665", "/Wizer/UserAdmin/UserProfile?userId={id}"),
+    ("/api/items?sort=name", "/api/items?sort=name"),
+])
+def test_template_url(url, template):
+    assert template_url(url) == template
+
+
+def flow(method, url, body=None, **extra):
+    return {"method": method, "url": url, "body": body, **extra}
+
+
+def test_dedupe_weights_follow_observed_counts():
+    flows = [
+        flow("GET", "https://shop.test/api/items/1"),
+        flow("GET", "https://shop.test/api/orders"),
+        flow("GET", "https://shop.test/api/items/2"),
+        flow("GET", "https://shop.test/api/items/1"),
+        flow("GET", "https://shop.test/api/items/3"),
+        flow("POST", "https://shop.test/api/items/4"),
+    ]
+    clusters = cluster_flows(flows)
+    assert [(cluster.flow["method"], cluster.template, cluster.count) for cluster in clusters] == [
+        ("GET", "https://shop.test/api/items/{id}", 4),
+        ("GET", "https://shop.test/api/orders", 1),
+        ("POST", "https://shop.test/api/items/{id}", 1),
+    ]
+    assert sum(cluster.count for cluster in clusters) == len(flows)
+    # Each recorded URL is kept once
+    assert clusters[0].urls == [f"https://shop.test/api/items/{i}" for i in (1, 2, 3)]
+
+
+def test_different_bodies_are_not_merged():
+    clusters = cluster_flows([
+        flow("POST", "/api/cart/1", '{"qty": 1}'),
+        flow("POST", "/api/cart/2", '{"qty": 2}'),
+        flow("POST", "/api/cart/3", '{"qty": 1}'),
+    ])
+    assert [cluster.count for cluster in clusters] == [2, 1]
+
+
+def test_context_rules_are_merged():
+    clusters = cluster_flows([
+        flow("GET", "/api/items/1", extract=[("item_id", "json", ("id",))], use_context=["token"]),
+        flow("GET", "/api/items/2", extract=[("item_id", "json", ("id",)), ("etag", "header", "ETag")],
+             use_context=["token", "session"]),
+    ])
+    assert len(clusters) == 1
+    assert clusters[0].extract == [("item_id", "json", ("id",)), ("etag", "header", "ETag")]
+    assert clusters[0].use_context == ["token", "session"]
@@ -0,0 +1,78 @@
+import io
+import json
+
+import pytest
+
+from har_stream import ENTRY, FIELD, HarFormatError, HarStreamParser, iter_har, iter_har_entries
+
+
+def make_har():
+    entries = []
+    for i in range(5):
+        entries.append({
+            "startedDateTime": f"2024-01-01T00:00:0{i}.000Z",
+            "request": {"method": "GET", "url": f"https://shop.test/api/items/{i}?q=café", "headers": []},
+            "response": {
+                "status": 200,
+                # Multi-byte characters, escapes and brackets inside strings
+                "content": {"mimeType": "application/json", "text": '{"name": "€ \U0001F600", "raw": "a\\"}]"}'},
+            },
+            "time": 12.5 + i,
+        })
+    document = {
+        "log": {
+            "version": "1.2",
+            "creator": {"name": "test", "version": "1"},
+            "pages": [{"id": "page_1", "title": "Shop"}],
+            "entries": entries,
+            "comment": "after the entries",
+        }
+    }
+    return json.dumps(document, ensure_ascii=False, indent=1).encode("utf-8")
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64, 4096, 1 << 20])
+def test_entries_match_json_load(chunk_size):
+    data = make_har()
+    entries = [entry for _, entry in iter_har_entries(io.BytesIO(data), chunk_size)]
+    assert entries == json.loads(data)["log"]["entries"]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 5, 4096])
+def test_fields_and_entry_spans(chunk_size):
+    data = make_har()
+    expected = json.loads(data)["log"]
+    fields = {}
+    for event in iter_har(io.BytesIO(data), chunk_size):
+        if event[0] == FIELD:
+            fields[event[1]] = event[2]
+        else:
+            assert event[0] == ENTRY
+            index, entry, start, end = event[1:]
+            assert entry == expected["entries"][index]
+            assert json.loads(data[start:end]) == entry
+    assert fields == {key: value for key, value in expected.items() if key != "entries"}
+
+
+def test_parser_tracks_progress():
+    data = make_har()
+    parser = HarStreamParser()
+    events = []
+    for i in range(0, len(data), 10):
+        events.extend(parser.feed(data[i:i + 10]))
+    events.extend(parser.close())
+    assert parser.finished
+    assert parser.entries_seen == 5
+    assert parser.bytes_consumed <= len(data)
+
+
+def test_truncated_document_is_rejected():
+    data = make_har()
+    with pytest.raises(HarFormatError):
+        list(iter_har_entries(io.BytesIO(data[:len(data) // 2]), 64))
+
+
+def test_non_har_document_is_rejected():
+    with pytest.raises(HarFormatError):
+        list(iter_har_entries(io.BytesIO(b'["not", "a", "har"]'), 4))
+
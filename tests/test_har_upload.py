@@ -0,0 +1,123 @@
+import hashlib
+import io
+import json
+import os
+import time
+
+import pytest
+
+from har_stream import ENTRY, HarFormatError, HarStreamParser
+from har_upload import UploadOffsetMismatch, UploadSessionManager, UploadVerificationError, save_har_upload
+
+HAR = json.dumps({"log": {"version": "1.2", "entries": [
+    {"request": {"method": "GET", "url": f"https://shop.test/api/items/{i}"}, "response": {"status": 200}}
+    for i in range(3)
+]}}).encode("utf-8")
+
+
+@pytest.fixture
+def manager(tmp_path):
+    return UploadSessionManager(tmp_path / "sessions", tmp_path / "uploads")
+
+
+def make_old(path):
+    stamp = time.time() - 2 * 3600
+    os.utime(path, (stamp, stamp))
+
+
+def test_resume_after_restart(tmp_path, manager):
+    (tmp_path / "uploads").mkdir()
+    session = manager.create("shop.har", expected_size=len(HAR), expected_sha256=hashlib.sha256(HAR).hexdigest())
+    session.write(HAR[:40])
+    session.writer.close()
+
+    # A new manager (server restart) restores the session from disk
+    restarted = UploadSessionManager(tmp_path / "sessions", tmp_path / "uploads")
+    resumed = restarted.get(session.id)
+    assert resumed.offset == 40
+    with pytest.raises(UploadOffsetMismatch):
+        resumed.check_offset(0)
+    resumed.check_offset(40)
+    resumed.write(HAR[40:])
+
+    path, digest, size, index = restarted.complete(resumed)
+    assert path.read_bytes() == HAR
+    assert digest == hashlib.sha256(HAR).hexdigest()
+    assert size == len(HAR)
+    assert restarted.get(session.id) is None
+    assert list((tmp_path / "sessions").iterdir()) == []
+
+
+def test_incomplete_upload_is_kept_for_resume(tmp_path, manager):
+    session = manager.create("shop.har", expected_size=len(HAR))
+    session.write(HAR[:10])
+    with pytest.raises(UploadVerificationError):
+        manager.complete(session)
+    assert manager.get(session.id) is session
+    assert session.part_path.exists()
+
+
+def test_unknown_upload_id(manager):
+    assert manager.get("0123456789abcdef") is None
+    assert manager.get("../escape") is None
+
+
+def test_cleanup_removes_only_stale_orphans(tmp_path, manager):
+    sessions_dir = tmp_path / "sessions"
+    active = manager.create("active.har")
+    active.write(HAR[:10])
+    stale_orphan = sessions_dir / "stale.part"
+    fresh_orphan = sessions_dir / "fresh.part"
+    stale_orphan.write_bytes(b"{")
+    fresh_orphan.write_bytes(b"{")
+    make_old(stale_orphan)
+    make_old(active.part_path)
+
+    assert manager.cleanup() == 1
+    assert not stale_orphan.exists()
+    assert fresh_orphan.exists()
+    assert active.part_path.exists()
+
+    # Sessions with metadata on disk are kept even when not loaded
+    restarted = UploadSessionManager(sessions_dir, tmp_path / "uploads")
+    assert restarted.cleanup(max_age=0) == 1
+    assert not fresh_orphan.exists()
+    assert active.part_path.exists()
+
+
+def test_save_rejects_invalid_upload(tmp_path):
+    dest = tmp_path / "bad.har"
+    with pytest.raises(HarFormatError):
+        save_har_upload(io.BytesIO(b'{"log": {"entries": [}'), dest, tmp_path)
+    assert not dest.exists()
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_save_writes_validated_upload(tmp_path):
+    incoming = tmp_path / "incoming"
+    incoming.mkdir()
+    path, digest, size, index = save_har_upload(io.BytesIO(HAR), tmp_path / "shop.har", incoming, chunk_size=16)
+    assert path.read_bytes() == HAR
+    assert digest == hashlib.sha256(HAR).hexdigest()
+    assert size == len(HAR)
+    assert list(incoming.iterdir()) == []
+
+
+def test_small_final_chunk_completes_the_document():
+    # The parser holds back data while a value is incomplete; flush() parses it
+    for split in range(1, len(HAR), 23):
+        parser = HarStreamParser()
+        events = parser.feed(HAR[:split]) + parser.feed(HAR[split:]) + parser.flush()
+        assert parser.finished
+        assert [event[1] for event in events if event[0] == ENTRY] == [0, 1, 2]
+        assert parser.close() == []
+
+
+def test_complete_after_chunks(manager, tmp_path):
+    (tmp_path / "uploads").mkdir()
+    session = manager.create("shop.har")
+    for i in range(0, len(HAR), 50):
+        session.write(HAR[i:i + 50])
+    path, digest, size, index = manager.complete(session)
+    assert path.read_bytes() == HAR
+    assert index["entries"] == 3
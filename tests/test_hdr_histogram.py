@@ -0,0 +1,108 @@
+import random
+
+import pytest
+
+from hdr_histogram import HdrHistogram, HdrLayout, merge_extremes
+
+BOUNDS = (5_000, 10_000, 25_000, 50_000, 100_000, 250_000, 500_000, 1_000_000)
+
+
+@pytest.fixture
+def samples():
+    rng = random.Random(18)
+    return [int(rng.lognormvariate(11, 1.2)) for _ in range(5000)]
+
+
+def histogram_of(values, layout=None):
+    histogram = HdrHistogram(layout or HdrLayout())
+    for value in values:
+        histogram.record(value)
+    return histogram
+
+
+def test_value_range_holds_its_values():
+    layout = HdrLayout()
+    for value in (0, 1, 127, 128, 1000, 65_535, 1_000_000, 59_999_999):
+        low, high = layout.value_range(layout.index(value))
+        assert low <= value <= high
+        # Two significant figures: buckets are at most 1% of their values wide
+        assert high - low <= max(1, value // 100)
+
+
+def test_bounds_never_count_values_above_them(samples):
+    histogram = histogram_of(samples)
+    _, _, _, below = histogram.summary((0.5,), BOUNDS)
+    layout = histogram.layout
+    for bound, count in zip(BOUNDS, below):
+        exact = sum(value <= bound for value in samples)
+        # Values in the bucket straddling the bound go to the next bound
+        straddling = sum(layout.index(value) == layout.index(bound) and value <= bound for value in samples)
+        assert exact - straddling <= count <= exact
+
+
+def test_quantiles_are_within_precision(samples):
+    histogram = histogram_of(samples)
+    _, _, values, _ = histogram.summary((0.5, 0.99), ())
+    ordered = sorted(samples)
+    for value, quantile in zip(values, (0.5, 0.99)):
+        exact = ordered[int(quantile * len(ordered)) - 1]
+        assert exact <= value <= exact * 1.01 + 1
+
+
+def test_min_and_max_are_exact(samples):
+    lowest, highest, values, _ = histogram_of(samples).summary((1.0,), ())
+    assert (lowest, highest) == (min(samples), max(samples))
+    assert values == [max(samples)]
+
+
+def test_values_above_range_are_counted():
+    histogram = histogram_of([1_000, 113_000_000, 2_000])
+    lowest, highest, values, below = histogram.summary((0.5, 1.0), (60_000_000,))
+    assert histogram.overflow == 1
+    assert (lowest, highest) == (1_000, 113_000_000)
+    # Quantiles past the range are capped at its highest bucket
+    assert values[1] < 61_000_000
+    assert below == [2]
+
+
+def test_summary_cache_follows_changes():
+    histogram = histogram_of([1_000])
+    assert histogram.summary((0.5,), ())[1] == 1_000
+    histogram.record(2_000)
+    assert histogram.summary((0.5,), ())[1] == 2_000
+
+
+def test_sparse_round_trip_keeps_extremes(samples):
+    histogram = histogram_of(samples)
+    copy = HdrHistogram(histogram.layout)
+    copy.add_sparse(histogram.sparse(), extremes=histogram.extremes)
+    assert copy.counts == histogram.counts
+    assert copy.summary((0.9,), BOUNDS) == histogram.summary((0.9,), BOUNDS)
+
+
+def test_sparse_without_extremes_uses_bucket_edges():
+    histogram = HdrHistogram(HdrLayout())
+    histogram.add_sparse({histogram.layout.index(1_234): 3})
+    low, high = histogram.layout.value_range(histogram.layout.index(1_234))
+    assert (histogram.min, histogram.max, histogram.total) == (low, high, 3)
+
+
+def test_add_across_layouts(samples):
+    coarse = histogram_of(samples, HdrLayout(1, 60_000_000, 1))
+    merged = histogram_of(samples[:10])
+    merged.add(coarse)
+    assert merged.total == len(samples) + 10
+    assert (merged.min, merged.max) == (min(samples), max(samples))
+
+
+def test_merge_extremes():
+    assert merge_extremes((None, None, 0), (5, 9, 1)) == (5, 9, 1)
+    assert merge_extremes((3, 7, 1), (5, 9, 2)) == (3, 9, 3)
+    assert merge_extremes((3, 7, 0), (None, None, 0)) == (3, 7, 0)
+
+
+def test_invalid_layouts_are_rejected():
+    with pytest.raises(ValueError):
+        HdrLayout(significant_figures=6)
+    with pytest.raises(ValueError):
+        HdrLayout(10, 15)
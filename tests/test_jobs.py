@@ -0,0 +1,103 @@
+import asyncio
+import importlib
+import logging
+import time
+
+import pytest
+
+import jobs
+from jobs import COMPLETED, FAILED, QUEUED, RUNNING, JobManager, JobQueueFull
+from workers import ProgressFile, run_io
+
+
+def count_entries(total, progress_path):
+    progress = ProgressFile(progress_path)
+    for done in range(1, total + 1):
+        time.sleep(0.02)
+        progress.update(force=True, entries_processed=done, total_entries=total, percent=100.0 * done / total)
+    return {"entries": total}
+
+
+def write_then_fail(progress_path, result_path):
+    with open(result_path, "w") as f:
+        f.write("partial")
+    raise ValueError("not a HAR file")
+
+
+@pytest.fixture(autouse=True)
+def in_threads(monkeypatch):
+    # Job functions run in the thread pool instead of spawned processes
+    monkeypatch.setattr(jobs, "run_cpu", run_io)
+    monkeypatch.setattr(jobs, "POLL_INTERVAL", 0.01)
+
+
+def run_job(manager, fn, *args, **kwargs):
+    """Submit a job and collect its states until it finishes."""
+    async def main():
+        job = manager.submit("convert", fn, *args, **kwargs)
+        states = [state async for state in manager.subscribe(job.id)]
+        await manager.shutdown()
+        return job, states
+    return asyncio.run(main())
+
+
+def test_status_transitions(tmp_path):
+    manager = JobManager(tmp_path, workers=1, max_queued=4)
+    job, states = run_job(manager, count_entries, 5)
+    statuses = [state["status"] for state in states]
+    assert statuses[0] == QUEUED and statuses[-1] == COMPLETED
+    assert RUNNING in statuses
+    assert states[-1]["result"] == {"entries": 5}
+    assert states[-1]["started_at"] and states[-1]["finished_at"]
+    assert not job.progress_path.exists()
+    assert manager.stats()["jobs"] == {QUEUED: 0, RUNNING: 0, COMPLETED: 1, FAILED: 0}
+
+
+def test_progress_is_polled(tmp_path):
+    _, states = run_job(JobManager(tmp_path, workers=1, max_queued=4), count_entries, 5)
+    processed = [state["progress"]["entries_processed"] for state in states]
+    # Intermediate progress reaches subscribers while the job runs
+    assert any(0 < count < 5 for count in processed)
+    assert processed == sorted(processed)
+    assert states[-1]["progress"] == {"entries_processed": 5, "total_entries": 5, "percent": 100.0}
+
+
+def test_failure_is_logged_with_traceback(tmp_path, caplog):
+    manager = JobManager(tmp_path, workers=1, max_queued=4)
+    with caplog.at_level(logging.INFO, logger="jobs"):
+        job, states = run_job(manager, write_then_fail, result_suffix=".json")
+    assert states[-1]["status"] == FAILED
+    assert states[-1]["error"] == "not a HAR file"
+    assert not job.result_path.exists()
+    [failure] = [record for record in caplog.records if record.levelno == logging.ERROR]
+    assert failure.exc_info[0] is ValueError
+    assert any(record.getMessage() == f"Queued convert job {job.id}" for record in caplog.records)
+
+
+def test_full_queue_is_rejected(tmp_path):
+    async def main():
+        manager = JobManager(tmp_path, workers=1, max_queued=1)
+        # Nothing leaves the queue before the next await
+        manager.submit("convert", count_entries, 1)
+        with pytest.raises(JobQueueFull):
+            manager.submit("convert", count_entries, 1)
+        assert len(manager.jobs) == 1
+        await manager.shutdown()
+    asyncio.run(main())
+
+
+def test_full_queue_answers_429(tmp_path, monkeypatch):
+    from fastapi import HTTPException
+
+    main = importlib.import_module("main")
+    monkeypatch.setattr(main, "job_manager", JobManager(tmp_path / "jobs", workers=1, max_queued=1))
+
+    async def submit_two():
+        main.submit_job("convert", count_entries, 1)
+        with pytest.raises(HTTPException) as raised:
+            main.submit_job("convert", count_entries, 1)
+        await main.job_manager.shutdown()
+        return raised.value
+    error = asyncio.run(submit_two())
+    assert error.status_code == 429
+    assert error.headers == {"Retry-After": "5"}
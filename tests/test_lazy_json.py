@@ -0,0 +1,69 @@
+import json
+
+from lazy_json import LazyJson
+
+DOCUMENT = {"token": "abc", "user": {"id": 7, "roles": ["admin"]}, "items": [{"id": 1}, {"id": 2}], "next": None}
+
+
+def partial(value):
+    """A LazyJson that decodes top-level members one at a time, whatever the size"""
+    return LazyJson(value if isinstance(value, str) else json.dumps(value, indent=1), partial_threshold=0)
+
+
+def test_small_documents_are_decoded_in_full():
+    lazy = LazyJson(json.dumps(DOCUMENT))
+    assert not lazy.partial
+    assert lazy.get(("user", "roles", 0)) == "admin"
+    assert lazy.get(()) == DOCUMENT
+
+
+def test_members_match_a_full_decode():
+    lazy = partial(DOCUMENT)
+    assert lazy.partial
+    for key, value in DOCUMENT.items():
+        assert lazy.get((key,)) == value
+    assert lazy.get(("items", 1, "id")) == 2
+    assert lazy.get(("user", "id")) == 7
+
+
+def test_members_after_the_key_are_not_decoded():
+    lazy = partial(DOCUMENT)
+    assert lazy.get(("token",)) == "abc"
+    assert list(lazy._members) == ["token"]
+    # Decoding resumes where it stopped
+    assert lazy.get(("items", 0, "id")) == 1
+    assert list(lazy._members) == ["token", "user", "items"]
+
+
+def test_array_members():
+    lazy = partial([{"id": 1}, {"id": 2}, {"id": 3}])
+    assert lazy.get((1, "id")) == 2
+    assert list(lazy._members) == [0, 1]
+    # Negative indexes need the whole document
+    assert lazy.get((-1, "id")) == 3
+
+
+def test_missing_members_give_the_default():
+    lazy = partial(DOCUMENT)
+    assert lazy.get(("missing",), "default") == "default"
+    assert lazy._done
+    assert lazy.get(("user", "name")) is None
+    assert lazy.get(("token", "value")) is None
+    assert partial({}).get(("token",)) is None
+    assert partial([]).get((0,)) is None
+
+
+def test_malformed_tail_is_ignored_before_it_is_reached():
+    lazy = partial('{"token": "abc", "user": {"id": 7}, "items": [1, 2')
+    assert lazy.get(("token",)) == "abc"
+    assert lazy.get(("user", "id")) == 7
+    assert lazy.get(("items",), "default") == "default"
+
+
+def test_malformed_input_falls_back_to_the_default():
+    for text in ('{"token" "abc"}', '{"token": "abc" "user": 1}', '{1: 2}', "not json", ""):
+        assert partial(text).get(("token",), "default") == "default"
+        assert LazyJson(text).get(("token",), "default") == "default"
+    # Scalars have no members, but decode as a whole
+    assert partial("42").get(()) == 42
+    assert partial("42").get(("token",)) is None
@@ -0,0 +1,254 @@
+import importlib.util
+import itertools
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from locust_generator import generate_locust_script_content, get_template_header
+
+locust = pytest.importorskip("locust")
+
+_modules = itertools.count()
+
+
+@pytest.fixture
+def generate_and_import(monkeypatch, tmp_path):
+    """Loader of generated scripts, each with a fresh Prometheus registry."""
+    import prometheus_client.core
+
+    def load(flows, options):
+        # Every script registers its metrics collector; give each one its own registry
+        monkeypatch.setattr(prometheus_client.core, "REGISTRY", prometheus_client.core.CollectorRegistry())
+        return load_script(flows, tmp_path, options)
+
+    return load
+
+
+def load_script(flows, directory, options):
+    """Write the self-contained script for options and import it."""
+    content = generate_locust_script_content(flows, {}, "recorded.py", "http://shop.test", options=options)
+    path = directory / "recorded.py"
+    path.write_text(content)
+    compile(content, str(path), "exec")
+    spec = importlib.util.spec_from_file_location(f"recorded_{next(_modules)}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_fast_http_user_script_imports(recorded_flows, generate_and_import):
+    from locust.contrib.fasthttp import FastHttpUser
+
+    module = generate_and_import(recorded_flows, {"user_class": "FastHttpUser"})
+    assert issubclass(module.RecordedUser, FastHttpUser)
+    assert not module.RecordedUser.abstract
+
+
+def test_http_user_script_imports(recorded_flows, generate_and_import):
+    from locust import HttpUser
+
+    module = generate_and_import(recorded_flows, {})
+    assert issubclass(module.RecordedUser, HttpUser)
+    assert not issubclass(module.RecordedUser, module.FastHttpUser)
+
+
+def test_unknown_user_class_is_rejected():
+    with pytest.raises(ValueError):
+        get_template_header("RawSocketUser")
+
+
+def test_dedupe_weights_tasks(recorded_flows):
+    content = generate_locust_script_content(recorded_flows, {}, "recorded.py", "http://shop.test")
+    # /api/items/1..3 merge into one task observed three times
+    assert content.count("@task(3)") == 1
+    # The login is not a task; items and orders remain
+    assert content.count("def step_") == 2
+
+
+def test_dedupe_off_keeps_every_request(recorded_flows):
+    content = generate_locust_script_content(recorded_flows, {}, "recorded.py", "http://shop.test",
+                                             options={"dedupe": False})
+    assert "@task(3)" not in content
+    assert content.count("def step_") == 4
+
+
+def test_replay_script_imports(recorded_flows, generate_and_import, monkeypatch):
+    monkeypatch.delenv("LOCUST_TIME_COMPRESSION", raising=False)
+    module = generate_and_import(recorded_flows, {"mode": "replay", "time_compression": 10})
+    user = module.RecordedUser
+    assert user.TIME_COMPRESSION == 10.0
+    assert callable(user.replay_session)
+    # Replay steps are called in order by replay_session, not scheduled as tasks
+    assert [task.__name__ for task in user.tasks] == ["replay_session"]
+    # Recorded offsets from the first step, in order
+    offsets = [offset for offset, _ in user.REPLAY_SCHEDULE]
+    assert offsets == sorted(offsets) and offsets[0] == 0
+    assert [step for _, step in user.REPLAY_SCHEDULE] == ["step_2", "step_3", "step_4", "step_5"]
+
+
+def test_parallel_script_imports(recorded_flows, generate_and_import, monkeypatch):
+    monkeypatch.delenv("LOCUST_MAX_CONNECTIONS_PER_HOST", raising=False)
+    module = generate_and_import(recorded_flows, {"parallel": True, "max_connections_per_host": 2})
+    user = module.RecordedUser
+    assert user.MAX_CONNECTIONS_PER_HOST == 2
+    pages = [name for name in vars(user) if name.startswith("page_")]
+    assert len(pages) == 1
+
+
+def test_page_loads_cap_connections_per_host(recorded_flows, generate_and_import):
+    import gevent
+
+    user = generate_and_import(recorded_flows, {"parallel": True, "max_connections_per_host": 2}).RecordedUser
+    fired = []
+    in_flight = {}
+    peak = {}
+
+    class Page:
+        """The page-load helpers of the generated user, without an HTTP client"""
+        MAX_CONNECTIONS_PER_HOST = 2
+        environment = SimpleNamespace(events=SimpleNamespace(request=SimpleNamespace(
+            fire=lambda **kwargs: fired.append(kwargs))))
+        _host_slot = user._host_slot
+        _fetch = user._fetch
+        _load_page = user._load_page
+
+    def fetch(host):
+        def step():
+            in_flight[host] = in_flight.get(host, 0) + 1
+            peak[host] = max(peak.get(host, 0), in_flight[host])
+            gevent.sleep(0.01)
+            in_flight[host] -= 1
+        return step
+
+    page = Page()
+    steps = []
+    for i in range(6):
+        host = "shop.test" if i < 4 else "cdn.test"
+        setattr(page, f"step_{i}", fetch(host))
+        steps.append((f"step_{i}", host))
+    page._load_page("Page 1", steps)
+    assert peak == {"shop.test": 2, "cdn.test": 2}
+    assert [event["request_type"] for event in fired] == ["PAGE"]
+    assert fired[0]["exception"] is None
+
+
+def test_token_pool_script_imports(recorded_flows, generate_and_import, monkeypatch):
+    monkeypatch.delenv("LOCUST_AUTH_USERS_PER_TOKEN", raising=False)
+    monkeypatch.delenv("LOCUST_AUTH_POOL", raising=False)
+    module = generate_and_import(recorded_flows, {"users_per_token": 5, "auth_pool": "master"})
+    user = module.RecordedUser
+    assert user.HAS_LOGIN
+    assert user.USERS_PER_TOKEN == 5
+    assert user.AUTH_POOL == "master"
+
+
+def test_token_pool_shares_one_login_per_lease(recorded_flows, generate_and_import):
+    module = generate_and_import(recorded_flows, {"users_per_token": 2})
+    pool = module.TokenPool(2)
+    first, login = pool.assign()
+    assert login
+    second, login = pool.assign()
+    assert second is first and not login
+    # The lease is full: the third user logs in for a new one
+    third, login = pool.assign()
+    assert third is not first and login
+
+    pool.complete(first, {"token": "abc"}, None)
+    assert first.generation == 1 and first.context == {"token": "abc"}
+    # Only one user refreshes a lease, and not again within AUTH_RETRY_INTERVAL
+    assert not pool.begin_refresh(first, 0)
+    assert not pool.begin_refresh(first, 1)
+
+    # Leaving users free a place; the next user joins without logging in
+    pool.release(second)
+    lease, login = pool.assign()
+    assert lease is third and not login
+    # The last user of a lease drops it
+    pool.release(first)
+    assert first.id not in pool.leases
+    pool.release(third)
+    assert third.id in pool.leases
+
+
+def test_throughput_script_imports(recorded_flows, generate_and_import, monkeypatch):
+    monkeypatch.delenv("LOCUST_TARGET_RPS", raising=False)
+    monkeypatch.delenv("LOCUST_TARGET_USERS", raising=False)
+    user = generate_and_import(recorded_flows, {"target_rps": 10, "users": 4}).RecordedUser
+    assert user.TARGET_RPS == 10.0
+    assert user.TARGET_USERS == 4
+    # constant_throughput paces each user to TARGET_RPS / TARGET_USERS requests per second
+    from time import perf_counter
+    pacing = user.wait_time(SimpleNamespace(_cp_last_run=perf_counter(), _cp_last_wait_time=0))
+    assert pacing == pytest.approx(4 * user.REQUESTS_PER_TASK / 10, abs=0.01)
+
+
+def test_throughput_model_sizes_users():
+    from locust_generator import TARGET_UTILIZATION, task_costs, throughput_model
+
+    flows = [{"response_time": 100}, {"response_time": 300}]
+    costs = task_costs([[(0, flows[0])], [(1, flows[1])]])
+    assert costs == [(1, 0.1), (1, 0.3)]
+    # One user per user_rps when responses are fast enough
+    model = throughput_model(costs, 10, user_rps=2)
+    assert model["users"] == 5 and model["task_rate"] == 2.0
+    # Slow responses add users to stay under TARGET_UTILIZATION
+    model = throughput_model(costs, 100, user_rps=50)
+    assert model["users"] == 40
+    assert model["utilization"] <= TARGET_UTILIZATION
+    # An explicit user count is kept
+    assert throughput_model(costs, 10, users=4)["task_rate"] == 2.5
+
+
+def test_worker_deltas_keep_exact_durations(recorded_flows, generate_and_import):
+    module = generate_and_import(recorded_flows, {})
+    worker, master = module.RequestMetrics(), module.RequestMetrics()
+    for micros in (1_234, 5_678, 113_000_000):
+        worker.record("GET", "/api/items", "success", micros)
+    master.merge(worker.take_delta())
+    _, _, durations, (aggregated, micros), _ = master.totals()
+    histogram, _ = durations[("GET", "/api/items")]
+    assert (histogram.min, histogram.max, histogram.overflow) == (1_234, 113_000_000, 1)
+    assert aggregated.extremes == histogram.extremes
+    assert micros == 1_234 + 5_678 + 113_000_000
+    families = {family.name: family for family in master.collect()}
+    [overflow] = families["locust_request_duration_overflow"].samples
+    assert overflow.labels == {"method": "GET", "endpoint": "/api/items"} and overflow.value == 1
+
+
+def write_har(path, urls):
+    entries = [{
+        "startedDateTime": f"2024-01-01T00:00:0{i}.000Z",
+        "time": 40,
+        "request": {"method": "GET", "url": url, "headers": []},
+        "response": {"status": 200, "headers": [], "content": {"mimeType": "application/json", "text": "{}"}},
+    } for i, url in enumerate(urls)]
+    path.write_text(json.dumps({"log": {"version": "1.2", "entries": entries}}))
+
+
+def test_command_line_takes_every_generate_option(tmp_path):
+    from locust_generator import GENERATE_OPTIONS, build_arg_parser, generate_locust
+
+    har = tmp_path / "recording.har"
+    write_har(har, ["http://shop.test/api/items/1", "http://shop.test/app.css", "http://shop.test/api/orders"])
+    args = vars(build_arg_parser().parse_args([
+        str(har), str(tmp_path / "recorded.py"), "static",
+        "--mode", "replay", "--time-compression", "5", "--user-class", "FastHttpUser", "--no-correlate",
+    ]))
+    assert set(GENERATE_OPTIONS) <= set(args)
+    generate_locust(args.pop("input_file"), args.pop("output_file"), args.pop("target_host"), args.pop("filters"), **args)
+    content = (tmp_path / "recorded.py").read_text()
+    # Same generation as /generate: filters, replay and the user class apply
+    assert "Mode: replay (5.0x time compression)" in content
+    assert "Filtered: " in content and "app.css" not in content
+    assert "class RecordedUser(RecordedFastHttpUser)" in content
+
+
+def test_command_line_rejects_invalid_options(tmp_path):
+    from locust_generator import generate_locust
+
+    har = tmp_path / "recording.har"
+    write_har(har, ["http://shop.test/api/items/1"])
+    with pytest.raises(ValueError, match="users requires target_rps"):
+        generate_locust(str(har), str(tmp_path / "recorded.py"), users=4)
+    assert not (tmp_path / "recorded.py").exists()
@@ -0,0 +1,64 @@
+import asyncio
+import subprocess
+import sys
+
+import pytest
+
+from conftest import ROOT
+
+
+def test_import_has_no_side_effects(tmp_path):
+    # Spawned worker processes re-import main; that must not touch the working directory
+    subprocess.run([sys.executable, "-c", "import main"], cwd=tmp_path, check=True,
+                   env={"PYTHONPATH": str(ROOT), "PATH": ""})
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_startup_creates_state(tmp_path, monkeypatch):
+    import main
+
+    monkeypatch.chdir(tmp_path)
+    for name in ("upload_sessions", "flow_cache", "blob_store", "job_manager"):
+        monkeypatch.setattr(main, name, None)
+    main.init_state()
+    health = asyncio.run(main.health_check())
+    assert health["flow_cache"]["entries"] == 0
+    assert {path.name for path in tmp_path.iterdir()} == {"uploads", "scripts", "cache", "blobs", "jobs"}
+
+
+def test_generate_options_defaults():
+    from locust_generator import GENERATE_OPTIONS
+    from main import check_generate_options
+
+    options = check_generate_options({"flows": [], "mode": None})
+    assert options == {name: default for name, (_, _, default) in GENERATE_OPTIONS.items()}
+
+
+def test_generate_options_are_normalized():
+    from main import check_generate_options
+
+    options = check_generate_options({"mode": "replay", "time_compression": 10, "target_rps": 5, "users": 2})
+    assert options["time_compression"] == 10.0 and isinstance(options["time_compression"], float)
+    assert options["target_rps"] == 5.0 and options["users"] == 2
+    # Replay keeps every request
+    assert options["dedupe"] is False
+
+
+@pytest.mark.parametrize("data, detail", [
+    ({"dedupe": "yes"}, "dedupe must be true or false"),
+    ({"mode": "burst"}, "Unsupported mode. Use one of: random, replay"),
+    ({"user_class": "RawSocketUser"}, "Unsupported user_class. Use one of: HttpUser, FastHttpUser"),
+    ({"time_compression": 0}, "time_compression must be a positive number"),
+    ({"pool_size": 1.5}, "pool_size must be a positive integer"),
+    ({"users_per_token": True}, "users_per_token must be a positive integer"),
+    ({"max_retries": -1}, "max_retries must be a non-negative integer"),
+    ({"users": 4}, "users requires target_rps"),
+])
+def test_invalid_generate_options_are_rejected(data, detail):
+    from fastapi import HTTPException
+
+    from main import check_generate_options
+
+    with pytest.raises(HTTPException) as raised:
+        check_generate_options(data)
+    assert (raised.value.status_code, raised.value.detail) == (400, detail)
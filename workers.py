@@ -0,0 +1,278 @@
+"""
+Worker pools for blocking work done by the API endpoints.
+
+CPU-bound HAR parsing and script generation run in a bounded process pool so
+they never hold the event loop (or the GIL of the server process), while file
+and subprocess I/O runs in a thread pool. Anything submitted to the process
+pool must be a top-level callable importable without side effects, which is
+why the process-side tasks live here and in locust_generator.py rather than
+in main.py, which builds the FastAPI app.
+"""
+import asyncio
+import functools
+import json
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from har_converter import FLOW, collect_flow_data, entry_to_flow, iter_flow_events
+from har_index import build_index, iter_indexed_entries, load_index
+from har_storage import open_har
+from blob_store import BlobStore
+from flow_filters import FlowFilter
+from flow_cache import FlowCache
+from locust_generator import generate_locust_script_content
+
+# Pool sizes can be overridden from the environment
+CPU_WORKERS = int(os.environ.get("HAR_CPU_WORKERS", max(1, min(4, os.cpu_count() or 1))))
+IO_WORKERS = int(os.environ.get("HAR_IO_WORKERS", 16))
+
+_pool_lock = threading.Lock()
+_thread_pool = None
+_process_pool = None
+
+
+def get_thread_pool():
+    """Thread pool for file and subprocess I/O."""
+    global _thread_pool
+    with _pool_lock:
+        if _thread_pool is None:
+            _thread_pool = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="har-io")
+        return _thread_pool
+
+
+def get_process_pool():
+    """Bounded process pool for CPU-bound parsing and generation."""
+    global _process_pool
+    with _pool_lock:
+        if _process_pool is None:
+            # spawn rather than fork: the server process runs threads
+            _process_pool = ProcessPoolExecutor(
+                max_workers=CPU_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _process_pool
+
+
+def _reset_process_pool():
+    global _process_pool
+    with _pool_lock:
+        pool, _process_pool = _process_pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+async def run_io(fn, *args, **kwargs):
+    """Run blocking I/O in the thread pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_thread_pool(), functools.partial(fn, *args, **kwargs))
+
+
+async def run_cpu(fn, *args, **kwargs):
+    """Run CPU-bound work in the process pool."""
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(get_process_pool(), functools.partial(fn, *args, **kwargs))
+    except BrokenProcessPool:
+        # A worker died (e.g. OOM on a huge archive); start a fresh pool next time
+        _reset_process_pool()
+        raise
+
+
+def shutdown_pools():
+    """Stop both pools; called on application shutdown."""
+    global _thread_pool
+    _reset_process_pool()
+    with _pool_lock:
+        pool, _thread_pool = _thread_pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+# Process-side tasks --------------------------------------------------------
+
+_caches = {}
+
+
+def _worker_cache(cache_dir, max_bytes):
+    cache = _caches.get((cache_dir, max_bytes))
+    if cache is None:
+        cache = _caches[(cache_dir, max_bytes)] = FlowCache(cache_dir, max_bytes)
+    return cache
+
+
+class ProgressFile:
+    """
+    Progress reporter for job functions running in a worker process.
+
+    Writes a small JSON document that the job manager in the server process
+    polls. Updates are throttled and written atomically.
+    """
+
+    def __init__(self, path, interval=0.25):
+        self.path = path
+        self.interval = interval
+        self._last = 0.0
+
+    def update(self, force=False, **progress):
+        now = time.monotonic()
+        if not force and now - self._last < self.interval:
+            return
+        self._last = now
+        tmp = f"{self.path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(progress, f)
+        os.replace(tmp, self.path)
+
+    @staticmethod
+    def read(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+
+def _encode_json(content):
+    # Same encoding as fastapi's JSONResponse
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def _body_store(blob_dir):
+    return BlobStore(blob_dir) if blob_dir else None
+
+
+def _flow_filter(filters):
+    return FlowFilter(filters) if filters else None
+
+
+def _convert(har_path, filename, timestamp, cache_dir, cache_max_bytes, cache_key, blob_dir=None, filters=None,
+             progress=None):
+    cache = _worker_cache(cache_dir, cache_max_bytes)
+    total_bytes = os.path.getsize(har_path)
+    with open_har(har_path) as har_stream:
+        events = cache.load(cache_key)
+        if events is None:
+            events = cache.store(
+                cache_key,
+                iter_flow_events(har_stream, _body_store(blob_dir), _flow_filter(filters))
+            )
+        if progress is not None:
+            events = _report_progress(events, har_stream, total_bytes, progress)
+        flow_data = collect_flow_data(events, timestamp)
+
+    return {
+        "message": "HAR file converted to flow successfully",
+        "filename": filename,
+        "timestamp": timestamp,
+        "flow_data": flow_data
+    }
+
+
+def _report_progress(events, har_stream, total_bytes, progress):
+    entries = 0
+    for event in events:
+        if event[0] == FLOW:
+            entries += 1
+            progress.update(
+                entries_processed=entries,
+                percent=round(100.0 * har_stream.raw_position / total_bytes, 1) if total_bytes else None
+            )
+        yield event
+    progress.update(force=True, entries_processed=entries, total_entries=entries, percent=100.0)
+
+
+def convert_har_file(har_path, filename, timestamp, cache_dir, cache_max_bytes, cache_key, blob_dir=None,
+                     filters=None):
+    """
+    Convert a HAR file to the /convert JSON response body.
+
+    Served from the flow cache when ``cache_key`` is present and written
+    through to it otherwise. Returns the serialized body so that encoding a
+    large response never happens on the event loop either. With a
+    ``blob_dir``, response bodies are externalized to the blob store;
+    ``filters`` is a normalized flow_filters configuration.
+    """
+    return _encode_json(_convert(
+        har_path, filename, timestamp, cache_dir, cache_max_bytes, cache_key, blob_dir, filters
+    ))
+
+
+def convert_har_job(har_path, filename, timestamp, cache_dir, cache_max_bytes, cache_key, blob_dir, filters,
+                    result_path, progress_path):
+    """Conversion job: writes the /convert response body to ``result_path``."""
+    content = _convert(
+        har_path, filename, timestamp, cache_dir, cache_max_bytes, cache_key, blob_dir, filters,
+        progress=ProgressFile(progress_path)
+    )
+    body = _encode_json(content)
+    with open(result_path, "wb") as f:
+        f.write(body)
+    return {
+        "filename": filename,
+        "total_entries": content["flow_data"]["metadata"]["total_entries"],
+        "result_size": len(body)
+    }
+
+
+def generate_script_job(flows, conversion_result, metadata, script_filename, target_host, filters, options,
+                        blob_dir, script_path, progress_path):
+    """
+    Generation job: renders a Locust script and writes it to ``script_path``.
+
+    Flows are taken from ``flows`` or, when it is None, from the result file
+    of a completed conversion job.
+    """
+    if flows is None:
+        with open(conversion_result, "r", encoding="utf-8") as f:
+            flow_data = json.load(f)["flow_data"]
+        flows = flow_data["flows"]
+        metadata = metadata or flow_data.get("metadata", {})
+
+    progress = ProgressFile(progress_path)
+
+    def report(done, total):
+        progress.update(entries_processed=done, total_entries=total, percent=round(100.0 * done / total, 1))
+
+    locust_script = generate_locust_script_content(flows, metadata, script_filename, target_host, progress=report,
+                                                   filters=filters, options=options, blob_dir=blob_dir)
+    with open(script_path, "w", encoding="utf-8") as f:
+        f.write(locust_script)
+    progress.update(force=True, entries_processed=len(flows), total_entries=len(flows), percent=100.0)
+
+    return {
+        "message": "Locust script generated successfully",
+        "filename": script_filename,
+        "file_path": str(script_path),
+        "file_size": os.path.getsize(script_path),
+        "total_requests": len(flows)
+    }
+
+
+def convert_entry_range(har_path, start, stop, blob_dir=None, filters=None):
+    """
+    Convert entries ``start:stop`` by seeking through the upload index.
+
+    Files without an index (or with a stale one) are indexed first. Entries
+    dropped by ``filters`` leave gaps in the window.
+    """
+    index = load_index(har_path) or build_index(har_path)
+    body_store = _body_store(blob_dir)
+    flow_filter = _flow_filter(filters)
+    flows = [
+        entry_to_flow(i, entry, body_store)
+        for i, entry in iter_indexed_entries(har_path, index, start, stop)
+        if flow_filter is None or flow_filter.accept_entry(entry)
+    ]
+    result = {
+        "total_entries": index["entries"],
+        "start": start,
+        "flows": flows
+    }
+    if flow_filter is not None:
+        result["filtered"] = flow_filter.stats()
+    return result